@@ -11,13 +11,17 @@ https://github.com/stb-tester/stb-tester/blob/master/LICENSE for details).
 
 from __future__ import annotations
 
+import itertools
 import os
 import re
+import select
 import shutil
+import struct
 import subprocess
 import threading
 import time
 import typing
+from typing import Iterator
 from collections import namedtuple
 from contextlib import contextmanager
 from logging import getLogger
@@ -145,6 +149,13 @@ class AdbDevice():
         USB. This requires that you have enabled Network ADB access on the
         device. Defaults to True if ``address`` is an IP address, False
         otherwise.
+    :param bool persistent_shell:
+        Keep a single ``adb shell`` process running, and send the commands
+        for `press`, `press_sequence`, `tap` and `swipe` to it, instead of
+        running a new ``adb shell`` process for each one. This saves
+        100-300ms per command. Defaults to False. Call `close` (or use the
+        ``AdbDevice`` as a context manager) to stop the ``adb shell``
+        process when you've finished with the device.
 
     .. _ADB: https://developer.android.com/studio/command-line/adb.html
     """
@@ -153,7 +164,8 @@ class AdbDevice():
                  adb_server: str|None = None,
                  adb_binary: str|None = None,
                  tcpip: bool|None = None,
-                 coordinate_system: CoordinateSystem|None = None):
+                 coordinate_system: CoordinateSystem|None = None,
+                 persistent_shell: bool|None = None):
 
         self.address = address or get_config("device_under_test", "ip_address",
                                              default=None)
@@ -179,11 +191,36 @@ class AdbDevice():
             "android", "coordinate_system", default=CoordinateSystem.HDMI_720P,
             type_=CoordinateSystem)
 
+        if persistent_shell is None:
+            persistent_shell = get_config(
+                "android", "persistent_shell", default=False, type_=bool)
+        self._shell_session = _AdbShell(self) if persistent_shell else None
+
+        self._raw_screencap = True
+        self._screencap_header_size = None
+        self._display_dimensions = None
+        self._batch = None
+
         self._setup_adb_key()
 
         if self.tcpip:
             self._connect(timeout=60)
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def close(self):
+        """Stop the persistent ``adb shell`` process, if there is one.
+
+        You can still use the ``AdbDevice`` afterwards; it will start a new
+        ``adb shell`` process when it needs one.
+        """
+        if self._shell_session is not None:
+            self._shell_session.close()
+
     def _setup_adb_key(self):
         if os.path.exists(os.path.join(os.environ["HOME"], ".android/adbkey")):
             return
@@ -240,13 +277,15 @@ class AdbDevice():
         (scale and/or rotate it) to match the screenshots from your main
         video-capture method as closely as possible.
 
+        The screenshot is transferred uncompressed if the device supports it,
+        which is much faster than asking the device to PNG-encode it. To
+        capture many frames, use `AdbDevice.frames` instead.
+
         :returns: A `stbt.Frame`, that is, an image in OpenCV format. Note that
             the ``time`` attribute won't be very accurate (probably to <0.5s or
             so).
         """
 
-        import cv2
-        import numpy
         from _stbt.imgutils import Frame
 
         if coordinate_system is None:
@@ -254,33 +293,74 @@ class AdbDevice():
 
         for attempt in range(1, 4):
             timestamp = time.time()
-            data = self.adb(["shell", "screencap", "-p"],
-                            timeout=60, capture_output=True) \
-                       .stdout
-            assert isinstance(data, bytes)
-            header = data[:10]
-            if data.startswith(b"\x89PNG\r\r\n"):
-                # Older versions of `adb shell` convert LF to CRLF.
-                # The PNG format is designed to detect this: It should start
-                # with 0x89, followed by "PNG", followed by CRLF.
-                data = data.replace(b"\r\n", b"\n")
-            img = cv2.imdecode(
-                numpy.asarray(bytearray(data), dtype=numpy.uint8),
-                cv2.IMREAD_COLOR)
-            if img is None:
-                logger.warning(
-                    "AdbDevice.get_frame: Failed to get screenshot "
-                    "via ADB (attempt %d/3)\n"
-                    "Header: %s, length: %d", attempt, header, len(data))
+            if self._raw_screencap:
+                img = self._screencap_raw(attempt)
             else:
+                img = self._screencap_png(attempt)
+            if img is not None:
                 break
         else:
             raise AdbError(
                 "Failed to capture screenshot from android device")
 
+        self._check_display_dimensions(img)
         img = _resize(img, coordinate_system)
         return Frame(img, time=timestamp)
 
+    def frames(self, coordinate_system=None) -> Iterator[Frame]:
+        """Capture screenshots continuously using ADB.
+
+        This runs ``screencap`` in a loop on the device and streams the raw
+        (uncompressed) screenshots back over a single ADB connection, so it
+        is much faster than calling `get_frame` repeatedly. The frames are
+        scaled and rotated in the same way as `get_frame`.
+
+        The returned iterator can be passed as the ``frames`` parameter of
+        `stbt.wait_for_match`, `stbt.detect_motion`, etc. For example::
+
+            d = AdbDevice(...)
+            stbt.wait_for_match("home.png", frames=d.frames())
+
+        The ADB connection is closed when the iterator is closed or garbage
+        collected.
+
+        :returns: An iterator of `stbt.Frame`. The ``time`` attribute of each
+            frame is the time that we started to receive it.
+        """
+        from _stbt.imgutils import Frame
+
+        if coordinate_system is None:
+            coordinate_system = self.coordinate_system
+
+        # The first screenshot tells us the size of the header, which depends
+        # on the Android version.
+        header_size = self._screencap_header_size
+        if header_size is None:
+            self.get_frame()
+            header_size = self._screencap_header_size
+        if header_size is None:
+            raise AdbError("AdbDevice.frames: This device doesn't support "
+                           "raw screencap output")
+
+        process = self._Popen(
+            ["exec-out", "while true; do screencap || exit; done"],
+            stdout=subprocess.PIPE)
+        try:
+            while True:
+                timestamp = time.time()
+                img = _read_raw_screencap(process.stdout, header_size)
+                if img is None:
+                    raise AdbError(
+                        "AdbDevice.frames: Screenshot stream ended "
+                        "unexpectedly", returncode=process.wait())
+                self._check_display_dimensions(img)
+                yield Frame(_resize(img, coordinate_system), time=timestamp)
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.stdout.close()
+            process.wait()
+
     def press(self, key) -> None:
         """Send a keypress.
 
@@ -289,14 +369,32 @@ class AdbDevice():
           Also accepts standard Stb-tester key names like "KEY_HOME" and
           "KEY_BACK".
         """
-        # "adb shell input keyevent xxx" always returns success, so we need to
-        # validate key names.
-        if key in _KEYCODE_MAPPINGS:  # pylint:disable=consider-using-get
-            key = _KEYCODE_MAPPINGS[key]  # Map Stb-tester names to Android ones
-        if key not in _ANDROID_KEYCODES:
-            raise ValueError("Unknown key code %r" % (key,))
+        key = _to_android_keycode(key)
         logger.info("AdbDevice.press(%r)", key)
-        self.adb(["shell", "input", "keyevent", key], timeout=10)
+        self._shell(["input", "keyevent", key], timeout=10)
+
+    def press_sequence(self, keys, interpress_delay_secs=0) -> None:
+        """Send a sequence of keypresses using a single ``adb shell``
+        invocation.
+
+        If ``interpress_delay_secs`` is 0 we send all the keys with a single
+        ``input keyevent`` command; otherwise we run one ``input keyevent``
+        per key, with a ``sleep`` on the device between them.
+
+        :param list[str] keys: See `press`.
+        """
+        # Validate them all first, so we don't send half the sequence.
+        keys = [_to_android_keycode(key) for key in keys]
+        if not keys:
+            return
+        logger.info("AdbDevice.press_sequence(%r)", keys)
+        if interpress_delay_secs > 0:
+            command = (" && sleep %g && " % interpress_delay_secs).join(
+                "input keyevent %s" % key for key in keys)
+            self._shell([command],
+                        timeout=10 + len(keys) * (interpress_delay_secs + 1))
+        else:
+            self._shell(["input", "keyevent"] + keys, timeout=10 + len(keys))
 
     def swipe(self, start_position, end_position) -> None:
         """Swipe from one point to another point.
@@ -317,9 +415,8 @@ class AdbDevice():
 
         x1, y1 = self._to_native_coordinates(x1, y1)
         x2, y2 = self._to_native_coordinates(x2, y2)
-        command = ["shell", "input", "swipe",
-                   str(x1), str(y1), str(x2), str(y2)]
-        self.adb(command, timeout=10)
+        self._shell(["input", "swipe", str(x1), str(y1), str(x2), str(y2)],
+                    timeout=10)
 
     def tap(self, position) -> None:
         """Tap on a particular location.
@@ -336,7 +433,7 @@ class AdbDevice():
         logger.info("AdbDevice.tap((%d,%d))", x, y)
 
         x, y = self._to_native_coordinates(x, y)
-        self.adb(["shell", "input", "tap", str(x), str(y)], timeout=10)
+        self._shell(["input", "tap", str(x), str(y)], timeout=10)
 
     @contextmanager
     def logcat(self, filename="logcat.log", logcat_args=None):
@@ -363,6 +460,62 @@ class AdbDevice():
         finally:
             collector.stop()
 
+    @contextmanager
+    def batch(self):
+        """Send several `press`, `press_sequence`, `tap` or `swipe` commands
+        to the device in a single ``adb shell`` invocation.
+
+        This is a context manager. The commands inside the ``with`` block
+        are queued up, and sent to the device when the block ends. For
+        example::
+
+            d = AdbDevice(...)
+            with d.batch():
+                d.tap((100, 200))
+                d.swipe((600, 400), (100, 400))
+                d.tap((300, 200))
+
+        Note that the commands don't take effect until the end of the block,
+        so don't check the device's screen inside the block.
+        """
+        if self._batch is not None:
+            # Nested batch: The outer one will send the commands.
+            yield
+            return
+        self._batch = []
+        try:
+            yield
+            batch = self._batch
+        finally:
+            self._batch = None
+        if batch:
+            commands, timeouts = zip(*batch)
+            logger.debug("AdbDevice.batch: Sending %d commands", len(batch))
+            self._shell(["; ".join(commands)], timeout=sum(timeouts))
+
+    def refresh_display_dimensions(self) -> None:
+        """Re-read the size and orientation of the device's screen.
+
+        `tap` and `swipe` need to know the size of the device's screen to
+        convert from ``coordinate_system`` to the device's native
+        coordinates (unless ``coordinate_system`` is
+        ``CoordinateSystem.ADB_NATIVE``). We read it the first time it's
+        needed, and then we only read it again if a screenshot from
+        `get_frame` or `frames` has a different size. Call this if you have
+        rotated the device or changed its resolution in some other way.
+        """
+        self._display_dimensions = self._get_display_dimensions()
+
+    def _shell(self, args, timeout):
+        """Run ``adb shell <args>``, ignoring the exit status like
+        ``adb shell`` itself does on older versions of Android."""
+        if self._batch is not None:
+            self._batch.append((" ".join(args), timeout))
+        elif self._shell_session is not None:
+            self._shell_session.run(" ".join(args), timeout)
+        else:
+            self.adb(["shell"] + args, timeout=timeout)
+
     def _adb(self, args, verbose=True, **kwargs):
         _command = self._build_adb_command() + args
         if verbose:
@@ -414,8 +567,87 @@ class AdbDevice():
         if self.coordinate_system == CoordinateSystem.ADB_NATIVE:
             return x, y
         else:
+            if self._display_dimensions is None:
+                self.refresh_display_dimensions()
             return _to_native_coordinates(
-                x, y, self.coordinate_system, self._get_display_dimensions())
+                x, y, self.coordinate_system, self._display_dimensions)
+
+    def _check_display_dimensions(self, img):
+        """Screenshots are the size of the screen in its current orientation,
+        so they tell us (for free) if we need to re-read the screen size."""
+        size = _Dimensions(width=img.shape[1], height=img.shape[0])
+        if self._display_dimensions not in (None, size):
+            logger.debug("AdbDevice: Screen size changed from %r to %r",
+                         self._display_dimensions, size)
+            self._display_dimensions = None
+
+    def _screencap_raw(self, attempt):
+        """Uncompressed screenshot, so the device doesn't have to spend
+        100s of ms PNG-encoding it. "exec-out" doesn't mangle line endings
+        like "shell" does on older versions of adb.
+        """
+        result = self.adb(["exec-out", "screencap"], timeout=60,
+                          capture_output=True)
+        if result.returncode != 0:
+            if _exec_out_unsupported(result.stderr, self._get_sdk_version):
+                logger.info("AdbDevice.get_frame: adb exec-out not supported "
+                            "(%r); falling back to PNG", result.stderr)
+                self._raw_screencap = False
+                return self._screencap_png(attempt)
+            # Probably transient (for example the connection to the device
+            # dropped), so we'll try raw screencap again.
+            logger.warning(
+                "AdbDevice.get_frame: adb exec-out screencap failed with exit "
+                "status %d (attempt %d/3): %r",
+                result.returncode, attempt, result.stderr)
+            return None
+        try:
+            img, header_size = _parse_raw_screencap(result.stdout)
+        except ValueError as e:
+            logger.info("AdbDevice.get_frame: Raw screencap not supported "
+                        "(%s); falling back to PNG", e)
+            self._raw_screencap = False
+            return self._screencap_png(attempt)
+        if img is None:
+            logger.warning(
+                "AdbDevice.get_frame: Failed to get screenshot via ADB "
+                "(attempt %d/3)\nHeader: %s, length: %d",
+                attempt, result.stdout[:16], len(result.stdout))
+        else:
+            self._screencap_header_size = header_size
+        return img
+
+    def _get_sdk_version(self):
+        result = self.adb(["shell", "getprop", "ro.build.version.sdk"],
+                          timeout=10, capture_output=True)
+        try:
+            return int(result.stdout)
+        except ValueError:
+            return None
+
+    def _screencap_png(self, attempt):
+        import cv2
+        import numpy
+
+        data = self.adb(["shell", "screencap", "-p"],
+                        timeout=60, capture_output=True) \
+                   .stdout
+        assert isinstance(data, bytes)
+        header = data[:10]
+        if data.startswith(b"\x89PNG\r\r\n"):
+            # Older versions of `adb shell` convert LF to CRLF.
+            # The PNG format is designed to detect this: It should start
+            # with 0x89, followed by "PNG", followed by CRLF.
+            data = data.replace(b"\r\n", b"\n")
+        img = cv2.imdecode(
+            numpy.asarray(bytearray(data), dtype=numpy.uint8),
+            cv2.IMREAD_COLOR)
+        if img is None:
+            logger.warning(
+                "AdbDevice.get_frame: Failed to get screenshot "
+                "via ADB (attempt %d/3)\n"
+                "Header: %s, length: %d", attempt, header, len(data))
+        return img
 
     def _get_display_dimensions(self):
         return _parse_display_dimensions(
@@ -446,6 +678,82 @@ class AdbError(Exception):
         return self.message
 
 
+class _AdbShell():
+    """A long-running ``adb shell`` process that we write commands to.
+
+    After each command we echo a unique marker followed by the command's exit
+    status, so we know when it has finished.
+    """
+    def __init__(self, device: AdbDevice):
+        self._device = device
+        self._process: subprocess.Popen | None = None
+        self._lock = threading.Lock()
+        self._count = itertools.count()
+
+    def run(self, command: str, timeout: float = 10) -> tuple[int, bytes]:
+        """Returns the exit status and the output of ``command``."""
+        with self._lock:
+            marker = b"__stbt_done_%d__" % next(self._count)
+            script = b"%s\necho %s $?\n" % (command.encode("utf-8"), marker)
+            if self._process is not None and self._process.poll() is not None:
+                logger.debug("AdbDevice: adb shell exited with status %s; "
+                             "restarting it", self._process.returncode)
+                self._process = None
+            for attempt in (1, 2):
+                if self._process is None:
+                    self._start()
+                try:
+                    self._process.stdin.write(script)
+                    self._process.stdin.flush()
+                    break
+                except OSError as e:
+                    # The shell can't have seen the command, so it's safe to
+                    # send it again.
+                    self._close()
+                    if attempt == 2:
+                        raise AdbError("Failed to write to adb shell: %s" % e,
+                                       cmd=command)
+            try:
+                return self._read_until(marker, command, timeout)
+            except:
+                # We don't know what state the shell is in now.
+                self._close()
+                raise
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._process is not None:
+            if self._process.poll() is None:
+                self._process.kill()
+            self._process.wait()
+            self._process = None
+
+    def _start(self):
+        self._process = self._device._Popen(
+            ["shell"], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def _read_until(self, marker, command, timeout):
+        fd = self._process.stdout.fileno()
+        end_time = time.time() + timeout
+        output = b""
+        while True:
+            m = re.search(rb"(?:^|\n)%s (\d+)\r?\n" % marker, output)
+            if m:
+                return int(m.group(1)), output[:m.start()]
+            remaining = end_time - time.time()
+            if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                raise subprocess.TimeoutExpired(command, timeout, output)
+            data = os.read(fd, 4096)
+            if not data:
+                raise AdbError("adb shell exited unexpectedly",
+                               returncode=self._process.wait(), cmd=command,
+                               output=output.decode("utf-8", "replace"))
+            output += data
+
+
 class _LogcatCollector():
     def __init__(self, filename, adb_device, logcat_args=None):
         self.filename = filename
@@ -806,6 +1114,15 @@ _KEYCODE_MAPPINGS = {
 }
 
 
+def _to_android_keycode(key):
+    # "adb shell input keyevent xxx" always returns success, so we need to
+    # validate key names.
+    key = _KEYCODE_MAPPINGS.get(key, key)  # Map Stb-tester names to Android's
+    if key not in _ANDROID_KEYCODES:
+        raise ValueError("Unknown key code %r" % (key,))
+    return key
+
+
 def _is_ip_address(address):
     """
     >>> _is_ip_address("")
@@ -824,6 +1141,99 @@ def _is_ip_address(address):
     return bool(re.match(r"^\d+\.\d+\.\d+\.\d+(:\d+)?$", str(address)))
 
 
+# From android.graphics.PixelFormat. Bytes per pixel, and the conversion to
+# BGR.
+_SCREENCAP_PIXEL_FORMATS = {
+    1: (4, "COLOR_RGBA2BGR"),  # RGBA_8888
+    2: (4, "COLOR_RGBA2BGR"),  # RGBX_8888
+    3: (3, "COLOR_RGB2BGR"),  # RGB_888
+    5: (4, "COLOR_BGRA2BGR"),  # BGRA_8888
+}
+
+
+def _parse_raw_screencap(data):
+    """Parse the output of ``screencap`` without ``-p``.
+
+    The output is a header of little-endian uint32s (width, height, pixel
+    format, and since Android 9 also the colour space) followed by the pixel
+    data. We work out the size of the header from the size of the output.
+
+    Returns a tuple of (BGR image, header size). The image is None if the data
+    is truncated. Raises `ValueError` if the pixel format isn't supported.
+    """
+    if len(data) < 12:
+        return None, None
+    width, height, pixel_format = struct.unpack_from("<III", data)
+    if pixel_format not in _SCREENCAP_PIXEL_FORMATS:
+        raise ValueError("Unsupported pixel format %d" % pixel_format)
+    bpp, _ = _SCREENCAP_PIXEL_FORMATS[pixel_format]
+    header_size = len(data) - width * height * bpp
+    if header_size not in (12, 16):
+        return None, None
+    return _raw_screencap_to_bgr(data, header_size), header_size
+
+
+def _exec_out_unsupported(stderr, get_sdk_version):
+    """True if adb's error output says that "adb exec-out" isn't supported
+    (by an old adb client, or by adbd on a device older than Android 5), as
+    opposed to a transient failure such as a dropped connection.
+
+    adbd on Android < 5 says "error: closed", but so does any adbd if the
+    connection drops, so in that case we ask the device for its Android API
+    level by calling ``get_sdk_version``. It returns None if that fails too.
+    """
+    stderr = stderr or b""
+    if re.search(rb"unknown command", stderr):
+        return True
+    if re.search(rb"error: closed", stderr):
+        sdk_version = get_sdk_version()
+        return sdk_version is not None and sdk_version < 21
+    return False
+
+
+def _read_raw_screencap(f, header_size):
+    """Read one raw screenshot from a stream of concatenated ``screencap``
+    outputs. Returns None at the end of the stream."""
+    header = bytearray(header_size)
+    if not _read_into(f, memoryview(header)):
+        return None
+    width, height, pixel_format = struct.unpack_from("<III", header)
+    if pixel_format not in _SCREENCAP_PIXEL_FORMATS:
+        raise AdbError("Unsupported screencap pixel format %d" % pixel_format)
+    bpp, _ = _SCREENCAP_PIXEL_FORMATS[pixel_format]
+    # Read the pixels straight into their final place after the header, so
+    # that we don't copy them before `_raw_screencap_to_bgr` converts them.
+    data = bytearray(header_size + width * height * bpp)
+    data[:header_size] = header
+    if not _read_into(f, memoryview(data)[header_size:]):
+        return None
+    return _raw_screencap_to_bgr(data, header_size)
+
+
+def _read_into(f, buf):
+    """Fill ``buf`` (a `memoryview`) from the binary stream ``f``. Returns
+    False if the stream ends first."""
+    while len(buf) > 0:
+        n = f.readinto(buf)
+        if not n:
+            return False
+        buf = buf[n:]
+    return True
+
+
+def _raw_screencap_to_bgr(data, header_size):
+    import cv2
+    import numpy
+
+    width, height, pixel_format = struct.unpack_from("<III", data)
+    bpp, conversion = _SCREENCAP_PIXEL_FORMATS[pixel_format]
+    # frombuffer doesn't copy the data; cvtColor makes the only copy.
+    pixels = numpy.frombuffer(data, dtype=numpy.uint8,
+                              count=width * height * bpp, offset=header_size)
+    return cv2.cvtColor(pixels.reshape((height, width, bpp)),
+                        getattr(cv2, conversion))
+
+
 def _resize(img, coordinate_system):
     import cv2
     import numpy
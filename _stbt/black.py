@@ -12,6 +12,7 @@ import warnings
 from typing import Optional
 
 import cv2
+import numpy
 
 from .config import get_config
 from .imgutils import (
@@ -76,25 +77,54 @@ def is_screen_black(frame: Optional[Frame] = None,
             DeprecationWarning, stacklevel=2)
         mask = region
 
-    mask_, region = load_mask(mask).to_array(_image_region(frame))
+    mask_ = load_mask(mask)
+    frame_region = _image_region(frame)
+    regions = mask_._to_regions(frame_region)
+    if regions is not None:
+        rects, region = regions
+    else:
+        mask_pixels, region = mask_.to_array(frame_region)
 
     draw_source_region(frame, region)
     imglog = ImageLogger("is_screen_black", region=region, threshold=threshold)
     imglog.imwrite("source", frame)
 
-    grayframe = cv2.cvtColor(crop(frame, region), cv2.COLOR_BGR2GRAY)
-    if mask_ is not None:
-        imglog.imwrite("mask", mask_)
-        cv2.bitwise_and(grayframe, mask_, dst=grayframe)
-    maxVal = grayframe.max()
+    sampled = False
+    if imglog.enabled:
+        # Debug images are easier to understand with a full pixel-mask.
+        if regions is not None:
+            mask_pixels, _ = mask_.to_array(frame_region)
+        grayframe = cv2.cvtColor(crop(frame, region), cv2.COLOR_BGR2GRAY)
+        if mask_pixels is not None:
+            imglog.imwrite("mask", mask_pixels)
+            cv2.bitwise_and(grayframe, mask_pixels, dst=grayframe)
+        maxVal = grayframe.max()
+    else:
+        if regions is None:
+            rects = (region,)
+        else:
+            # Only look at the masked-in pixels; no need to materialise a
+            # pixel-mask for masks made of Regions.
+            mask_pixels = None
+        maxVal = 0
+        if region.width * region.height >= _SAMPLE_MIN_PIXELS:
+            # Most frames aren't black, and a single non-black pixel is
+            # enough to prove it, so check a sparse lattice of pixels first.
+            # We only need to look at every pixel if all of these are black.
+            maxVal = _max_intensity(frame, rects, mask_pixels, _SAMPLE_STEP)
+            sampled = maxVal > threshold
+        if not sampled:
+            maxVal = _max_intensity(frame, rects, mask_pixels)
 
     result = _IsScreenBlackResult(bool(maxVal <= threshold), frame)
     debug("is_screen_black: {found} black screen using mask={mask}, "
-          "threshold={threshold}: {result}, maximum_intensity={maxVal}".format(
+          "threshold={threshold}: {result}, maximum_intensity{op}{maxVal}"
+          .format(
               found="Found" if result.black else "Didn't find",
               mask=mask,
               threshold=threshold,
               result=result,
+              op=">=" if sampled else "=",
               maxVal=maxVal))
 
     if imglog.enabled:
@@ -114,6 +144,35 @@ def is_screen_black(frame: Optional[Frame] = None,
     return result
 
 
+# Sampling every 10th pixel in each direction looks at 1% of the pixels.
+_SAMPLE_STEP = 10
+_SAMPLE_MIN_PIXELS = 100 * 100
+
+
+def _max_intensity(frame, rects, mask_pixels=None, step=1):
+    """Maximum grayscale intensity within ``rects`` of ``frame``, looking at
+    every ``step``-th pixel in each direction.
+
+    If ``mask_pixels`` is specified, ``rects`` must contain a single Region
+    the same size as ``mask_pixels``.
+    """
+    out = 0
+    for r in rects:
+        pixels = crop(frame, r)
+        if step > 1:
+            # cvtColor is per-pixel so this gives exactly the same values as
+            # converting the whole image and then sampling it.
+            pixels = numpy.ascontiguousarray(pixels[::step, ::step])
+        gray = cv2.cvtColor(pixels, cv2.COLOR_BGR2GRAY)
+        if mask_pixels is not None:
+            m = mask_pixels
+            if step > 1:
+                m = numpy.ascontiguousarray(m[::step, ::step])
+            cv2.bitwise_and(gray, m, dst=gray)
+        out = max(out, int(gray.max()))
+    return out
+
+
 class _IsScreenBlackResult():
     def __init__(self, black: bool, frame: Frame):
         self.black: bool = black
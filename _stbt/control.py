@@ -1,11 +1,14 @@
 import os
 import re
+import select
 import shutil
 import socket
 import struct
 import subprocess
 import sys
+import threading
 import time
+import weakref
 
 import requests
 
@@ -39,6 +42,19 @@ class RemoteControl():
         raise NotImplementedError(
             "%s: 'keyup' is not implemented" % self.__class__.__name__)
 
+    def press_sequence(self, keys, interpress_delay_secs=0):
+        """Press each of ``keys`` in turn, waiting at least
+        ``interpress_delay_secs`` between the end of one key-press and the
+        start of the next.
+
+        Subclasses can override this to send the whole sequence in a single
+        operation, if their transport supports it.
+        """
+        for i, key in enumerate(keys):
+            if i > 0 and interpress_delay_secs > 0:
+                time.sleep(interpress_delay_secs)
+            self.press(key)
+
 
 class UnknownKeyError(Exception):
     pass
@@ -201,36 +217,101 @@ class LircControl(RemoteControl):
     See http://www.lirc.org/html/technical.html#applications
     """
 
-    def __init__(self, control_name, connect_fn):
+    def __init__(self, control_name, connect_fn, sock=None):
         self.control_name = control_name
         self._connect = connect_fn
+        # We keep the connection to lircd open between key-presses, to avoid
+        # the latency of connecting (a TCP handshake, for remote lircds)
+        # every time. `_reader` buffers whatever lircd sent after the reply
+        # we were waiting for (such as the start of a broadcast message) so
+        # that we can continue from there next time. Protected by `_lock`.
+        self._socket = sock
+        self._reader = None
+        self._lock = threading.Lock()
 
     def press(self, key):
-        with self._connect() as s:
-            command = b"SEND_ONCE %s %s" % (to_bytes(self.control_name),
-                                            to_bytes(key))
-            s.sendall(command + b"\n")
-            _read_lircd_reply(s, command)
+        self._send(b"SEND_ONCE", key)
         debug("Pressed %s" % key)
 
     def keydown(self, key):
-        with self._connect() as s:
-            command = b"SEND_START %s %s" % (to_bytes(self.control_name),
-                                             to_bytes(key))
-            s.sendall(command + b"\n")
-            _read_lircd_reply(s, command)
+        self._send(b"SEND_START", key)
         debug("Holding %s" % key)
 
     def keyup(self, key):
-        with self._connect() as s:
-            command = b"SEND_STOP %s %s" % (to_bytes(self.control_name),
-                                            to_bytes(key))
-            s.sendall(command + b"\n")
-            _read_lircd_reply(s, command)
+        self._send(b"SEND_STOP", key)
         debug("Released %s" % key)
 
+    def close(self):
+        with self._lock:
+            if self._socket is not None:
+                _close_lircd_connection(self._socket, self._reader)
+                self._socket = None
+                self._reader = None
+
+    def _send(self, directive, key):
+        command = b"%s %s %s" % (directive, to_bytes(self.control_name),
+                                 to_bytes(key))
+        with self._lock:
+            s, reader = self._socket, self._reader
+            self._socket = self._reader = None
+            if s is not None and not _is_socket_open(s):
+                debug("LircControl: Connection closed by lircd; reconnecting")
+                _close_lircd_connection(s, reader)
+                s = None
+            if s is None:
+                s = self._connect()
+                reader = None
+            if reader is None:
+                reader = s.makefile("rb")
+            try:
+                try:
+                    s.sendall(command + b"\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # lircd went away since our health check. It can't have
+                    # seen the command, so it's safe to send it again.
+                    _close_lircd_connection(s, reader)
+                    s = self._connect()
+                    reader = s.makefile("rb")
+                    s.sendall(command + b"\n")
+                _read_lircd_reply(reader, command, s.gettimeout())
+            except _LircdError:
+                # lircd rejected the command, but the connection is fine.
+                self._socket, self._reader = s, reader
+                raise
+            except:
+                # Timeout or EOF: We don't know what state the connection is
+                # in, so don't reuse it.
+                _close_lircd_connection(s, reader)
+                raise
+            self._socket, self._reader = s, reader
+
+
+class _LircdError(RuntimeError):
+    pass
+
+
+def _is_socket_open(s):
+    """Health check for an idle connection: False if the peer has closed it.
+    """
+    try:
+        readable, _, _ = select.select([s], [], [], 0)
+        if not readable:
+            return True
+        # lircd may have sent broadcast messages that we haven't read yet; we
+        # leave those for `_read_lircd_reply` to skip over.
+        return s.recv(1, socket.MSG_PEEK) != b""
+    except (OSError, ValueError):
+        return False
+
+
+def _close_lircd_connection(sock, reader):
+    # The socket isn't really closed until the file from `makefile` is.
+    if reader is not None:
+        reader.close()
+    sock.close()
 
-def _read_lircd_reply(stream, command):
+
+def _read_lircd_reply(reader, command, timeout_secs):
     """Waits for lircd reply and checks if a LIRC send command was successful.
 
     Waits for a reply message from lircd (called "reply packet" in the LIRC
@@ -252,22 +333,26 @@ def _read_lircd_reply(stream, command):
     """
     reply = []
     try:
-        for line in read_records(stream, b"\n"):
+        while True:
+            line = reader.readline()
+            if not line:
+                break  # EOF
+            line = line.rstrip(b"\n")
             if line == b"BEGIN":
                 reply = []
             reply.append(line)
-            if line == b"END" and reply[1] == command:
+            if line == b"END" and len(reply) > 1 and reply[1] == command:
                 break
     except socket.timeout:
         raise RuntimeError(
             "Timed out: No reply from LIRC remote control within %d seconds"
-            % stream.gettimeout())
+            % timeout_secs)
     if b"SUCCESS" not in reply:
         if b"ERROR" in reply and len(reply) >= 6 and reply[3] == b"DATA":
             try:
                 num_data_lines = int(reply[4])
-                raise RuntimeError("LIRC remote control returned error: %s"
-                                   % b" ".join(reply[5:5 + num_data_lines]))
+                raise _LircdError("LIRC remote control returned error: %s"
+                                  % b" ".join(reply[5:5 + num_data_lines]))
             except ValueError:
                 pass
         raise RuntimeError("LIRC remote control returned unknown error")
@@ -294,10 +379,10 @@ def new_local_lirc_control(lircd_socket, control_name):
     # Connect once so that the test fails immediately if Lirc isn't running
     # (instead of failing at the first `press` in the script).
     debug("LircControl: Connecting to %s" % lircd_socket)
-    _connect()
+    s = _connect()
     debug("LircControl: Connected to %s" % lircd_socket)
 
-    return LircControl(control_name, _connect)
+    return LircControl(control_name, _connect, s)
 
 
 def new_tcp_lirc_control(control_name, hostname=None, port=None):
@@ -319,10 +404,10 @@ def new_tcp_lirc_control(control_name, hostname=None, port=None):
     # Connect once so that the test fails immediately if Lirc isn't running
     # (instead of failing at the first `press` in the script).
     debug("TCPLircControl: Connecting to %s:%d" % (hostname, port))
-    _connect()
+    s = _connect()
     debug("TCPLircControl: Connected to %s:%d" % (hostname, port))
 
-    return LircControl(control_name, _connect)
+    return LircControl(control_name, _connect, s)
 
 
 class RemoteFrameBuffer(RemoteControl):
@@ -434,18 +519,107 @@ class IRNetBoxControl(RemoteControl):
         self.config = irnetbox.RemoteControlConfig(config)
         # Connect once so that the test fails immediately if irNetBox not found
         # (instead of failing at the first `press` in the script).
-        debug("IRNetBoxControl: Connecting to %s" % hostname)
-        with self._connect() as irnb:
-            irnb.power_on()
-        time.sleep(0.5)
-        debug("IRNetBoxControl: Connected to %s" % hostname)
+        self._session = _IRNetBoxSession.get(self.hostname, self.port)
 
     def press(self, key):
-        with self._connect() as irnb:
-            irnb.irsend_raw(
-                port=self.output, power=100, data=self.config[key])
+        data = self.config[key]
+        self._session.irsend_raw(port=self.output, power=100, data=data)
         debug("Pressed %s" % key)
 
+    def close(self):
+        self._session.close()
+
+
+class _IRNetBoxSession():
+    """A connection to an irNetBox, shared by all the `IRNetBoxControl`s (one
+    per output) for that irNetBox in this process.
+
+    The irNetBox only accepts one TCP connection at a time, so other
+    processes (for example stbt controlling other outputs of the same
+    irNetBox) can't connect while we hold it open: Keep it as short-lived as
+    possible. We keep it open for a burst of key-presses, because connecting
+    takes a few round-trips (and on the MK2, a CPLD reset), but we close it
+    once it has been idle for `idle_timeout_secs`. Other processes that try
+    to connect in the meantime will get in then, because `irnetbox.IRNetBox`
+    retries for a few seconds if the connection is refused.
+    """
+    idle_timeout_secs = 0.5
+
+    _sessions = weakref.WeakValueDictionary()
+    _sessions_lock = threading.Lock()
+
+    @classmethod
+    def get(cls, hostname, port):
+        with cls._sessions_lock:
+            session = cls._sessions.get((hostname, port))
+            if session is None:
+                session = cls(hostname, port)
+                cls._sessions[(hostname, port)] = session
+            return session
+
+    def __init__(self, hostname, port):
+        self.hostname = hostname
+        self.port = port
+        # Protected by `_lock`:
+        self._lock = threading.Lock()
+        self._idle_timer = None
+        debug("IRNetBoxControl: Connecting to %s" % hostname)
+        self._irnb = self._connect()
+        self._irnb.power_on()
+        time.sleep(0.5)
+        debug("IRNetBoxControl: Connected to %s" % hostname)
+        with self._lock:
+            self._start_idle_timer()
+
+    def irsend_raw(self, port, power, data):
+        with self._lock:
+            self._cancel_idle_timer()
+            irnb = self._irnb
+            if irnb is not None and not _is_socket_open(irnb._socket):
+                debug("IRNetBoxControl: Connection closed by irNetBox; "
+                      "reconnecting")
+                irnb.close()
+                irnb = None
+            if irnb is None:
+                irnb = self._connect()
+            self._irnb = None
+            try:
+                irnb.irsend_raw(port=port, power=power, data=data)
+            except:
+                irnb.close()
+                raise
+            self._irnb = irnb
+            self._start_idle_timer()
+
+    def close(self):
+        with self._lock:
+            self._cancel_idle_timer()
+            if self._irnb is not None:
+                self._irnb.close()
+                self._irnb = None
+
+    def _start_idle_timer(self):
+        timer = threading.Timer(self.idle_timeout_secs, self._close_if_idle)
+        timer.daemon = True
+        self._idle_timer = timer
+        timer.start()
+
+    def _cancel_idle_timer(self):
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+
+    def _close_if_idle(self):
+        with self._lock:
+            if self._idle_timer is not threading.current_thread():
+                return  # There has been another key-press since.
+            self._idle_timer = None
+            if self._irnb is not None:
+                debug("IRNetBoxControl: Closing idle connection to %s" %
+                      self.hostname)
+                self._irnb.close()
+                self._irnb = None
+
     def _connect(self):
         try:
             return irnetbox.IRNetBox(self.hostname, self.port)
@@ -489,33 +663,51 @@ class RokuHttpControl(RemoteControl):
         "KEY_VOLUMEUP": "VolumeUp",
     }
 
-    def __init__(self, hostname, timeout_secs=3):
+    def __init__(self, hostname, timeout_secs=3, pool_size=1, retries=2):
         self.hostname = hostname
         self.timeout_secs = timeout_secs
+        self._session = _http_session(pool_size, retries)
 
     def press(self, key):
-        roku_keyname = self._KEYNAMES.get(key, key)
-        response = requests.post(
-            "http://%s:8060/keypress/%s" % (self.hostname, roku_keyname),
-            timeout=self.timeout_secs)
-        response.raise_for_status()
+        self._post("keypress", key)
         debug("Pressed %s" % key)
 
     def keydown(self, key):
-        roku_keyname = self._KEYNAMES.get(key, key)
-        response = requests.post(
-            "http://%s:8060/keydown/%s" % (self.hostname, roku_keyname),
-            timeout=self.timeout_secs)
-        response.raise_for_status()
+        self._post("keydown", key)
         debug("Holding %s" % key)
 
     def keyup(self, key):
+        self._post("keyup", key)
+        debug("Released %s" % key)
+
+    def _post(self, command, key):
         roku_keyname = self._KEYNAMES.get(key, key)
-        response = requests.post(
-            "http://%s:8060/keyup/%s" % (self.hostname, roku_keyname),
+        response = self._session.post(
+            "http://%s:8060/%s/%s" % (self.hostname, command, roku_keyname),
             timeout=self.timeout_secs)
         response.raise_for_status()
-        debug("Released %s" % key)
+
+
+def _http_session(pool_size=1, retries=2):
+    """A `requests.Session` that keeps HTTP connections open between requests.
+
+    :param int pool_size: The number of connections to keep open (per host).
+        You only need more than 1 if you send requests from several threads.
+    :param int retries: How many times to retry if we fail to connect. We
+        never retry a request that was sent, because key-presses aren't
+        idempotent.
+    """
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    adapter = HTTPAdapter(
+        pool_connections=1, pool_maxsize=pool_size,
+        max_retries=Retry(total=retries, connect=retries, read=0, redirect=0,
+                          status=0, other=0, backoff_factor=0.1))
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
 
 class RedRatHttpControlError(requests.HTTPError):
@@ -524,8 +716,8 @@ class RedRatHttpControlError(requests.HTTPError):
 
 class RedRatHttpControl(RemoteControl):
     """Send a key-press via RedRat HTTP REST API (see RedRat hub)."""
-    def __init__(self, url, timeout_secs=3):
-        self._session = requests.Session()
+    def __init__(self, url, timeout_secs=3, pool_size=1, retries=2):
+        self._session = _http_session(pool_size, retries)
         self._url = url
         self.timeout_secs = timeout_secs
 
@@ -115,6 +115,10 @@ class DeviceUnderTest():
             self._sink_pipeline.__exit__(exc_type, exc_value, tb)
             self._sink_pipeline = None
             self._mainloop.__exit__(exc_type, exc_value, tb)
+        if hasattr(self._control, "close"):
+            # Some controls keep a connection or a process open between
+            # key-presses.
+            self._control.close()
         self._control = None
 
     def last_keypress(self):
@@ -149,6 +153,43 @@ class DeviceUnderTest():
                 self._time.sleep(hold_secs)
             return out
 
+    def press_sequence(self, keys, interpress_delay_secs=None):
+        if interpress_delay_secs is None:
+            interpress_delay_secs = get_config(
+                "press", "interpress_delay_secs", type_=float)
+        keys = [key.value if isinstance(key, Enum) else key for key in keys]
+        if not keys:
+            return []
+        if section := get_config("control", "keymap_section", None):
+            mapped_keys = [get_config(section, key, default=key)
+                           for key in keys]
+        else:
+            mapped_keys = keys
+
+        with self._interpress_delay(interpress_delay_secs):
+            if self._display is None:
+                frame_before = None
+            else:
+                frame_before = self.get_frame()
+            start_time = self._time.time()
+            if hasattr(self._control, "press_sequence"):
+                self._control.press_sequence(mapped_keys,
+                                             interpress_delay_secs)
+            else:
+                # Not a `RemoteControl` subclass
+                for i, key in enumerate(mapped_keys):
+                    if i > 0:
+                        self._time.sleep(interpress_delay_secs)
+                    self._control.press(key)
+            end_time = self._time.time()
+        # The control may have sent the keys in a single operation, so we
+        # only know the timings of the sequence as a whole.
+        out = [Keypress(key, start_time, end_time, frame_before)
+               for key in keys]
+        self.draw_text(" ".join(keys), duration_secs=3)
+        self._last_keypress = out[-1]
+        return out
+
     @contextmanager
     def pressing(self, key, interpress_delay_secs=None):
         if isinstance(key, Enum):
@@ -257,6 +298,33 @@ class DeviceUnderTest():
                 "stbt.get_frame(): Video capture has not been initialised")
         return self._display.get_frame()
 
+    @contextmanager
+    def monitor_screen(self, mask=Region.ALL, black_threshold=None,
+                       noise_threshold=None):
+        """Check every video frame for a black screen or frozen video, in the
+        video-capture thread, for the duration of the ``with`` block.
+
+        Yields a `ScreenMonitor` that you can query (during or after the
+        ``with`` block) like this::
+
+            with dut.monitor_screen() as monitor:
+                start = time.time()
+                dut.press("KEY_CHANNELUP")
+                ...
+            assert not monitor.was_frozen(start, time.time())
+        """
+        from _stbt.monitor import ScreenMonitor
+        if self._display is None:
+            raise RuntimeError(
+                "monitor_screen: Video capture has not been initialised")
+        monitor = ScreenMonitor(mask, black_threshold, noise_threshold)
+        self._display.add_frame_observer(monitor.on_frame)
+        try:
+            yield monitor
+        finally:
+            if self._display is not None:
+                self._display.remove_frame_observer(monitor.on_frame)
+
 
 # stbt-run initialisation and convenience functions
 # (you will need these if writing your own version of stbt-run)
@@ -572,6 +640,9 @@ class Display():
         self.source_pipeline = None
         self.init_time = time.time()
         self.tearing_down = False
+        # Called with each new frame, in the GLib main loop thread. Replaced
+        # rather than mutated so we don't need a lock to iterate over it.
+        self._frame_observers = ()
 
         appsink = (
             "appsink name=appsink max-buffers=1 drop=false sync=true "
@@ -675,9 +746,20 @@ class Display():
         # See also: logging.draw_on
         frame._draw_sink = weakref.ref(self._sink_pipeline)
         self.tell_user_thread(frame)
+        for observer in self._frame_observers:
+            observer(frame)
         self._sink_pipeline.on_sample(sample)
         return Gst.FlowReturn.OK
 
+    def add_frame_observer(self, callback):
+        """``callback(frame)`` will be called for every frame as it arrives.
+        It runs in the video-capture thread so it must be quick."""
+        self._frame_observers = self._frame_observers + (callback,)
+
+    def remove_frame_observer(self, callback):
+        self._frame_observers = tuple(
+            x for x in self._frame_observers if x != callback)
+
     def tell_user_thread(self, frame_or_exception):
         # `self.last_frame` is how we communicate from this thread (the GLib
         # main loop) to the main application thread running the user's script.
@@ -5,9 +5,10 @@ import typing
 import cv2
 import numpy
 
-from .imgutils import Frame, FrameT, crop, _frame_repr, pixel_bounding_box
+from .imgutils import (
+    Frame, FrameT, crop, _frame_repr, _image_region, pixel_bounding_box)
 from .logging import debug, ddebug, ImageLogger
-from .mask import load_mask, MaskTypes
+from .mask import load_mask, MaskTypes, _regions_to_array
 from .types import Region, SizeT
 
 
@@ -171,10 +172,10 @@ class BGRDiff(Differ):
 
     def preprocess_mask(
             self, mask: MaskTypes, frame_region: Region):
-        return load_mask(mask).to_array(frame_region)
+        return _preprocess_mask(mask, frame_region)
 
     def diff(self, a, b, mask):
-        mask_pixels, region = mask
+        mask_pixels, region, rects = mask
         prev_frame = a
         frame = b
 
@@ -186,8 +187,20 @@ class BGRDiff(Differ):
         cframe = crop(frame, region)
         cprev = crop(prev_frame, region)
 
-        d = _threshold_diff_bgr(cprev, cframe, (self.threshold ** 2) * 3,
-                                imglog, mask_pixels)
+        if rects is not None and imglog.enabled:
+            # Debug images are easier to understand with a full pixel-mask.
+            mask_pixels = _regions_to_array(rects, _image_region(cframe))
+            rects = None
+
+        if rects is not None:
+            d = numpy.zeros(cframe.shape[:2], dtype=numpy.uint8)
+            for r in rects:
+                d[r.to_slice()] = _threshold_diff_bgr(
+                    crop(cprev, r), crop(cframe, r),
+                    (self.threshold ** 2) * 3, imglog, None)
+        else:
+            d = _threshold_diff_bgr(cprev, cframe, (self.threshold ** 2) * 3,
+                                    imglog, mask_pixels)
         if mask_pixels is not None:
             numpy.bitwise_and(d, mask_pixels[:, :, 0], out=d)
             imglog.imwrite("mask", mask_pixels)
@@ -216,6 +229,27 @@ class BGRDiff(Differ):
         return result
 
 
+def _preprocess_mask(mask: MaskTypes, frame_region: Region) \
+        -> tuple[numpy.ndarray | None, Region, tuple[Region, ...] | None]:
+    """The mask tuple shared by `BGRDiff` and `GrayscaleDiff`.
+
+    Returns ``(mask_pixels, region, rects)``. For masks made only of Regions,
+    ``rects`` is a list of non-overlapping rectangles (relative to ``region``)
+    and ``mask_pixels`` is ``None``, so we only process the masked-in pixels
+    instead of ANDing every frame with a pixel-mask.
+    """
+    mask = load_mask(mask)
+    regions = mask._to_regions(frame_region)
+    if regions is None:
+        mask_pixels, region = mask.to_array(frame_region)
+        return mask_pixels, region, None
+    rects, region = regions
+    if len(rects) == 1:
+        return None, region, None
+    return None, region, tuple(r.translate(-region.x, -region.y)
+                               for r in rects)
+
+
 def _threshold_diff_bgr(
         a: numpy.ndarray[numpy.uint8], b: numpy.ndarray[numpy.uint8],
         threshold: int,
@@ -336,16 +370,25 @@ class GrayscaleDiff(Differ):
 
     def preprocess_mask(
             self, mask: MaskTypes, frame_region: Region):
-        return load_mask(mask).to_array(frame_region)
+        return _preprocess_mask(mask, frame_region)
 
     def preprocess(self, frame, mask):
-        _, region = mask
-        return frame, cv2.cvtColor(crop(frame, region), cv2.COLOR_BGR2GRAY)
+        _, region, rects = mask
+        cframe = crop(frame, region)
+        if rects is None:
+            return frame, cv2.cvtColor(cframe, cv2.COLOR_BGR2GRAY)
+        # Pixels outside `rects` are left black in both frames so they will
+        # never show up as differences.
+        gray = numpy.zeros(cframe.shape[:2], dtype=numpy.uint8)
+        for r in rects:
+            gray[r.to_slice()] = cv2.cvtColor(crop(cframe, r),
+                                              cv2.COLOR_BGR2GRAY)
+        return frame, gray
 
     def diff(self, a, b, mask) -> MotionResult:
         _, prev_frame_gray = a
         frame, frame_gray = b
-        mask, region = mask
+        mask, region, rects = mask
 
         imglog = ImageLogger("GrayscaleDiff", region=region,
                              min_size=self.min_size,
@@ -357,6 +400,9 @@ class GrayscaleDiff(Differ):
         absdiff = cv2.absdiff(prev_frame_gray, frame_gray)
         imglog.imwrite("absdiff", absdiff)
 
+        if rects is not None and imglog.enabled:
+            mask = _regions_to_array(rects, _image_region(frame_gray))
+
         if mask is not None:
             absdiff = cv2.bitwise_and(absdiff, mask)
             imglog.imwrite("mask", mask)
@@ -46,6 +46,7 @@ RemoteControlConfig
 
 import binascii
 import errno
+import functools
 import random
 import re
 import socket
@@ -60,6 +61,10 @@ class IRNetBox():
             try:
                 self._socket = socket.socket()
                 self._socket.settimeout(10)
+                # So that we notice if the irNetBox goes away while we're
+                # holding the connection open between key-presses.
+                self._socket.setsockopt(
+                    socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
                 self._socket.connect((hostname, port))
                 break
             except socket.error as e:
@@ -75,12 +80,17 @@ class IRNetBox():
         self._responses = _read_responses(self._socket)
         self.irnetbox_model = 0
         self.ports = 16
+        # MK2 only: True if the CPLD has been reset since we last used it.
+        self._cpld_is_reset = False
         self._get_version()
 
     def __enter__(self):
         return self
 
     def __exit__(self, ex_type, ex_value, ex_traceback):
+        self.close()
+
+    def close(self):
         self._socket.close()
 
     def power_on(self):
@@ -107,6 +117,7 @@ class IRNetBox():
         self._send(
             MessageTypes.CPLD_INSTRUCTION,
             struct.pack("B", 0x00))
+        self._cpld_is_reset = True
 
     def indicators_on(self):
         """Enable LED indicators on the front panel (§5.2.4)."""
@@ -131,7 +142,10 @@ class IRNetBox():
         if self.irnetbox_model == NetBoxTypes.MK1:
             raise Exception("IRNetBox MK1 not supported")
         elif self.irnetbox_model == NetBoxTypes.MK2:
-            self.reset()
+            if not self._cpld_is_reset:
+                # Already done at the end of the previous `irsend_raw` if
+                # we're re-using the connection.
+                self.reset()
             self.indicators_on()
             self._send(MessageTypes.SET_MEMORY)
             self._send(MessageTypes.CPLD_INSTRUCTION, struct.pack("B", 0x00))
@@ -154,22 +168,20 @@ class IRNetBox():
             self._send(MessageTypes.OUTPUT_IR_SIGNAL)
             self.reset()
         else:
-            ports = [0] * self.ports
-            ports[port - 1] = power
             sequence_number = random.randint(0, (2 ** 16) - 1)
             delay = 0  # use the default delay of 100ms
             self._send(
                 MessageTypes.OUTPUT_IR_ASYNC,
-                struct.pack(
-                    ">HH{0}s{1}s".format(self.ports, len(data)),
-                    sequence_number,
-                    delay,
-                    struct.pack("{}B".format(self.ports), *ports),
-                    data))
+                struct.pack(">HH", sequence_number, delay) +
+                _output_ir_async_data(self.ports, port, power, data))
 
     def _send(self, message_type, message_data=b""):
+        self._cpld_is_reset = False
         self._socket.sendall(_message(message_type, message_data))
-        response_type, response_data = next(self._responses)
+        try:
+            response_type, response_data = next(self._responses)
+        except StopIteration:
+            raise ConnectionError("IRNetBox closed the connection")
         if response_type == MessageTypes.ERROR:
             raise Exception("IRNetBox returned ERROR")
         if response_type != message_type:
@@ -251,6 +263,16 @@ def _message(message_type, message_data):
         message_data)
 
 
+@functools.lru_cache(maxsize=256)
+def _output_ir_async_data(num_ports, port, power, data):
+    """The part of an OUTPUT_IR_ASYNC message (§6.1.1) that follows the
+    sequence number and delay. This is the same every time we send a given
+    signal, so we only build it once."""
+    ports = [0] * num_ports
+    ports[port - 1] = power
+    return struct.pack("{}B".format(num_ports), *ports) + data
+
+
 def _read_responses(stream):
     """Generator that splits stream into (type, data) tuples."""
 
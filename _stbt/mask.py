@@ -184,6 +184,28 @@ class Mask:
             raise ValueError(f"Invalid {color_channels=} (expected 1 or 3)")
         return _to_array_and_bounding_box_cached(self, region, color_channels)
 
+    def _to_regions(self, region: Region) \
+            -> tuple[tuple[Region, ...], Region] | None:
+        """Decompose the mask into a list of non-overlapping rectangles.
+
+        This is an alternative to `to_array` for masks built only from
+        Regions (for example ``Region.ALL - banner``), so that
+        image-processing algorithms can iterate over the masked-in rectangles
+        instead of ANDing every frame with a full-size pixel-mask.
+
+        :returns: ``None`` if the mask contains any pixel-masks (image files
+          or arrays). Otherwise a tuple of:
+
+          * A tuple of non-overlapping Regions (in frame coordinates) whose
+            union is the masked-in area.
+          * The bounding box around those Regions (the same as the bounding
+            box returned by `to_array`).
+        """
+        if region.x != 0 or region.y != 0:
+            raise ValueError(
+                f"{region} must be a full-frame region starting at x=0, y=0")
+        return _to_regions_cached(self, region)
+
     def __repr__(self):
         # In-order traversal, removing unnecessary parentheses.
         prefix = "~" if self._invert else ""
@@ -321,3 +343,98 @@ def _to_array(mask: Mask, region: Region) -> numpy.ndarray:
         array = ~array  # pylint:disable=invalid-unary-operand-type
 
     return array
+
+
+def _region_leaves(mask: Mask) -> list[Region] | None:
+    if mask._region is not None:
+        return [mask._region]
+    elif mask._binop is not None:
+        left = _region_leaves(mask._binop.left)
+        right = _region_leaves(mask._binop.right)
+        if left is None or right is None:
+            return None
+        return left + right
+    else:
+        return None
+
+
+def _contains_pixel(mask: Mask, x: int, y: int) -> bool:
+    if mask._region is not None:
+        r = mask._region
+        inside = r.x <= x < r.right and r.y <= y < r.bottom
+    elif mask._binop is not None:
+        n = mask._binop
+        if n.op == "+":
+            inside = (_contains_pixel(n.left, x, y) or
+                      _contains_pixel(n.right, x, y))
+        elif n.op == "-":
+            inside = (_contains_pixel(n.left, x, y) and
+                      not _contains_pixel(n.right, x, y))
+        else:
+            assert False, f"Unreachable: Unknown op {n.op}"
+    else:
+        assert False, "Internal logic error"
+    if mask._invert:
+        inside = not inside
+    return inside
+
+
+@lru_cache(maxsize=10)
+def _to_regions_cached(
+        mask: Mask,
+        region: Region) -> tuple[tuple[Region, ...], Region] | None:
+
+    leaves = _region_leaves(mask)
+    if leaves is None:
+        return None
+
+    # Split the frame into a grid along every edge of every Region in the
+    # mask. Each cell of the grid is either entirely masked-in or entirely
+    # masked-out, so we only need to test one pixel per cell.
+    xs, ys = {region.x, region.right}, {region.y, region.bottom}
+    for r in leaves:
+        r = Region.intersect(r, region)
+        if r:
+            xs.update((r.x, r.right))
+            ys.update((r.y, r.bottom))
+    xs, ys = sorted(xs), sorted(ys)
+
+    # Horizontal runs of masked-in cells for each row of the grid; rows with
+    # identical runs are merged vertically.
+    out: list[list[int]] = []  # [x, y, right, bottom]
+    prev_runs: list[tuple[int, int]] | None = None
+    prev_start = 0
+    for y, bottom in zip(ys, ys[1:]):
+        runs: list[tuple[int, int]] = []
+        for x, right in zip(xs, xs[1:]):
+            if _contains_pixel(mask, x, y):
+                if runs and runs[-1][1] == x:
+                    runs[-1] = (runs[-1][0], right)
+                else:
+                    runs.append((x, right))
+        if runs == prev_runs:
+            for rect in out[prev_start:]:
+                rect[3] = bottom
+        else:
+            prev_start = len(out)
+            out.extend([x, y, right, bottom] for x, right in runs)
+        prev_runs = runs
+
+    regions = tuple(Region.from_extents(*r) for r in out)
+    bounding_box = Region.bounding_box(*regions)
+    if bounding_box is None:
+        logger.warning("%r is an empty Region", mask)
+        raise ValueError("%r doesn't overlap with the frame's %r"
+                         % (mask, region))
+    return regions, bounding_box
+
+
+def _regions_to_array(regions: "tuple[Region, ...]",
+                      bounding_box: Region) -> numpy.ndarray:
+    """Rasterise the output of `Mask._to_regions` into a pixel-mask the size
+    of ``bounding_box``, like the array returned by `Mask.to_array`."""
+    array = numpy.zeros((bounding_box.height, bounding_box.width, 1),
+                        dtype=numpy.uint8)
+    for r in regions:
+        array[r.translate(-bounding_box.x, -bounding_box.y).to_slice()] = 255
+    return array
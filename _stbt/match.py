@@ -10,6 +10,8 @@ from __future__ import annotations
 
 import enum
 import itertools
+import threading
+import weakref
 from collections import namedtuple
 from typing import Iterator, Optional
 
@@ -608,7 +610,7 @@ def _find_candidate_matches(image, template, match_parameters, imglog):
     mask_pyramid = _build_pyramid(mask, levels, is_mask=True)
     template_pyramid = _build_pyramid(template, len(mask_pyramid),
                                       is_template=True)
-    image_pyramid = _build_pyramid(image, len(template_pyramid))
+    image_pyramid = _build_frame_pyramid(image, len(template_pyramid), levels)
     roi_mask = None  # Initial region of interest: The whole image.
 
     for level in reversed(range(len(image_pyramid))):
@@ -832,6 +834,77 @@ def _build_pyramid(image, levels, is_template=False, is_mask=False):
     return pyramid
 
 
+# The pyramid of the most recently searched frame, so that searching the same
+# frame (and region) for several reference images doesn't build the frame's
+# pyramid again each time. We only cache read-only frames (like the frames
+# from `get_frame` and `frames`), because their pixels can't change under us.
+# The cache is per thread, so that threads searching different frames (for
+# example, from different devices) don't evict each other's entries; and it
+# only holds a weak reference to the frame, so it doesn't keep the frame (or
+# its pyramid) alive once nothing else is using it.
+_frame_pyramid_cache = threading.local()
+
+
+class _CachedFramePyramid():
+    def __init__(self, image, max_levels, pyramid):
+        # Levels 1 and up; level 0 is `image` itself, which we don't keep.
+        self.lower_levels = lower_levels = pyramid[1:]
+        self.max_levels = max_levels
+        self.image_key = _pixels_key(image)
+        # Free the pyramid when the frame is freed:
+        self.frame_ref = weakref.ref(
+            _root_array(image), lambda _: lower_levels.clear())
+
+    def get(self, image, levels):
+        if (self.max_levels >= levels and
+                self.image_key == _pixels_key(image) and
+                self.frame_ref() is _root_array(image) and
+                _is_read_only(image)):
+            return [image] + self.lower_levels[:levels - 1]
+        return None
+
+
+def _build_frame_pyramid(image, levels, max_levels):
+    """`_build_pyramid(image, levels)`, reusing the pyramid from the previous
+    call (on this thread) if `image` is the same read-only frame.
+    `levels <= max_levels`; we cache `max_levels` levels so that the pyramid
+    can be reused for any reference image."""
+    cached = getattr(_frame_pyramid_cache, "pyramid", None)
+    if cached is not None:
+        pyramid = cached.get(image, levels)
+        if pyramid is not None:
+            return pyramid
+    if not _is_read_only(image):
+        return _build_pyramid(image, levels)
+    pyramid = _build_pyramid(image, max_levels)
+    for level in pyramid[1:]:
+        level.flags.writeable = False
+    _frame_pyramid_cache.pyramid = _CachedFramePyramid(
+        image, max_levels, pyramid)
+    return pyramid[:levels]
+
+
+def _pixels_key(a):
+    """Identifies the pixels that numpy array `a` is a view onto, within the
+    array that owns them (see `_root_array`)."""
+    return (a.__array_interface__["data"][0], a.shape, a.strides, a.dtype)
+
+
+def _root_array(a):
+    """The numpy array at the bottom of `a`'s chain of views."""
+    while isinstance(a.base, numpy.ndarray):
+        a = a.base
+    return a
+
+
+def _is_read_only(a):
+    while isinstance(a, numpy.ndarray):
+        if a.flags.writeable:
+            return False
+        a = a.base
+    return True
+
+
 def _upsample(position, levels):
     """Convert position coordinates by the given number of pyramid levels.
 
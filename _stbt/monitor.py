@@ -0,0 +1,238 @@
+"""Continuous black-screen and frozen-video detection.
+
+Copyright 2026 Stb-tester.com Ltd.
+License: LGPL v2.1 or (at your option) any later version (see
+https://github.com/stb-tester/stb-tester/blob/master/LICENSE for details).
+"""
+
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left, bisect_right
+from typing import Optional
+
+import numpy
+
+from .black import _max_intensity, _SAMPLE_STEP
+from .config import get_config
+from .diff import _threshold_diff_bgr_numpy
+from .imgutils import crop, Frame, _image_region
+from .logging import debug, warn
+from .mask import load_mask, MaskTypes
+from .types import Region
+
+
+class ScreenMonitor():
+    """Checks every frame for a black screen or frozen video as it arrives
+    from the video-capture pipeline, and records the results so that you can
+    ask afterwards whether the screen was black or frozen at any point during
+    a period of time.
+
+    This is much cheaper than calling `is_screen_black` or `detect_motion`
+    on every frame yourself: We look at a sparse lattice of pixels first, and
+    only examine every pixel when the lattice alone can't prove that a frame
+    isn't black (or isn't frozen). The results are stored as a timeline of
+    periods, so queries take O(log n) time.
+
+    Use it via `stbt.monitor_screen`, or call `on_frame` yourself
+    for offline analysis.
+
+    :param mask: The parts of the frame to analyse. See `is_screen_black`.
+    :param int black_threshold: See the ``threshold`` parameter of
+        `is_screen_black`.
+    :param int noise_threshold: See the ``noise_threshold`` parameter of
+        `detect_motion`. A frame is "frozen" if no pixel differs from the
+        previous frame by more than this.
+    :param int max_periods: The maximum number of black and frozen periods to
+        remember. When this is exceeded we forget the oldest half.
+    """
+    def __init__(self, mask: MaskTypes = Region.ALL,
+                 black_threshold: Optional[int] = None,
+                 noise_threshold: Optional[int] = None,
+                 max_periods: int = 100000):
+        if black_threshold is None:
+            black_threshold = get_config(
+                'is_screen_black', 'threshold', type_=int)
+        if noise_threshold is None:
+            noise_threshold = get_config(
+                'motion', 'noise_threshold', type_=int)
+        self.mask = load_mask(mask)
+        self.black_threshold = black_threshold
+        self.noise_threshold = noise_threshold
+
+        self.black = _Timeline(max_periods)
+        self.frozen = _Timeline(max_periods)
+
+        self._lock = threading.Lock()
+        self._frame_region: Optional[Region] = None
+        self._rects: tuple[Region, ...] = ()
+        self._mask_pixels: Optional[numpy.ndarray] = None
+        self._prev: Optional[Frame] = None
+        self._prev_sample: list[numpy.ndarray] = []
+        self._warned = False
+
+        self.first_frame_time: Optional[float] = None
+        self.last_frame_time: Optional[float] = None
+        self.frame_count = 0
+
+    def was_black(self, start_time: float = None,
+                  end_time: float = None) -> bool:
+        """True if any frame with a timestamp between ``start_time`` and
+        ``end_time`` (inclusive) was black. ``None`` means unbounded."""
+        with self._lock:
+            return self.black.any(start_time, end_time)
+
+    def was_frozen(self, start_time: float = None,
+                   end_time: float = None) -> bool:
+        """True if any frame with a timestamp between ``start_time`` and
+        ``end_time`` (inclusive) was identical to the frame before it."""
+        with self._lock:
+            return self.frozen.any(start_time, end_time)
+
+    def black_periods(self, start_time: float = None,
+                      end_time: float = None) -> list[tuple[float, float]]:
+        """The ``(start_time, end_time)`` of each run of consecutive black
+        frames that overlaps the given period. Both times are frame
+        timestamps."""
+        with self._lock:
+            return self.black.periods(start_time, end_time)
+
+    def frozen_periods(self, start_time: float = None,
+                       end_time: float = None) -> list[tuple[float, float]]:
+        """The ``(start_time, end_time)`` of each run of frozen frames that
+        overlaps the given period. ``start_time`` is the timestamp of the
+        frame that stayed on screen, so the duration of a freeze is
+        ``end_time - start_time``."""
+        with self._lock:
+            return self.frozen.periods(start_time, end_time)
+
+    def on_frame(self, frame: Frame) -> None:
+        """Analyse ``frame``. Frames must be given in timestamp order.
+
+        Called from the video-capture thread, so this never raises: If
+        analysis fails we log a warning and ignore the frame.
+        """
+        try:
+            black, frozen = self._analyse(frame)
+        except Exception as e:  # pylint:disable=broad-except
+            if not self._warned:
+                warn("ScreenMonitor: Failed to analyse frame: %s" % e)
+                self._warned = True
+            return
+
+        t = frame.time
+        with self._lock:
+            if self.first_frame_time is None:
+                self.first_frame_time = t
+            if black:
+                self.black.add(t, self.last_frame_time)
+            if frozen:
+                self.frozen.add(t, self.last_frame_time,
+                                start_time=self.last_frame_time)
+            self.last_frame_time = t
+            self.frame_count += 1
+
+    def _analyse(self, frame):
+        frame_region = _image_region(frame)
+        if frame_region != self._frame_region:
+            # First frame, or the video resolution changed.
+            self._frame_region = frame_region
+            regions = self.mask._to_regions(frame_region)
+            if regions is None:
+                self._mask_pixels, region = self.mask.to_array(frame_region)
+                self._rects = (region,)
+            else:
+                self._mask_pixels = None
+                self._rects = regions[0]
+            self._prev, self._prev_sample = None, []
+            debug("ScreenMonitor: Analysing %s of %s" % (
+                self._rects, frame_region))
+
+        max_ = _max_intensity(frame, self._rects, self._mask_pixels,
+                              _SAMPLE_STEP)
+        if max_ <= self.black_threshold:
+            max_ = _max_intensity(frame, self._rects, self._mask_pixels)
+        black = max_ <= self.black_threshold
+
+        # A frame is frozen if it's the same as the previous frame. Checking
+        # the lattice of pixels is enough to prove that it isn't.
+        threshold = (self.noise_threshold ** 2) * 3
+        sample = [numpy.ascontiguousarray(crop(frame, r)[::_SAMPLE_STEP,
+                                                         ::_SAMPLE_STEP])
+                  for r in self._rects]
+        frozen = False
+        if self._prev is not None:
+            mask_sample = None
+            if self._mask_pixels is not None:
+                mask_sample = numpy.ascontiguousarray(
+                    self._mask_pixels[::_SAMPLE_STEP, ::_SAMPLE_STEP])
+            frozen = not any(
+                _differs(a, b, threshold, mask_sample)
+                for a, b in zip(self._prev_sample, sample))
+            if frozen:
+                frozen = not any(
+                    _differs(crop(self._prev, r), crop(frame, r), threshold,
+                             self._mask_pixels)
+                    for r in self._rects)
+        self._prev, self._prev_sample = frame, sample
+        return black, frozen
+
+
+def _differs(a, b, threshold, mask_pixels=None):
+    if numpy.array_equal(a, b):
+        # Frozen video from a digital source is usually bit-identical, and
+        # this is much cheaper than the thresholded diff.
+        return False
+    try:
+        from . import libstbt
+        d = libstbt.threshold_diff_bgr(a, b, threshold)
+    except (ImportError, NotImplementedError):
+        d = _threshold_diff_bgr_numpy(a, b, threshold)
+    if mask_pixels is not None:
+        d &= mask_pixels[:, :, 0]
+    return bool(d.any())
+
+
+class _Timeline():
+    """Sorted, non-overlapping periods of time, built up one frame at a time.
+
+    Consecutive matching frames are merged into a single period, so the
+    memory used is proportional to the number of changes, not the number of
+    frames.
+    """
+    def __init__(self, max_periods=100000):
+        self.starts: list[float] = []
+        self.ends: list[float] = []
+        self.max_periods = max_periods
+
+    def add(self, t, prev_t=None, start_time=None):
+        """Record that the frame at time ``t`` matched. ``prev_t`` is the
+        timestamp of the frame before it: If that matched too we extend the
+        current period instead of starting a new one at ``start_time``
+        (defaults to ``t``)."""
+        if self.ends and prev_t is not None and self.ends[-1] == prev_t:
+            self.ends[-1] = t
+            return
+        self.starts.append(t if start_time is None else start_time)
+        self.ends.append(t)
+        if len(self.starts) > self.max_periods:
+            n = len(self.starts) // 2
+            del self.starts[:n]
+            del self.ends[:n]
+
+    def any(self, start_time=None, end_time=None):
+        if not self.starts:
+            return False
+        # The first period that ends at or after `start_time`:
+        if start_time is None:
+            i = 0
+        else:
+            i = bisect_left(self.ends, start_time)
+        return i < len(self.starts) and (
+            end_time is None or self.starts[i] <= end_time)
+
+    def periods(self, start_time=None, end_time=None):
+        i = 0 if start_time is None else bisect_left(self.ends, start_time)
+        j = (len(self.starts) if end_time is None
+             else bisect_right(self.starts, end_time))
+        return list(zip(self.starts[i:j], self.ends[i:j]))
@@ -267,7 +267,29 @@ class _FakeAviosys8800ProSerial():
         return len(data)
 
 
-class _RittalSnmpPower(PDU):
+class _SnmpOutlet(PDU):
+    """Base class for PDUs that we control by setting an integer SNMP OID.
+
+    Subclasses define how to map power on/off to the value to set, and how to
+    check the PDU's response, so that `set_power_outlets` can set many
+    outlets on the same PDU in a single SNMP request.
+    """
+    _snmp: _SnmpInteger
+
+    # After setting the OID, poll it (for up to this many seconds) until it
+    # reads back as the value that the PDU returned from the set.
+    SETTLE_SECS = 0
+
+    def _value_for(self, power: bool) -> int:
+        raise NotImplementedError()
+
+    def _check_set_result(self, power: bool, result: int) -> None:
+        """Raise if ``result`` (the value returned by the PDU in response to
+        our set) indicates an error."""
+        raise NotImplementedError()
+
+
+class _RittalSnmpPower(_SnmpOutlet):
     """
     Tested with the DK 7955.310.  SNMP OIDs may be different on other devices.
     """
@@ -299,14 +321,23 @@ class _RittalSnmpPower(PDU):
         return bool(self._snmp.get())
 
     def set(self, power):
-        if self._snmp.set(int(bool(power))) != int(bool(power)):
+        self._check_set_result(power, self._snmp.set(self._value_for(power)))
+
+    def _value_for(self, power):
+        return int(bool(power))
+
+    def _check_set_result(self, power, result):
+        if result != int(bool(power)):
             raise RuntimeError("Setting power failed with unknown error")
 
 
-class _ATEN_PE6108G(PDU):
+class _ATEN_PE6108G(_SnmpOutlet):
     """Class to control the ATEN PDU using pysnmp module. """
     AUTH_DEFAULTS = {"version": "2c", "community": "administrator"}
 
+    # ATEN PE6108G outlets take between 4-8 seconds to power on
+    SETTLE_SECS = 12
+
     def __init__(
             self, address: tuple[str, int], outlet: int, snmp_auth: "SnmpAuth"):
         outlet = int(outlet)
@@ -325,10 +356,9 @@ class _ATEN_PE6108G(PDU):
         return cls(address, int(config['outlet']), auth)
 
     def set(self, power):
-        new_state = self._snmp.set(2 if power else 1)
+        new_state = self._snmp.set(self._value_for(power))
 
-        # ATEN PE6108G outlets take between 4-8 seconds to power on
-        for _ in range(12):
+        for _ in range(self.SETTLE_SECS):
             time.sleep(1)
             if self._snmp.get() == new_state:
                 return
@@ -336,13 +366,19 @@ class _ATEN_PE6108G(PDU):
             "Timeout waiting for outlet to power {}".format(
                 "ON" if power else "OFF"))
 
+    def _value_for(self, power):
+        return 2 if power else 1
+
+    def _check_set_result(self, power, result):
+        pass
+
     def get(self):
         result = self._snmp.get()
         # 3 represents moving between states
         return {3: False, 2: True, 1: False}[result]
 
 
-class _APC7xxx(PDU):
+class _APC7xxx(_SnmpOutlet):
     """Class to control the APC 7xxx PDU using pysnmp module. """
     PORT_STATE_CONTROL_OID = "1.3.6.1.4.1.318.1.1.12.3.3.1.1.4.{outlet}"
 
@@ -370,12 +406,15 @@ class _APC7xxx(PDU):
         return cls(address, int(section["outlet"]), auth)
 
     def set(self, power: bool):
-        desired = int(
-            self.Cmd.IMMEDIATE_ON if power else self.Cmd.IMMEDIATE_OFF)
-        new_state = self._snmp.set(desired)
-        if new_state != desired:
+        self._check_set_result(power, self._snmp.set(self._value_for(power)))
+
+    def _value_for(self, power):
+        return int(self.Cmd.IMMEDIATE_ON if power else self.Cmd.IMMEDIATE_OFF)
+
+    def _check_set_result(self, power, result):
+        if result != self._value_for(power):
             raise RuntimeError(
-                "Setting power failed: Got %s" % self.Cmd(new_state))
+                "Setting power failed: Got %s" % self.Cmd(result))
 
     def get(self):
         result = self.Cmd(self._snmp.get())
@@ -542,8 +581,12 @@ class _SnmpInteger():
     def __init__(self, address: "tuple[str, int]", oid: str, auth: "SnmpAuth"):
         from pysnmp.entity.rfc3413.oneliner.cmdgen import UdpTransportTarget
         self.oid = oid
+        self.address = address
         self._transport = UdpTransportTarget(address)
         self._auth = auth
+        # Creating a CommandGenerator creates a new SNMP engine, which is
+        # expensive, so we reuse it for every get & set on this outlet.
+        self._command_generator = None
 
     def set(self, value: int) -> int:
         return self._cmd(value)
@@ -556,7 +599,9 @@ class _SnmpInteger():
         from pysnmp.proto.rfc1905 import NoSuchObject
         from pysnmp.proto.rfc1902 import Integer
 
-        command_generator = cmdgen.CommandGenerator()
+        if self._command_generator is None:
+            self._command_generator = cmdgen.CommandGenerator()
+        command_generator = self._command_generator
 
         if value is None:  # `status` command
             error_ind, _, _, var_binds = command_generator.getCmd(
@@ -578,6 +623,172 @@ class _SnmpInteger():
 
         return int(result)
 
+    def group_key(self):
+        """`_SnmpInteger`s with the same key can be sent in the same SNMP
+        request."""
+        return (self.address, type(self._auth).__name__,
+                tuple(sorted((k, repr(v))
+                             for k, v in vars(self._auth).items())))
+
+
+def _snmp_multi_cmd(command_generator, snmps: "list[_SnmpInteger]",
+                    values: "list[int] | None") -> "list[int]":
+    """Get or set several OIDs on the same PDU in a single SNMP request.
+
+    The SNMP agent applies all of the sets, or none of them.
+    """
+    from pysnmp.proto.rfc1905 import NoSuchObject
+    from pysnmp.proto.rfc1902 import Integer
+
+    auth, transport = snmps[0]._auth, snmps[0]._transport
+    if values is None:
+        error_ind, error_status, error_index, var_binds = \
+            command_generator.getCmd(auth, transport,
+                                     *[x.oid for x in snmps])
+    else:
+        error_ind, error_status, error_index, var_binds = \
+            command_generator.setCmd(
+                auth, transport,
+                *[(x.oid, Integer(v)) for x, v in zip(snmps, values)])
+
+    if error_ind is not None:
+        raise RuntimeError("SNMP Error ({})".format(error_ind))
+    if error_status:
+        raise RuntimeError("SNMP Error ({} at OID {})".format(
+            error_status.prettyPrint(),
+            snmps[int(error_index) - 1].oid if error_index else "?"))
+
+    out = []
+    for _, result in var_binds:
+        if isinstance(result, NoSuchObject):
+            raise RuntimeError("No such outlet")
+        if not isinstance(result, Integer):
+            raise RuntimeError("Unexpected result ({})".format(result))
+        out.append(int(result))
+    return out
+
+
+class PowerResult(typing.NamedTuple):
+    """The result of setting one outlet with `set_power_outlets`."""
+    outlet: PDU
+    power: bool
+    start_time: float
+    end_time: float
+    #: None if the outlet was set successfully.
+    error: "Exception | None" = None
+
+    @property
+    def duration(self) -> float:
+        return self.end_time - self.start_time
+
+
+def set_power_outlets(outlets: "typing.Sequence[PDU]", power: bool,
+                      max_workers: int = 16) -> "list[PowerResult]":
+    """Turn many outlets on or off at the same time.
+
+    Outlets on the same SNMP-controlled PDU (with the same address and
+    credentials) are set with a single SNMP request, using a single SNMP
+    engine. Each PDU, and each outlet of other types, is handled concurrently
+    in a pool of ``max_workers`` threads.
+
+    This doesn't raise if some of the outlets fail; check the ``error``
+    attribute of the returned `PowerResult` for each outlet. The results are
+    in the same order as ``outlets``.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    results: "list[PowerResult | None]" = [None] * len(outlets)
+    jobs: "dict[typing.Any, list[int]]" = {}
+    for i, outlet in enumerate(outlets):
+        if isinstance(outlet, _SnmpOutlet):
+            jobs.setdefault(outlet._snmp.group_key(), []).append(i)
+        else:
+            jobs[("outlet", i)] = [i]
+
+    def run(indices):
+        if len(indices) > 1:
+            group_results = _set_snmp_outlets(
+                [outlets[i] for i in indices], power)  # type: ignore
+        else:
+            group_results = [_set_power_outlet(outlets[indices[0]], power)]
+        for i, result in zip(indices, group_results):
+            results[i] = result
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for future in [executor.submit(run, x) for x in jobs.values()]:
+            future.result()
+    return results  # type: ignore
+
+
+def _set_power_outlet(outlet: PDU, power: bool) -> PowerResult:
+    start_time = time.time()
+    try:
+        outlet.set(power)
+    except Exception as e:  # pylint:disable=broad-except
+        return PowerResult(outlet, power, start_time, time.time(), e)
+    return PowerResult(outlet, power, start_time, time.time())
+
+
+def _set_snmp_outlets(outlets: "list[_SnmpOutlet]",
+                      power: bool) -> "list[PowerResult]":
+    from pysnmp.entity.rfc3413.oneliner import cmdgen
+
+    results: "list[PowerResult | None]" = [None] * len(outlets)
+
+    def report(n, result):
+        results[n] = result
+
+    command_generator = cmdgen.CommandGenerator()
+    snmps = [outlet._snmp for outlet in outlets]
+    start_time = time.time()
+    try:
+        new_states = _snmp_multi_cmd(
+            command_generator, snmps,
+            [outlet._value_for(power) for outlet in outlets])
+    except Exception:  # pylint:disable=broad-except
+        # The PDU rejected the whole request. Set them one at a time so that
+        # we can tell which outlets failed.
+        return [_set_power_outlet(outlet, power) for outlet in outlets]
+
+    pending = {}
+    for n, (outlet, new_state) in enumerate(zip(outlets, new_states)):
+        try:
+            outlet._check_set_result(power, new_state)
+        except Exception as e:  # pylint:disable=broad-except
+            report(n, PowerResult(outlet, power, start_time, time.time(), e))
+            continue
+        if outlet.SETTLE_SECS:
+            pending[n] = new_state
+        else:
+            report(n, PowerResult(outlet, power, start_time, time.time()))
+
+    # Poll all the outlets that take a while to change state with one request
+    # per second, until they have all changed (or timed out).
+    for attempt in range(1, max((outlets[n].SETTLE_SECS for n in pending),
+                                default=0) + 1):
+        if not pending:
+            break
+        time.sleep(1)
+        indices = list(pending)
+        try:
+            states = _snmp_multi_cmd(
+                command_generator, [snmps[n] for n in indices], None)
+        except Exception:  # pylint:disable=broad-except
+            states = [None] * len(indices)
+        now = time.time()
+        for n, state in zip(indices, states):
+            if state == pending[n]:
+                report(n, PowerResult(outlets[n], power, start_time, now))
+                del pending[n]
+            elif attempt >= outlets[n].SETTLE_SECS:
+                report(n, PowerResult(
+                    outlets[n], power, start_time, now, RuntimeError(
+                        "Timeout waiting for outlet to power {}".format(
+                            "ON" if power else "OFF"))))
+                del pending[n]
+
+    return results  # type: ignore
+
 
 class Kasa(PDU):
     """TP-Link Kasa smart plugs."""
@@ -113,7 +113,8 @@ class StbtChecker(BaseChecker):
                 self.add_message('E7006', node=node)
 
             if re.search(
-                    r"\b(press|press_and_wait|pressing|press_until_match)$",
+                    r"\b(press|press_and_wait|press_sequence|pressing|"
+                    r"press_until_match)$",
                     node.func.as_string()):
                 self.add_message('E7007', node=node, args=node.func.as_string())
 
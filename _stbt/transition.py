@@ -15,14 +15,16 @@ from __future__ import annotations
 
 import enum
 import warnings
-from typing import Iterator, Optional
+from typing import Iterable, Iterator, Optional, Sequence
+
+import numpy
 
 from .diff import BGRDiff, Differ
 from .imgutils import FrameT
 from .logging import ddebug, debug, draw_on, warn
 from .mask import MaskTypes
 from .motion import DetectMotion
-from .types import KeyT, Region, SizeT
+from .types import Keypress, KeyT, Region, SizeT
 
 
 def press_and_wait(
@@ -35,6 +37,7 @@ def press_and_wait(
     retries: int = 0,
     frames: Optional[Iterator[FrameT]] = None,
     _dut=None,
+    _recorder: Optional[TransitionAnalyzer] = None,
 ) -> Transition:
 
     """Press a key, then wait for the screen to change, then wait for it to stop
@@ -107,20 +110,21 @@ def press_and_wait(
         mask = region
 
     result = _press_and_wait(key, mask, timeout_secs, stable_secs,
-                             min_size, frames, _dut)
+                             min_size, frames, _dut, _recorder)
     for i in range(retries):
         if result.status != TransitionStatus.START_TIMEOUT:
             return result
         warn("Keypress %s had no effect; retrying %i/%i", key, i + 1, retries)
         result = _press_and_wait(key, mask, timeout_secs, stable_secs,
-                                 min_size, frames, _dut)
+                                 min_size, frames, _dut, _recorder)
     return result
 
 
 def _press_and_wait(key, mask, timeout_secs, stable_secs, min_size,
-                    frames, _dut) -> Transition:
+                    frames, _dut, _recorder=None) -> Transition:
 
-    t = _Transition(mask, timeout_secs, stable_secs, min_size, frames)
+    t = _Transition(mask, timeout_secs, stable_secs, min_size, frames,
+                    _recorder)
     press_result = _dut.press(key)
     debug("transition: %.3f: Pressed %s" % (press_result.end_time, key))
     result = t.wait(press_result)
@@ -187,28 +191,41 @@ def wait_for_transition_to_end(
 class _Transition():
     def __init__(self, mask: MaskTypes, timeout_secs: float,
                  stable_secs: float, min_size: SizeT | None,
-                 frames: Iterator[FrameT]):
+                 frames: Iterator[FrameT],
+                 recorder: Optional[TransitionAnalyzer] = None):
         self.mask = mask
         self.timeout_secs = timeout_secs
         self.stable_secs = stable_secs
         self.min_size = min_size
         self.frames = frames
+        self.recorder = recorder
 
         self.expiry_time = None
 
     def wait(self, press_result):
         self.expiry_time = press_result.end_time + self.timeout_secs
+        if self.recorder is not None:
+            self.recorder._start_keypress()
 
         differ = press_and_wait.differ.replace(min_size=self.min_size)
         dm = DetectMotion(differ, press_result.frame_before, self.mask)
 
         # Wait for animation to start
+        f = press_result.frame_before
         for f in self.frames:
             if f.time < press_result.end_time:
                 # Discard frame to work around latency in video-capture pipeline
+                if self.recorder is not None:
+                    # Record it anyway, but without updating `dm`'s reference
+                    # frame so that the result is the same as when we aren't
+                    # recording.
+                    self.recorder._record_frame(f, differ.diff(
+                        dm.prev_frame, differ.preprocess(f, dm.mask_tuple),
+                        dm.mask_tuple))
                 continue
             motion_result = dm.diff(f)
             draw_on(f, motion_result, label="transition")
+            self._record(f, motion_result)
             if motion_result:
                 _debug("Animation started", f)
                 animation_start_time = f.time
@@ -218,14 +235,19 @@ class _Transition():
                 _debug(
                     "Transition didn't start within %s seconds of pressing %s",
                     f, self.timeout_secs, press_result.key)
-                return Transition(
+                return self._result(Transition(
                     press_result.key, f, TransitionStatus.START_TIMEOUT,
-                    press_result.end_time, None, None)
-
-        end_result = self.wait_for_transition_to_end(f)  # pylint:disable=undefined-loop-variable
-        return Transition(
+                    press_result.end_time, None, None))
+        else:
+            _debug("Ran out of frames after pressing %s", f, press_result.key)
+            return self._result(Transition(
+                press_result.key, f, TransitionStatus.START_TIMEOUT,
+                press_result.end_time, None, None))
+
+        end_result = self.wait_for_transition_to_end(f)
+        return self._result(Transition(
             press_result.key, end_result.frame, end_result.status,
-            press_result.end_time, animation_start_time, end_result.end_time)
+            press_result.end_time, animation_start_time, end_result.end_time))
 
     def wait_for_transition_to_end(self, initial_frame):
         if initial_frame is None:
@@ -236,10 +258,18 @@ class _Transition():
         first_stable_frame = initial_frame
         differ = press_and_wait.differ.replace(min_size=self.min_size)
         dm = DetectMotion(differ, initial_frame, self.mask)
+        f = initial_frame
         while True:
-            f = next(self.frames)
+            try:
+                f = next(self.frames)
+            except StopIteration:
+                _debug("Ran out of frames before the transition ended", f)
+                return Transition(
+                    None, f, TransitionStatus.STABLE_TIMEOUT,
+                    None, initial_frame.time, None)
             motion_result = dm.diff(f)
             draw_on(f, motion_result, label="transition")
+            self._record(f, motion_result)
             if motion_result:
                 _debug("Animation in progress", f)
                 first_stable_frame = f
@@ -259,6 +289,15 @@ class _Transition():
                     None, f, TransitionStatus.STABLE_TIMEOUT,
                     None, initial_frame.time, None)
 
+    def _record(self, frame, motion_result):
+        if self.recorder is not None:
+            self.recorder._record_frame(frame, motion_result)
+
+    def _result(self, transition):
+        if self.recorder is not None:
+            self.recorder._record_transition(transition)
+        return transition
+
 
 def _debug(s, f, *args):
     debug(("transition: %.3f: " + s) % ((getattr(f, "time", 0),) + args))
@@ -379,3 +418,268 @@ class TransitionStatus(enum.Enum):
 
     #: The transition started and then stopped.
     COMPLETE = 2
+
+
+class TransitionAnalyzer():
+    """Record every frame seen by `press_and_wait`, for performance tests.
+
+    `press_and_wait` only reports the first frame where motion was seen and
+    the first stable frame. This class also records the amount of change and
+    the timestamp of every frame it analyses (including frames captured
+    before the keypress completed) into a compact numpy array, and keeps the
+    timings of every transition so that you can calculate latency percentiles
+    across many repeated keypresses.
+
+    Use `press_and_wait` for live measurements::
+
+        analyzer = stbt.TransitionAnalyzer(mask=CAROUSEL, stable_secs=0.5)
+        for _ in range(100):
+            analyzer.press_and_wait("KEY_RIGHT")
+        print(analyzer.percentiles())
+
+    or `analyse` to measure the keypresses of a recorded run after the fact.
+
+    :ivar numpy.ndarray frames: One row per analysed frame, with fields
+      ``time`` (the frame's timestamp), ``magnitude`` (the area in pixels of
+      the bounding box of the differences), ``motion`` (whether the differ
+      considered it motion) and ``keypress`` (index into ``transitions``).
+
+    :ivar numpy.ndarray timings: One row per transition, with fields
+      ``press_time``, ``animation_start_time``, ``end_time`` (``NaN`` if
+      unknown), ``start_lower`` and ``end_lower`` (the timestamp of the frame
+      before the frame where animation started or ended, respectively) and
+      ``status`` (the `TransitionStatus` value).
+
+    :ivar list[Transition] transitions: The `Transition` objects, in the same
+      order as ``timings``. To keep memory use constant per keypress (so that
+      you can measure thousands of keypresses) these don't keep the video
+      frame: their ``frame`` is ``None``. Use the return value of
+      `press_and_wait` if you need the frame.
+
+    Frame-accurate timings are always quantised to the frame period: an
+    animation that started at ``animation_start_time`` could have started at
+    any time since the previous frame. The ``interpolate`` parameter of
+    `durations` and `percentiles` estimates the start and end times as the
+    mid-point between the two frames, which removes the bias of (on average)
+    half a frame period.
+    """
+    FRAME_DTYPE = numpy.dtype([
+        ("time", numpy.float64),
+        ("magnitude", numpy.uint32),
+        ("motion", numpy.bool_),
+        ("keypress", numpy.int32),
+    ])
+    TIMING_DTYPE = numpy.dtype([
+        ("press_time", numpy.float64),
+        ("animation_start_time", numpy.float64),
+        ("end_time", numpy.float64),
+        ("start_lower", numpy.float64),
+        ("end_lower", numpy.float64),
+        ("status", numpy.int8),
+    ])
+
+    def __init__(self, mask: MaskTypes = Region.ALL, timeout_secs: float = 10,
+                 stable_secs: float = 1, min_size: Optional[SizeT] = None):
+        self.mask = mask
+        self.timeout_secs = timeout_secs
+        self.stable_secs = stable_secs
+        self.min_size = min_size
+
+        self.transitions: list[Transition] = []
+        self._ntransitions = 0
+        self._frames = numpy.zeros(1024, dtype=self.FRAME_DTYPE)
+        self._nframes = 0
+        self._timings = numpy.zeros(64, dtype=self.TIMING_DTYPE)
+        self._keypress_first_frame = 0
+
+    @property
+    def frames(self) -> numpy.ndarray:
+        return self._frames[:self._nframes]
+
+    @property
+    def timings(self) -> numpy.ndarray:
+        return self._timings[:self._ntransitions]
+
+    def press_and_wait(self, key: KeyT, retries: int = 0,
+                       frames: Optional[Iterator[FrameT]] = None,
+                       _dut=None) -> Transition:
+        """Like `stbt.press_and_wait`, using this analyzer's ``mask``,
+        ``timeout_secs``, ``stable_secs`` and ``min_size``, and recording the
+        result."""
+        return press_and_wait(
+            key, mask=self.mask, timeout_secs=self.timeout_secs,
+            stable_secs=self.stable_secs, min_size=self.min_size,
+            retries=retries, frames=frames, _dut=_dut, _recorder=self)
+
+    def analyse(self, frames: Iterable[FrameT],
+                keypresses: Iterable[Keypress]) -> list[Transition]:
+        """Measure the transitions after each keypress of a recorded run.
+
+        This processes ``frames`` in a single pass, so it can be used on
+        thousands of keypresses from a long recording. The analysis of each
+        keypress stops at the next keypress, even if the transition hasn't
+        completed by then.
+
+        :param frames: The recorded video-frames, in timestamp order. Each
+          frame must have a ``time`` attribute (for example `stbt.Frame`).
+        :param keypresses: The `stbt.Keypress` objects returned by
+          `stbt.press` during the recording, in the order they were sent. If
+          a keypress's ``frame_before`` is ``None`` we use the last recorded
+          frame before its ``start_time``.
+
+        :returns: The `Transition` for each keypress (without its ``frame``,
+          as in ``transitions``). If we run out of frames, the remaining
+          keypresses aren't analysed.
+        """
+        source = _FrameSource(iter(frames))
+        keypresses = list(keypresses)
+        first = self._ntransitions
+        for i, keypress in enumerate(keypresses):
+            if i + 1 < len(keypresses):
+                next_start_time = keypresses[i + 1].start_time
+            else:
+                next_start_time = float("inf")
+
+            if keypress.frame_before is None:
+                frame_before = source.last_frame_before(keypress.start_time)
+                if frame_before is None:
+                    # No frames before this keypress: compare against the
+                    # first frame after it.
+                    frame_before = next(source.until(next_start_time), None)
+                if frame_before is None:
+                    break
+                keypress = Keypress(keypress.key, keypress.start_time,
+                                    keypress.end_time, frame_before)
+
+            t = _Transition(self.mask, self.timeout_secs, self.stable_secs,
+                            self.min_size, source.until(next_start_time), self)
+            t.wait(keypress)
+            if source.exhausted:
+                break
+        return self.transitions[first:]
+
+    def durations(self, animation: bool = False,
+                  interpolate: bool = False) -> numpy.ndarray:
+        """Durations of the recorded transitions, in seconds.
+
+        :param animation: Return ``animation_duration`` (from the start of the
+          animation to the end) instead of ``duration`` (from the end of the
+          keypress to the end of the animation).
+        :param interpolate: Estimate the start & end times with sub-frame
+          precision (see the class documentation).
+
+        :returns: A numpy array with one value per transition; ``NaN`` for
+          transitions that didn't complete.
+        """
+        t = self.timings
+        end = t["end_time"]
+        start = t["animation_start_time"]
+        if interpolate:
+            end = (t["end_lower"] + end) / 2
+            start = (t["start_lower"] + start) / 2
+        if animation:
+            return end - start
+        else:
+            return end - t["press_time"]
+
+    def percentiles(self, q: Sequence[float] = (50, 95, 99),
+                    animation: bool = False,
+                    interpolate: bool = False) -> dict[float, float]:
+        """Latency percentiles across all the complete transitions.
+
+        :param q: The percentiles to calculate, in the range 0-100.
+        :param animation: See `durations`.
+        :param interpolate: See `durations`.
+
+        :returns: A dict from each percentile to the duration in seconds
+          (``NaN`` if no transitions have completed).
+        """
+        d = self.durations(animation, interpolate)
+        d = d[~numpy.isnan(d)]
+        if d.size == 0:
+            return {p: float("nan") for p in q}
+        return dict(zip(q, (float(x) for x in numpy.percentile(d, q))))
+
+    def _start_keypress(self):
+        self._keypress_first_frame = self._nframes
+
+    def _record_frame(self, frame, motion_result):
+        if self._nframes == len(self._frames):
+            self._frames = numpy.resize(self._frames, 2 * len(self._frames))
+        region = motion_result.region
+        self._frames[self._nframes] = (
+            frame.time,
+            region.width * region.height if region else 0,
+            bool(motion_result),
+            self._ntransitions)
+        self._nframes += 1
+
+    def _record_transition(self, transition):
+        n = self._ntransitions
+        if n == len(self._timings):
+            self._timings = numpy.resize(self._timings, 2 * n)
+        start = _nan_if_none(transition.animation_start_time)
+        end = _nan_if_none(transition.end_time)
+        self._timings[n] = (
+            transition.press_time, start, end,
+            self._previous_frame_time(start, transition.press_time),
+            self._previous_frame_time(end, transition.press_time),
+            transition.status.value)
+        self._ntransitions += 1
+        # Without the frame: see the class documentation.
+        self.transitions.append(Transition(
+            transition.key, None, transition.status, transition.press_time,
+            transition.animation_start_time, transition.end_time))
+
+    def _previous_frame_time(self, t, press_time):
+        """The timestamp of the recorded frame before the frame at time ``t``,
+        for the current keypress. Never earlier than ``press_time`` because the
+        device can't react before the keypress."""
+        if numpy.isnan(t):
+            return numpy.nan
+        frames = self._frames[self._keypress_first_frame:self._nframes]
+        i = numpy.searchsorted(frames["time"], t)
+        if i == 0:
+            return press_time
+        return max(float(frames["time"][i - 1]), press_time)
+
+
+def _nan_if_none(x):
+    return numpy.nan if x is None else x
+
+
+class _FrameSource():
+    """Splits a single iterator of recorded frames between keypresses, for
+    `TransitionAnalyzer.analyse`."""
+    def __init__(self, frames: Iterator[FrameT]):
+        self.frames = frames
+        self.pending: Optional[FrameT] = None
+        self.previous: Optional[FrameT] = None
+        self.exhausted = False
+
+    def _next(self) -> Optional[FrameT]:
+        if self.pending is not None:
+            f, self.pending = self.pending, None
+            return f
+        try:
+            return next(self.frames)
+        except StopIteration:
+            self.exhausted = True
+            return None
+
+    def until(self, end_time: float) -> Iterator[FrameT]:
+        """Yields frames before ``end_time``."""
+        while True:
+            f = self._next()
+            if f is None:
+                return
+            if f.time >= end_time:
+                self.pending = f
+                return
+            self.previous = f
+            yield f
+
+    def last_frame_before(self, t: float) -> Optional[FrameT]:
+        for _ in self.until(t):
+            pass
+        return self.previous
@@ -13,6 +13,16 @@ Supports:
 Environment Variables:
     STBT_PORTAL_URL: STB Tester Portal URL (e.g., https://company.stb-tester.com)
     STBT_PORTAL_TOKEN: API authentication token
+    STBT_MCP_MAX_WORKERS: Maximum number of tool calls running at once
+    STBT_MCP_NODE_CACHE_TTL: Seconds to cache node details from the Portal
+        (default: 10)
+    STBT_MCP_MAX_CONCURRENT_PER_DEVICE: Maximum number of tool calls running
+        at once against each device (default: 1)
+    STBT_MCP_JOB_POLL_MIN_SECS, STBT_MCP_JOB_POLL_MAX_SECS: How often to poll
+        the Portal for the status of running jobs (default: every 1 to 30
+        seconds, depending on how often the job's status is changing)
+    STBT_MCP_FRAME_CACHE_SECS: Seconds to reuse a Portal device's screenshot
+        for stb_match, stb_ocr and stb_is_screen_black (default: 1)
 
 Usage:
     python stb_tester_server.py
@@ -25,8 +35,10 @@ import base64
 import json
 import os
 import sys
-import urllib.request
-import urllib.error
+import threading
+import time
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Any, Optional
 
 # Add parent directory to path for stbt_core import
@@ -45,13 +57,59 @@ except ImportError:
     print("MCP SDK not installed. Install with: pip install mcp", file=sys.stderr)
     sys.exit(1)
 
-# STB Tester imports - wrapped in try/except for flexibility
-try:
-    import stbt_core as stbt
-    STBT_AVAILABLE = True
-except ImportError:
-    STBT_AVAILABLE = False
-    print("Warning: stbt_core not available. Running in mock mode.", file=sys.stderr)
+import httpx  # A dependency of the MCP SDK
+
+# STB Tester imports. `stbt_core` imports OpenCV, numpy, GStreamer, etc.,
+# which takes a while, and the Portal tools don't need it; so we only import
+# it when a local tool is first used (or at startup, in the background, if
+# the Portal isn't configured). See `_import_stbt_in_background`.
+_stbt_import: Optional[Future] = None
+_stbt_import_lock = threading.Lock()
+
+
+def _import_stbt():
+    try:
+        import stbt_core
+    except Exception:  # pylint:disable=broad-except
+        # Not just ImportError: For example the GStreamer bindings raise
+        # ValueError if GStreamer isn't installed properly.
+        print("Warning: stbt_core not available. Running in mock mode.",
+              file=sys.stderr)
+        return None
+    return stbt_core
+
+
+def _import_stbt_in_background() -> Future:
+    """Start importing `stbt_core` on a background thread, unless we have
+    already started. Returns a Future for the module (or None if it isn't
+    available)."""
+    global _stbt_import
+    with _stbt_import_lock:
+        if _stbt_import is None:
+            _stbt_import = future = Future()
+            threading.Thread(
+                target=lambda: future.set_result(_import_stbt()),
+                name="stb-tester-mcp-import", daemon=True).start()
+        return _stbt_import
+
+
+def _stbt_available() -> bool:
+    """Whether `stbt_core` can be imported. Waits for the import to finish."""
+    return _import_stbt_in_background().result() is not None
+
+
+class _LazyStbt:
+    """Stands in for the `stbt_core` module until it has been imported."""
+
+    def __getattr__(self, name):
+        module = _import_stbt_in_background().result()
+        if module is None:
+            raise AttributeError(
+                f"stbt_core isn't available (looking up stbt.{name})")
+        return getattr(module, name)
+
+
+stbt = _LazyStbt()
 
 
 # Portal API Configuration
@@ -73,64 +131,187 @@ connected_device: Optional[str] = None
 
 
 class PortalClient:
-    """Client for STB Tester Portal REST API."""
-
-    def __init__(self, base_url: str, token: str):
+    """Client for STB Tester Portal REST API.
+
+    One client is shared by all the tool calls running on `_executor`, so it
+    is thread-safe. It keeps HTTP connections to the Portal open between
+    requests, caches node metadata for `cache_ttl_secs`, and coalesces
+    identical GET requests that are in flight at the same time (the second
+    caller waits for the first caller's response instead of sending its own
+    request). It also caches decoded screenshots for `frame_ttl_secs` (see
+    `get_frame`).
+    """
+
+    def __init__(self, base_url: str, token: str,
+                 cache_ttl_secs: float = 10, max_connections: int = 16,
+                 frame_ttl_secs: float = 1):
         self.base_url = base_url.rstrip("/")
         self.token = token
+        self.cache_ttl_secs = cache_ttl_secs
+        self.frame_ttl_secs = frame_ttl_secs
+        self._http = httpx.Client(
+            base_url=f"{self.base_url}/api/v2",
+            headers={"Authorization": f"token {self.token}"},
+            timeout=30,
+            # Like urllib, which we used before: For example the Portal
+            # redirects http:// to https://.
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections),
+        )
+        self._lock = threading.Lock()
+        # endpoint -> (time fetched, response). Protected by `_lock`.
+        self._cache: dict[str, tuple[float, Any]] = {}
+        # (kind, endpoint) -> Future for the request in flight. Protected by
+        # `_lock`.
+        self._in_flight: dict[tuple[str, str], Future] = {}
+        # node_id -> (time fetched, `stbt.Frame`). Protected by `_lock`.
+        self._frames: dict[str, tuple[float, Any]] = {}
 
     def _request(self, method: str, endpoint: str, data: dict = None) -> dict:
         """Make an authenticated request to the Portal API."""
-        url = f"{self.base_url}/api/v2{endpoint}"
-        headers = {
-            "Authorization": f"token {self.token}",
-            "Content-Type": "application/json",
-        }
-
-        req_data = json.dumps(data).encode() if data else None
-        request = urllib.request.Request(url, data=req_data, headers=headers, method=method)
-
+        if method == "GET":
+            return self._coalesced(
+                ("json", endpoint),
+                lambda: self._send_request(method, endpoint, data))
+        return self._send_request(method, endpoint, data)
+
+    def _send_request(self, method: str, endpoint: str,
+                      data: dict = None) -> dict:
         try:
-            with urllib.request.urlopen(request, timeout=30) as response:
-                if response.status == 204:
-                    return {"status": "success"}
-                return json.loads(response.read().decode())
-        except urllib.error.HTTPError as e:
-            error_body = e.read().decode() if e.fp else str(e)
-            return {"error": f"HTTP {e.code}: {error_body}"}
-        except urllib.error.URLError as e:
-            return {"error": f"Connection error: {e.reason}"}
+            response = self._http.request(
+                method, endpoint, json=data if data else None)
+        except httpx.HTTPError as e:
+            return {"error": f"Connection error: {e}"}
+        if response.status_code >= 400:
+            return {"error": f"HTTP {response.status_code}: {response.text}"}
+        if response.status_code == 204:
+            return {"status": "success"}
+        return response.json()
 
     def _request_binary(self, endpoint: str) -> tuple[bytes, str]:
         """Make a request that returns binary data (e.g., screenshot)."""
-        url = f"{self.base_url}/api/v2{endpoint}"
-        headers = {
-            "Authorization": f"token {self.token}",
-        }
-        request = urllib.request.Request(url, headers=headers)
-
+        def fetch():
+            response = self._http.get(endpoint)
+            if response.status_code >= 400:
+                raise Exception(f"HTTP {response.status_code}: {response.text}")
+            return (response.content,
+                    response.headers.get("Content-Type", "image/png"))
+        return self._coalesced(("binary", endpoint), fetch)
+
+    def _coalesced(self, key: tuple[str, str], fetch):
+        """Call `fetch`, unless there is already a call in flight for `key`,
+        in which case wait for that call's result instead."""
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is None:
+                future = self._in_flight[key] = Future()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            return future.result()
         try:
-            with urllib.request.urlopen(request, timeout=30) as response:
-                content_type = response.headers.get("Content-Type", "image/png")
-                return response.read(), content_type
-        except urllib.error.HTTPError as e:
-            raise Exception(f"HTTP {e.code}: {e.read().decode() if e.fp else str(e)}")
+            result = fetch()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def _cached_get(self, endpoint: str) -> Any:
+        with self._lock:
+            entry = self._cache.get(endpoint)
+        if (entry is not None and
+                time.monotonic() - entry[0] < self.cache_ttl_secs):
+            return entry[1]
+        response = self._request("GET", endpoint)
+        if not (isinstance(response, dict) and "error" in response):
+            with self._lock:
+                self._cache[endpoint] = (time.monotonic(), response)
+        return response
+
+    def invalidate_node(self, node_id: str):
+        """Forget the cached metadata for `node_id`."""
+        with self._lock:
+            self._cache.pop(f"/nodes/{node_id}", None)
 
     def list_nodes(self) -> dict:
-        """List all available STB Tester nodes."""
-        return self._request("GET", "/nodes")
+        """List all available STB Tester nodes.
+
+        The entries in the list are also cached as the nodes' details, so
+        that (for example) connecting to a node that we have just listed
+        doesn't fetch it again.
+        """
+        response = self._cached_get("/nodes")
+        nodes = _nodes_from_response(response)
+        if isinstance(nodes, list):
+            now = time.monotonic()
+            with self._lock:
+                for node in nodes:
+                    if isinstance(node, dict) and node.get("node_id"):
+                        endpoint = f"/nodes/{node['node_id']}"
+                        # Keep a fresher entry from `get_node`, which has
+                        # more details; replace an expired one.
+                        entry = self._cache.get(endpoint)
+                        if (entry is None or
+                                now - entry[0] >= self.cache_ttl_secs):
+                            self._cache[endpoint] = (now, node)
+        return response
 
     def get_node(self, node_id: str) -> dict:
         """Get details for a specific node."""
-        return self._request("GET", f"/nodes/{node_id}")
+        return self._cached_get(f"/nodes/{node_id}")
 
     def get_screenshot(self, node_id: str) -> tuple[bytes, str]:
         """Capture a screenshot from a node."""
         return self._request_binary(f"/nodes/{node_id}/screenshot.png")
 
+    def get_frame(self, node_id: str):
+        """A screenshot from a node, decoded into a read-only `stbt.Frame`,
+        for analysing locally with `stbt.match`, `stbt.ocr`, etc.
+
+        The frame is cached for `frame_ttl_secs` (or until we press a key on
+        the node), so that several analyses of the same screen only fetch it
+        once. Because it is read-only, `stbt.match` can also reuse the image
+        pyramid that it builds from the frame.
+        """
+        with self._lock:
+            entry = self._frames.get(node_id)
+        if (entry is not None and
+                time.monotonic() - entry[0] < self.frame_ttl_secs):
+            return entry[1]
+
+        def fetch():
+            fetched_at = time.monotonic()
+            captured_at = time.time()
+            data, _ = self.get_screenshot(node_id)
+            # Read-only all the way down (not just the `Frame` view), so that
+            # `stbt.match` will cache its pyramid.
+            image = _decode_image(data)
+            image.flags.writeable = False
+            frame = stbt.Frame(image, time=captured_at)
+            with self._lock:
+                self._frames[node_id] = (fetched_at, frame)
+            return frame
+        return self._coalesced(("frame", node_id), fetch)
+
+    def invalidate_frame(self, node_id: str):
+        """Forget the cached frame for `node_id`."""
+        with self._lock:
+            self._frames.pop(node_id, None)
+
     def press_key(self, node_id: str, key: str) -> dict:
         """Send a key press to a node."""
-        return self._request("POST", f"/nodes/{node_id}/press", {"key": key})
+        response = self._request(
+            "POST", f"/nodes/{node_id}/press", {"key": key})
+        self.invalidate_frame(node_id)
+        return response
 
     def run_test(self, node_id: str, test_pack: str, test_case: str, **kwargs) -> dict:
         """Run a test on a node."""
@@ -139,6 +320,8 @@ class PortalClient:
             "test_case": test_case,
             **kwargs
         }
+        self.invalidate_node(node_id)
+        self.invalidate_frame(node_id)
         return self._request("POST", f"/nodes/{node_id}/run", data)
 
     def get_job_status(self, job_id: str) -> dict:
@@ -146,10 +329,21 @@ class PortalClient:
         return self._request("GET", f"/jobs/{job_id}")
 
 
+def _nodes_from_response(response: Any) -> Any:
+    """The list of nodes from the Portal's response to ``GET /nodes``."""
+    if isinstance(response, dict):
+        return response.get("nodes", response)
+    return response
+
+
 # Initialize portal client if configured
 portal_client: Optional[PortalClient] = None
 if PORTAL_AVAILABLE:
-    portal_client = PortalClient(PORTAL_URL, PORTAL_TOKEN)
+    portal_client = PortalClient(
+        PORTAL_URL, PORTAL_TOKEN,
+        cache_ttl_secs=float(os.environ.get("STBT_MCP_NODE_CACHE_TTL", "10")),
+        max_connections=int(os.environ.get("STBT_MCP_MAX_WORKERS", "16")),
+        frame_ttl_secs=float(os.environ.get("STBT_MCP_FRAME_CACHE_SECS", "1")))
 
 
 # Mock implementations for when stbt is not available
@@ -196,6 +390,10 @@ class MockStbt:
     def ocr(region=None, mode=None):
         return "Mock OCR Text"
 
+    @staticmethod
+    def is_screen_black(region=None):
+        return False
+
     @staticmethod
     def get_frame():
         # Return a minimal valid image bytes (1x1 black PNG)
@@ -206,15 +404,15 @@ class MockStbt:
         return MockStbt.MatchResult(match=True)
 
 
-# Use real stbt or mock
-stbt_impl = stbt if STBT_AVAILABLE else MockStbt()
+# Used when stbt_core isn't available
+stbt_impl = MockStbt()
 
 
 def region_from_dict(region_dict: Optional[dict]) -> Optional[Any]:
     """Convert a dictionary to an stbt.Region object."""
     if region_dict is None:
         return None
-    if STBT_AVAILABLE:
+    if _stbt_available():
         return stbt.Region(
             x=region_dict.get("x", 0),
             y=region_dict.get("y", 0),
@@ -224,6 +422,218 @@ def region_from_dict(region_dict: Optional[dict]) -> Optional[Any]:
     return MockStbt.Region(**region_dict)
 
 
+# Options for `stb_screenshot` and `stb_device_screenshot`, to make the image
+# smaller before it is sent to the client.
+SCREENSHOT_PROPERTIES = {
+    "max_width": {
+        "type": "integer",
+        "description": (
+            "Scale the image down (keeping its aspect ratio) so that it is at "
+            "most this many pixels wide"
+        )
+    },
+    "format": {
+        "type": "string",
+        "description": (
+            "Image format (default: png). jpeg and webp are much smaller than "
+            "png."
+        ),
+        "enum": ["png", "jpeg", "webp"]
+    },
+    "quality": {
+        "type": "integer",
+        "description": "Quality for jpeg and webp, from 1 to 100 (default: 80)",
+        "minimum": 1,
+        "maximum": 100
+    },
+    "region": {
+        "type": "object",
+        "description": (
+            "Only return this part of the screen (in full-resolution "
+            "coordinates)"
+        ),
+        "properties": {
+            "x": {"type": "integer"},
+            "y": {"type": "integer"},
+            "width": {"type": "integer"},
+            "height": {"type": "integer"}
+        }
+    },
+    "grayscale": {
+        "type": "boolean",
+        "description": "Convert the image to grayscale"
+    },
+    "only_if_changed": {
+        "type": "boolean",
+        "description": (
+            "If the screen hasn't changed since the last screenshot of this "
+            "device (with the same region, grayscale and max_width), return "
+            "{\"status\": \"unchanged\"} instead of the image"
+        )
+    }
+}
+
+# For "only_if_changed": Differences smaller than this in a pixel's value are
+# treated as noise from the video capture.
+SCREENSHOT_NOISE_THRESHOLD = 25
+
+# The last screenshot returned for each device, for "only_if_changed":
+# device key -> (options, image after cropping & scaling). The image is a
+# numpy array, or the PNG bytes from the Portal if we returned them unchanged
+# (we only decode them if they're needed for a comparison). Protected by
+# `_last_screenshots_lock`.
+_last_screenshots: dict[str, tuple[str, Any]] = {}
+_last_screenshots_lock = threading.Lock()
+
+
+def _screenshot_options_given(arguments: dict) -> bool:
+    return any(arguments.get(option) for option in SCREENSHOT_PROPERTIES)
+
+
+def _screenshot_options_key(arguments: dict) -> str:
+    """The options that affect the image, for comparing screenshots."""
+    return json.dumps([arguments.get("region"),
+                       bool(arguments.get("grayscale")),
+                       arguments.get("max_width")])
+
+
+def _remember_screenshot(device: str, image) -> None:
+    """Record a screenshot that was returned without any options, so that a
+    later "only_if_changed" screenshot is compared against it."""
+    with _last_screenshots_lock:
+        _last_screenshots[device] = (_screenshot_options_key({}), image)
+
+
+def _prepare_screenshot(device: str, image,
+                        arguments: dict) -> Optional[tuple[bytes, str]]:
+    """Crop, convert, scale and encode `image` (a BGR numpy array) according
+    to the `SCREENSHOT_PROPERTIES` in `arguments`.
+
+    Returns the encoded image and its MIME type, or None if "only_if_changed"
+    was given and `image` is the same as the last screenshot we returned for
+    `device`.
+    """
+    import cv2
+
+    region = arguments.get("region")
+    if region:
+        x, y = region.get("x", 0), region.get("y", 0)
+        right = x + region.get("width", image.shape[1])
+        bottom = y + region.get("height", image.shape[0])
+        x, y = max(0, x), max(0, y)
+        image = image[y:max(y, bottom), x:max(x, right)]
+        if image.size == 0:
+            raise ValueError(f"Region {region} is outside the frame")
+    if arguments.get("grayscale") and image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    max_width = arguments.get("max_width")
+    if max_width and image.shape[1] > max_width:
+        height = max(1, round(image.shape[0] * max_width / image.shape[1]))
+        image = cv2.resize(image, (max_width, height),
+                           interpolation=cv2.INTER_AREA)
+
+    options = _screenshot_options_key(arguments)
+    with _last_screenshots_lock:
+        previous = _last_screenshots.get(device)
+        if previous is not None and isinstance(previous[1], bytes):
+            previous = (previous[0], _decode_image(previous[1]))
+        if (arguments.get("only_if_changed") and
+                previous is not None and previous[0] == options and
+                previous[1].shape == image.shape and
+                cv2.absdiff(previous[1], image).max() <=
+                SCREENSHOT_NOISE_THRESHOLD):
+            return None
+        _last_screenshots[device] = (options, image)
+
+    image_format = arguments.get("format", "png")
+    quality = int(arguments.get("quality", 80))
+    extension, params = {
+        "png": (".png", []),
+        "jpeg": (".jpg", [cv2.IMWRITE_JPEG_QUALITY, quality]),
+        "webp": (".webp", [cv2.IMWRITE_WEBP_QUALITY, quality]),
+    }[image_format]
+    _, buffer = cv2.imencode(extension, image, params)
+    return buffer.tobytes(), f"image/{image_format}"
+
+
+def _decode_image(data: bytes):
+    """Decode a PNG (or other image file) into a BGR numpy array."""
+    import cv2
+    import numpy
+    image = cv2.imdecode(numpy.frombuffer(data, numpy.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Failed to decode the screenshot")
+    return image
+
+
+def _portal_screenshot(device_id: str,
+                       arguments: dict) -> Optional[tuple[bytes, str]]:
+    """Fetch a screenshot of a Portal device, prepared according to the
+    `SCREENSHOT_PROPERTIES` in `arguments` (see `_prepare_screenshot`).
+
+    Without any options we return the Portal's PNG as-is, without decoding it.
+    """
+    device = f"portal:{device_id}"
+    data, content_type = portal_client.get_screenshot(device_id)
+    if not _screenshot_options_given(arguments):
+        _remember_screenshot(device, data)
+        return data, content_type
+    return _prepare_screenshot(device, _decode_image(data), arguments)
+
+
+# Lets stb_match, stb_ocr and stb_is_screen_black analyse a Portal device's
+# screen instead of the local device-under-test.
+ANALYSIS_DEVICE_PROPERTIES = {
+    "device_id": {
+        "type": "string",
+        "description": (
+            "Optional: Analyse a screenshot of this Portal device (it is "
+            "fetched from the Portal and analysed by this server). Default: "
+            "the local device-under-test"
+        )
+    },
+}
+
+
+def _analysis_frame(arguments: dict):
+    """The frame for stb_match, stb_ocr or stb_is_screen_black to analyse:
+    A screenshot of the Portal device `device_id` if it is given, otherwise
+    None (meaning the local device-under-test's live video)."""
+    device_id = arguments.get("device_id")
+    if not device_id:
+        return None
+    if not PORTAL_AVAILABLE:
+        raise ValueError("device_id requires the Portal API. Set "
+                         "STBT_PORTAL_URL and STBT_PORTAL_TOKEN.")
+    return portal_client.get_frame(device_id)
+
+
+# Options for selecting devices for the stb_multi_* tools.
+FAN_OUT_PROPERTIES = {
+    "device_ids": {
+        "type": "array",
+        "items": {"type": "string"},
+        "description": "The devices to operate on"
+    },
+    "tags": {
+        "type": "array",
+        "items": {"type": "string"},
+        "description": (
+            "Instead of device_ids: Operate on every device that has all of "
+            "these tags (\"name\" or \"name=value\")"
+        )
+    },
+    "max_parallel": {
+        "type": "integer",
+        "description": (
+            "Maximum number of devices to operate on at the same time "
+            "(default: 8)"
+        ),
+        "default": 8
+    }
+}
+
+
 @server.list_tools()
 async def list_tools() -> list[Tool]:
     """List all available STB Tester tools."""
@@ -266,7 +676,11 @@ async def list_tools() -> list[Tool]:
         ),
         Tool(
             name="stb_device_screenshot",
-            description="Capture a screenshot from the connected remote device. Returns the image for visual analysis.",
+            description=(
+                "Capture a screenshot from the connected remote device. "
+                "Returns the image for visual analysis. Use max_width, format "
+                "and region to get a smaller image."
+            ),
             inputSchema={
                 "type": "object",
                 "properties": {
@@ -277,7 +691,8 @@ async def list_tools() -> list[Tool]:
                     "save_path": {
                         "type": "string",
                         "description": "Optional local path to save the screenshot"
-                    }
+                    },
+                    **SCREENSHOT_PROPERTIES
                 }
             }
         ),
@@ -323,18 +738,110 @@ async def list_tools() -> list[Tool]:
         ),
         Tool(
             name="stb_job_status",
-            description="Get the status of a running test job.",
+            description=(
+                "Get the status of a running test job. The server follows jobs "
+                "in the background, so this returns its most recent view of "
+                "the job (see status_age_secs) without waiting for the Portal. "
+                "To wait for a job to finish, use stb_wait_for_job rather than "
+                "calling this repeatedly."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "job_id": {
+                        "type": "string",
+                        "description": "The job ID returned when starting a test"
+                    }
+                },
+                "required": ["job_id"]
+            }
+        ),
+        Tool(
+            name="stb_wait_for_job",
+            description=(
+                "Wait for a test job to finish, and return its final status. "
+                "Sends progress notifications as the job's status changes. "
+                "Returns early (with finished: false) if the job is still "
+                "running after timeout_secs."
+            ),
             inputSchema={
                 "type": "object",
                 "properties": {
                     "job_id": {
                         "type": "string",
                         "description": "The job ID returned when starting a test"
+                    },
+                    "timeout_secs": {
+                        "type": "number",
+                        "description": "Maximum time to wait (default: 300)",
+                        "default": 300
                     }
                 },
                 "required": ["job_id"]
             }
         ),
+        Tool(
+            name="stb_multi_press",
+            description=(
+                "Press a remote control key on several Portal devices at once. "
+                "Select the devices with device_ids, or with tags (matched "
+                "against the tags in stb_list_devices). Returns each device's "
+                "result and timing."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "key": {
+                        "type": "string",
+                        "description": (
+                            "The key to press (e.g., KEY_OK, KEY_UP, KEY_HOME)"
+                        )
+                    },
+                    **FAN_OUT_PROPERTIES
+                },
+                "required": ["key"]
+            }
+        ),
+        Tool(
+            name="stb_multi_screenshot",
+            description=(
+                "Capture screenshots from several Portal devices at once, for "
+                "example to compare the same screen across devices. Select the "
+                "devices with device_ids, or with tags. Returns each device's "
+                "result and timing, followed by the images; use max_width and "
+                "format to keep them small."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    **FAN_OUT_PROPERTIES,
+                    **SCREENSHOT_PROPERTIES
+                }
+            }
+        ),
+        Tool(
+            name="stb_multi_run_test",
+            description=(
+                "Run a test on several Portal devices at once. Select the "
+                "devices with device_ids, or with tags. Returns the job ID for "
+                "each device; use stb_wait_for_job to wait for them."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "test_pack": {
+                        "type": "string",
+                        "description": "The test pack containing the test (e.g., 'my-tests')"
+                    },
+                    "test_case": {
+                        "type": "string",
+                        "description": "The test case to run (e.g., 'tests/test_epg.py::test_open_guide')"
+                    },
+                    **FAN_OUT_PROPERTIES
+                },
+                "required": ["test_pack", "test_case"]
+            }
+        ),
         # === Local STB Tester Tools ===
         Tool(
             name="stb_press",
@@ -399,7 +906,11 @@ async def list_tools() -> list[Tool]:
         ),
         Tool(
             name="stb_match",
-            description="Check if a reference image is currently visible on screen. Returns match result with confidence score.",
+            description=(
+                "Check if a reference image is currently visible on screen. "
+                "Returns match result with confidence score. With device_id, "
+                "checks a screenshot of that Portal device."
+            ),
             inputSchema={
                 "type": "object",
                 "properties": {
@@ -416,7 +927,8 @@ async def list_tools() -> list[Tool]:
                             "width": {"type": "integer"},
                             "height": {"type": "integer"}
                         }
-                    }
+                    },
+                    **ANALYSIS_DEVICE_PROPERTIES
                 },
                 "required": ["image"]
             }
@@ -476,7 +988,11 @@ async def list_tools() -> list[Tool]:
         ),
         Tool(
             name="stb_ocr",
-            description="Read text from the screen using OCR (Optical Character Recognition).",
+            description=(
+                "Read text from the screen using OCR (Optical Character "
+                "Recognition). With device_id, reads a screenshot of that "
+                "Portal device."
+            ),
             inputSchema={
                 "type": "object",
                 "properties": {
@@ -494,23 +1010,168 @@ async def list_tools() -> list[Tool]:
                         "type": "string",
                         "description": "OCR mode: PAGE, SINGLE_LINE, SINGLE_WORD, or SINGLE_CHAR",
                         "enum": ["PAGE", "SINGLE_LINE", "SINGLE_WORD", "SINGLE_CHAR"]
-                    }
+                    },
+                    **ANALYSIS_DEVICE_PROPERTIES
+                }
+            }
+        ),
+        Tool(
+            name="stb_is_screen_black",
+            description=(
+                "Check if the screen (or a region of it) is black. With "
+                "device_id, checks a screenshot of that Portal device."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "region": {
+                        "type": "object",
+                        "description": "Optional screen region to check",
+                        "properties": {
+                            "x": {"type": "integer"},
+                            "y": {"type": "integer"},
+                            "width": {"type": "integer"},
+                            "height": {"type": "integer"}
+                        }
+                    },
+                    **ANALYSIS_DEVICE_PROPERTIES
                 }
             }
         ),
         Tool(
             name="stb_screenshot",
-            description="Capture a screenshot from the current video frame. Returns base64-encoded PNG image.",
+            description=(
+                "Capture a screenshot from the current video frame. Returns "
+                "base64-encoded PNG image, unless you ask for a different "
+                "format. Use max_width, format and region to get a smaller "
+                "image."
+            ),
             inputSchema={
                 "type": "object",
                 "properties": {
                     "save_path": {
                         "type": "string",
                         "description": "Optional path to save the screenshot file"
-                    }
+                    },
+                    **SCREENSHOT_PROPERTIES
                 }
             }
         ),
+        Tool(
+            name="stb_run_steps",
+            description=(
+                "Run a sequence of steps (press, press_and_wait, match, "
+                "wait_for_match, ocr, screenshot) in a single call, and return "
+                "all their results together. Use this instead of calling "
+                "stb_press, stb_wait_for_match, stb_ocr, etc. one at a time. A "
+                "step can stop the sequence early depending on its result "
+                "(stop_if). Runs against the local device, or against a Portal "
+                "device if device_id is given (wait_for_match isn't supported "
+                "on Portal devices, and press_and_wait is a plain press)."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "steps": {
+                        "type": "array",
+                        "description": "The steps to run, in order",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "action": {
+                                    "type": "string",
+                                    "enum": list(RUN_STEPS_ACTIONS)
+                                },
+                                "key": {
+                                    "type": "string",
+                                    "description": (
+                                        "Key to press, for press and "
+                                        "press_and_wait"
+                                    )
+                                },
+                                "stable_secs": {
+                                    "type": "number",
+                                    "description": (
+                                        "For press_and_wait (default: 1)"
+                                    )
+                                },
+                                "image": {
+                                    "type": "string",
+                                    "description": (
+                                        "Path to the reference image, for "
+                                        "match and wait_for_match"
+                                    )
+                                },
+                                "timeout_secs": {
+                                    "type": "number",
+                                    "description": (
+                                        "For wait_for_match (default: 10)"
+                                    )
+                                },
+                                "region": {
+                                    "type": "object",
+                                    "description": (
+                                        "Screen region for match, "
+                                        "wait_for_match and ocr, or the part "
+                                        "of the screen to return for "
+                                        "screenshot"
+                                    ),
+                                    "properties": {
+                                        "x": {"type": "integer"},
+                                        "y": {"type": "integer"},
+                                        "width": {"type": "integer"},
+                                        "height": {"type": "integer"}
+                                    }
+                                },
+                                "mode": {
+                                    "type": "string",
+                                    "description": "OCR mode, for ocr",
+                                    "enum": ["PAGE", "SINGLE_LINE",
+                                             "SINGLE_WORD", "SINGLE_CHAR"]
+                                },
+                                "expect": {
+                                    "type": "string",
+                                    "description": (
+                                        "For ocr: the step is \"matched\" if "
+                                        "the text read contains this "
+                                        "(case-insensitive)"
+                                    )
+                                },
+                                **{option: schema for option, schema
+                                   in SCREENSHOT_PROPERTIES.items()
+                                   if option != "region"},
+                                "stop_if": {
+                                    "type": "string",
+                                    "description": (
+                                        "Stop running steps if this step "
+                                        "(match, wait_for_match, or ocr with "
+                                        "expect) matched or didn't match"
+                                    ),
+                                    "enum": ["matched", "not_matched"]
+                                }
+                            },
+                            "required": ["action"]
+                        }
+                    },
+                    "stop_on_error": {
+                        "type": "boolean",
+                        "description": (
+                            "Stop running steps if a step fails (default: "
+                            "true)"
+                        ),
+                        "default": True
+                    },
+                    "device_id": {
+                        "type": "string",
+                        "description": (
+                            "Portal device ID. If not specified, the steps run "
+                            "against the local device."
+                        )
+                    }
+                },
+                "required": ["steps"]
+            }
+        ),
         Tool(
             name="stb_get_config",
             description="Get the current STB Tester configuration values.",
@@ -530,7 +1191,14 @@ async def list_tools() -> list[Tool]:
         ),
         Tool(
             name="stb_navigate_menu",
-            description="Navigate through a menu using directional keys to reach a target item (identified by image or text).",
+            description=(
+                "Navigate through a menu using directional keys to reach a "
+                "target item (identified by image or text). After each key "
+                "press it waits for the screen to stop moving before checking "
+                "for the target, and it stops early if a key press doesn't "
+                "change the screen (the end of the menu). Returns the path "
+                "taken, with timings for each step."
+            ),
             inputSchema={
                 "type": "object",
                 "properties": {
@@ -538,6 +1206,14 @@ async def list_tools() -> list[Tool]:
                         "type": "string",
                         "description": "Path to reference image of target menu item"
                     },
+                    "target_images": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": (
+                            "Paths to several reference images; navigation "
+                            "stops when any of them is found"
+                        )
+                    },
                     "target_text": {
                         "type": "string",
                         "description": "Text to find via OCR (alternative to image)"
@@ -562,6 +1238,39 @@ async def list_tools() -> list[Tool]:
                             "width": {"type": "integer"},
                             "height": {"type": "integer"}
                         }
+                    },
+                    "focus_region": {
+                        "type": "object",
+                        "description": (
+                            "The part of the screen where the focus highlight "
+                            "can be (for example the menu's column). The "
+                            "target is only searched for here, which is faster "
+                            "and avoids false matches elsewhere on the screen. "
+                            "Also used for target_text if text_region isn't "
+                            "given."
+                        ),
+                        "properties": {
+                            "x": {"type": "integer"},
+                            "y": {"type": "integer"},
+                            "width": {"type": "integer"},
+                            "height": {"type": "integer"}
+                        }
+                    },
+                    "stable_secs": {
+                        "type": "number",
+                        "description": (
+                            "After each key press, wait until the screen has "
+                            "stopped moving for this long (default: 0.5)"
+                        ),
+                        "default": 0.5
+                    },
+                    "timeout_secs": {
+                        "type": "number",
+                        "description": (
+                            "Maximum time to wait for the screen to stop "
+                            "moving after each key press (default: 5)"
+                        ),
+                        "default": 5
                     }
                 }
             }
@@ -570,9 +1279,721 @@ async def list_tools() -> list[Tool]:
     return tools
 
 
+# Tools that operate on a single Portal node (identified by the "device_id"
+# argument, or the connected device).
+PORTAL_DEVICE_TOOLS = {
+    "stb_connect_device",
+    "stb_device_info",
+    "stb_device_screenshot",
+    "stb_device_press",
+    "stb_run_test",
+}
+
+# Tools that operate on the local device-under-test via stbt_core.
+LOCAL_TOOLS = {
+    "stb_press",
+    "stb_press_and_wait",
+    "stb_press_until_match",
+    "stb_match",
+    "stb_wait_for_match",
+    "stb_wait_for_motion",
+    "stb_ocr",
+    "stb_is_screen_black",
+    "stb_screenshot",
+    "stb_navigate_menu",
+}
+
+# Local tools that can analyse a Portal device's screenshot instead (see
+# `_analysis_frame`).
+ANALYSIS_TOOLS = {"stb_match", "stb_ocr", "stb_is_screen_black"}
+
+# The actions that `stb_run_steps` supports.
+RUN_STEPS_ACTIONS = ("press", "press_and_wait", "match", "wait_for_match",
+                     "ocr", "screenshot")
+# The actions that `stb_run_steps` supports on Portal devices.
+PORTAL_RUN_STEPS_ACTIONS = ("press", "press_and_wait", "match", "ocr",
+                            "screenshot")
+
+# Tool implementations block (HTTP requests to the Portal, or stbt operations
+# that can take tens of seconds), so they run on this thread pool. This keeps
+# the stdio event loop free to service other requests, including
+# cancellations.
+MAX_WORKERS = int(os.environ.get("STBT_MCP_MAX_WORKERS", "16"))
+# How many tool calls can run at the same time against the same device. A
+# device can only do one thing at a time, so by default calls are queued.
+MAX_CONCURRENT_PER_DEVICE = int(
+    os.environ.get("STBT_MCP_MAX_CONCURRENT_PER_DEVICE", "1"))
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS,
+                               thread_name_prefix="stb-tester-mcp")
+_device_semaphores: dict[str, asyncio.Semaphore] = {}
+
+
+class ToolCancelled(Exception):
+    """Raised inside a tool implementation when the client cancelled the
+    request."""
+
+
+def _device_key(name: str, arguments: dict) -> Optional[str]:
+    """Which device a tool call operates on, for the per-device concurrency
+    limit. None if it doesn't operate on a device."""
+    if name in PORTAL_DEVICE_TOOLS:
+        return "portal:%s" % arguments.get("device_id", connected_device)
+    if name in ANALYSIS_TOOLS and arguments.get("device_id"):
+        return "portal:%s" % arguments["device_id"]
+    if name in LOCAL_TOOLS:
+        return "local"
+    if name == "stb_run_steps":
+        if arguments.get("device_id"):
+            return "portal:%s" % arguments["device_id"]
+        return "local"
+    return None
+
+
+def _cancellable_frames(cancel_event: threading.Event):
+    """`stbt.frames()`, but stops the operation that is consuming the frames
+    (e.g. `stbt.wait_for_match`) if the request is cancelled."""
+    for frame in stbt.frames():
+        if cancel_event.is_set():
+            raise ToolCancelled()
+        yield frame
+
+
+# Job statuses reported by the Portal once a job has stopped running.
+FINISHED_JOB_STATUSES = {
+    "exited", "completed", "finished", "failed", "cancelled"}
+# How often the job watcher polls the Portal: It starts at the minimum
+# interval and backs off while the job's status doesn't change.
+JOB_POLL_MIN_SECS = float(os.environ.get("STBT_MCP_JOB_POLL_MIN_SECS", "1"))
+JOB_POLL_MAX_SECS = float(os.environ.get("STBT_MCP_JOB_POLL_MAX_SECS", "30"))
+
+
+def _job_finished(state: Optional[dict]) -> bool:
+    return bool(state) and state.get("status") in FINISHED_JOB_STATUSES
+
+
+class _WatchedJob:
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.state: Optional[dict] = None
+        self.polled_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        # Set (and replaced with a new Event) every time `state` changes.
+        self.changed = asyncio.Event()
+        # Client sessions to notify when the job finishes.
+        self.sessions = weakref.WeakSet()
+
+    def update(self, state: dict):
+        self.state = state
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class JobWatcher:
+    """Follows the status of Portal jobs on behalf of all connected clients.
+
+    There is at most one poller per job, however many clients are interested
+    in it. It polls `PortalClient.get_job_status` every `min_interval` seconds
+    while the job's status is changing, backing off to `max_interval` seconds
+    while it isn't. When the job finishes, every session that submitted or
+    asked about the job gets a "notifications/message" notification (logger
+    "stb-tester.jobs"). Finished jobs are remembered for `keep_secs`.
+    """
+
+    # Give up following a job after this many consecutive errors.
+    MAX_ERRORS = 5
+
+    def __init__(self, client: PortalClient, min_interval: float = 1,
+                 max_interval: float = 30, backoff: float = 1.5,
+                 keep_secs: float = 600):
+        self._client = client
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.keep_secs = keep_secs
+        self._jobs: dict[str, _WatchedJob] = {}
+
+    def watch(self, job_id: str, session=None) -> _WatchedJob:
+        """Start following `job_id`, if we aren't already. Doesn't wait for
+        the first poll."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            job = self._jobs[job_id] = _WatchedJob(job_id)
+        if session is not None:
+            job.sessions.add(session)
+        if job.task is None and not _job_finished(job.state):
+            job.task = asyncio.create_task(self._poll(job))
+        return job
+
+    async def status(self, job_id: str, session=None) -> _WatchedJob:
+        """The latest known state of `job_id`. Only waits for the Portal if
+        we weren't already following the job."""
+        job = self.watch(job_id, session)
+        if job.state is None:
+            await job.changed.wait()
+        return job
+
+    async def wait(self, job_id: str, timeout_secs: float, session=None,
+                   on_update=None) -> _WatchedJob:
+        """Wait until `job_id` finishes (or we stop following it because of
+        errors), or until `timeout_secs` have passed. Calls the coroutine
+        function `on_update(job)` every time the job's state changes."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout_secs
+        job = await self.status(job_id, session)
+        while job.task is not None:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(job.changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+            if on_update is not None:
+                await on_update(job)
+        return job
+
+    async def _poll(self, job: _WatchedJob):
+        loop = asyncio.get_running_loop()
+        interval = self.min_interval
+        errors = 0
+        try:
+            while True:
+                state = await loop.run_in_executor(
+                    _executor, self._client.get_job_status, job.job_id)
+                job.polled_at = time.time()
+                if "error" in state:
+                    errors += 1
+                    if job.state is None or errors >= self.MAX_ERRORS:
+                        job.update(state)
+                        return
+                    interval = min(interval * self.backoff,
+                                   self.max_interval)
+                else:
+                    errors = 0
+                    if state != job.state:
+                        interval = self.min_interval
+                        job.update(state)
+                    else:
+                        interval = min(interval * self.backoff,
+                                       self.max_interval)
+                    if _job_finished(state):
+                        await self._notify_finished(job)
+                        return
+                await asyncio.sleep(interval)
+        finally:
+            job.task = None
+            # Wake up anyone in `wait`, even if we stopped following the job
+            # because of an error:
+            job.update(job.state)
+            loop.call_later(self.keep_secs, self._forget, job)
+
+    def _forget(self, job: _WatchedJob):
+        if job.task is None and self._jobs.get(job.job_id) is job:
+            del self._jobs[job.job_id]
+
+    async def _notify_finished(self, job: _WatchedJob):
+        data = {"event": "job_finished", "job_id": job.job_id, **job.state}
+        for session in list(job.sessions):
+            try:
+                await session.send_log_message(
+                    level="info", data=data, logger="stb-tester.jobs")
+            except Exception:  # pylint:disable=broad-except
+                # The client has gone away.
+                pass
+
+
+job_watcher: Optional[JobWatcher] = None
+if PORTAL_AVAILABLE:
+    job_watcher = JobWatcher(
+        portal_client, JOB_POLL_MIN_SECS, JOB_POLL_MAX_SECS)
+
+
+def _job_result(job: _WatchedJob, **extra) -> list[TextContent]:
+    result = dict(job.state or {})
+    result.setdefault("job_id", job.job_id)
+    if job.polled_at is not None:
+        result["status_age_secs"] = round(time.time() - job.polled_at, 1)
+    result.update(extra)
+    return [TextContent(type="text", text=json.dumps(result, indent=2))]
+
+
+def _submitted_job_id(result: list) -> Optional[str]:
+    """The job ID from the result of `stb_run_test`, if it succeeded."""
+    try:
+        response = json.loads(result[0].text)
+    except (IndexError, AttributeError, ValueError):
+        return None
+    return _response_job_id(response)
+
+
+def _response_job_id(response: Any) -> Optional[str]:
+    """The job ID from the Portal's response to `PortalClient.run_test`, if
+    it succeeded."""
+    if not isinstance(response, dict) or "error" in response:
+        return None
+    return response.get("job_uid") or response.get("job_id")
+
+
+async def _call_job_tool(name: str, arguments: dict) -> list[TextContent]:
+    """`stb_job_status` and `stb_wait_for_job`, answered from `job_watcher`
+    rather than by polling the Portal for each request."""
+    ctx = server.request_context
+    job_id = arguments["job_id"]
+    if name == "stb_job_status":
+        return _job_result(await job_watcher.status(job_id, ctx.session))
+
+    progress_token = ctx.meta.progressToken if ctx.meta else None
+    updates = 0
+
+    async def on_update(job: _WatchedJob):
+        nonlocal updates
+        if progress_token is None or not job.state:
+            return
+        updates += 1
+        await ctx.session.send_progress_notification(
+            progress_token, updates,
+            message=f"Job {job_id}: {job.state.get('status', 'unknown')}",
+            related_request_id=ctx.request_id)
+
+    start = time.time()
+    job = await job_watcher.wait(
+        job_id, float(arguments.get("timeout_secs", 300)), ctx.session,
+        on_update)
+    return _job_result(job, finished=_job_finished(job.state),
+                       waited_secs=round(time.time() - start, 1))
+
+
 @server.call_tool()
 async def call_tool(name: str, arguments: dict) -> list[TextContent | ImageContent | EmbeddedResource]:
-    """Execute an STB Tester tool."""
+    """Execute an STB Tester tool.
+
+    The tool runs on `_executor`. If the client cancels the request we return
+    immediately, and signal the tool to stop at its next opportunity; the
+    device stays reserved (for the per-device concurrency limit) until the
+    tool has actually finished.
+    """
+    if (job_watcher is not None and
+            name in ("stb_job_status", "stb_wait_for_job")):
+        return await _call_job_tool(name, arguments)
+    if name in FAN_OUT_TOOLS:
+        return await _call_fan_out_tool(name, arguments)
+    if name in LOCAL_TOOLS or name in ("stb_get_config", "stb_run_steps"):
+        _import_stbt_in_background()
+
+    cancel_event = threading.Event()
+    try:
+        result = await _run_on_device(
+            _device_key(name, arguments), _call_tool_sync, name, arguments,
+            cancel_event)
+    except asyncio.CancelledError:
+        cancel_event.set()
+        raise
+    if job_watcher is not None and name == "stb_run_test":
+        job_id = _submitted_job_id(result)
+        if job_id:
+            job_watcher.watch(job_id, server.request_context.session)
+    return result
+
+
+async def _run_on_device(key: Optional[str], fn, *args):
+    """Run `fn(*args)` on `_executor`, first waiting for the device `key` (see
+    `_device_key`) to be free. If we are cancelled we return immediately, but
+    the device stays reserved until `fn` has actually finished."""
+    loop = asyncio.get_running_loop()
+    semaphore = None
+    if key is not None:
+        semaphore = _device_semaphores.setdefault(
+            key, asyncio.Semaphore(MAX_CONCURRENT_PER_DEVICE))
+        await semaphore.acquire()
+    try:
+        future = loop.run_in_executor(_executor, fn, *args)
+    except BaseException:
+        if semaphore is not None:
+            semaphore.release()
+        raise
+    if semaphore is not None:
+        future.add_done_callback(lambda _: semaphore.release())
+    return await asyncio.shield(future)
+
+
+def _node_has_tags(node: Any, tags: list[str]) -> bool:
+    """Whether a node from `PortalClient.list_nodes` has all of `tags`. A tag
+    is "name" or "name=value"; the node's tags can be a list of names or a
+    dict of names to values."""
+    node_tags = node.get("tags") if isinstance(node, dict) else None
+    if not node_tags:
+        return False
+    for tag in tags:
+        tag_name, _, value = tag.partition("=")
+        if isinstance(node_tags, dict):
+            if tag_name not in node_tags:
+                return False
+            if value and str(node_tags[tag_name]) != value:
+                return False
+        elif tag not in node_tags:
+            return False
+    return True
+
+
+def _fan_out_devices(arguments: dict) -> list[str]:
+    """The devices that a fan-out tool should operate on."""
+    if arguments.get("device_ids"):
+        return list(dict.fromkeys(arguments["device_ids"]))
+    tags = arguments.get("tags")
+    if not tags:
+        raise ValueError("Specify device_ids or tags")
+    if not PORTAL_AVAILABLE:
+        raise ValueError("Selecting devices by tags requires the Portal API")
+    response = portal_client.list_nodes()
+    if isinstance(response, dict) and "error" in response:
+        raise ValueError(response["error"])
+    nodes = _nodes_from_response(response)
+    return [node["node_id"] for node in nodes if _node_has_tags(node, tags)]
+
+
+# The result of a step of stb_run_steps, or of one device's part of a
+# fan-out tool: A JSON-able dict, and an optional (image data, MIME type).
+StepResult = tuple[dict, Optional[tuple[bytes, str]]]
+
+
+def _image_contents(images: list[tuple[bytes, str]]) -> list[ImageContent]:
+    return [ImageContent(type="image",
+                         data=base64.b64encode(data).decode("utf-8"),
+                         mimeType=mime_type)
+            for data, mime_type in images]
+
+
+def _fan_out_press(device_id: str, arguments: dict) -> StepResult:
+    if not PORTAL_AVAILABLE:
+        return {"status": "success", "key": arguments["key"],
+                "mode": "mock"}, None
+    response = portal_client.press_key(device_id, arguments["key"])
+    if "error" in response:
+        return response, None
+    return {"status": "success", "key": arguments["key"]}, None
+
+
+def _fan_out_screenshot(device_id: str, arguments: dict) -> StepResult:
+    if not PORTAL_AVAILABLE:
+        return {"status": "mock"}, None
+    image = _portal_screenshot(device_id, arguments)
+    if image is None:
+        return {"status": "unchanged"}, None
+    return {"status": "captured"}, image
+
+
+def _fan_out_run_test(device_id: str, arguments: dict) -> StepResult:
+    if not PORTAL_AVAILABLE:
+        return {"status": "submitted", "job_id": f"mock-job-{device_id}",
+                "mode": "mock"}, None
+    response = portal_client.run_test(
+        device_id, arguments["test_pack"], arguments["test_case"])
+    return response, None
+
+
+# Tools that do the same thing on several Portal devices at once.
+FAN_OUT_TOOLS = {
+    "stb_multi_press": _fan_out_press,
+    "stb_multi_screenshot": _fan_out_screenshot,
+    "stb_multi_run_test": _fan_out_run_test,
+}
+
+
+async def _call_fan_out_tool(
+        name: str, arguments: dict) -> list[TextContent | ImageContent]:
+    """Run one of the `FAN_OUT_TOOLS` on each of the selected devices, at most
+    `max_parallel` at a time, respecting the per-device concurrency limit."""
+    loop = asyncio.get_running_loop()
+    start = time.time()
+    try:
+        devices = await loop.run_in_executor(
+            _executor, _fan_out_devices, arguments)
+    except ValueError as e:
+        error = {"error": str(e)}
+        devices = []
+    else:
+        error = {"error": "No devices selected", "tags": arguments.get("tags")}
+    if not devices:
+        return [TextContent(type="text", text=json.dumps(error, indent=2))]
+
+    fn = FAN_OUT_TOOLS[name]
+    max_parallel = int(arguments.get("max_parallel", 8))
+    parallel = asyncio.Semaphore(max(1, min(max_parallel, MAX_WORKERS)))
+
+    async def run(device_id):
+        async with parallel:
+            device_start = time.time()
+            try:
+                result, image = await _run_on_device(
+                    f"portal:{device_id}", fn, device_id, arguments)
+            except Exception as e:  # pylint:disable=broad-except
+                result = {"error": str(e), "type": type(e).__name__}
+                image = None
+            secs = round(time.time() - device_start, 3)
+            return {"device_id": device_id, **result, "secs": secs}, image
+
+    results = await asyncio.gather(*(run(device_id) for device_id in devices))
+
+    images = []
+    for result, image in results:
+        if image is not None:
+            result["image"] = len(images)
+            images.append(image)
+    if name == "stb_multi_run_test" and job_watcher is not None:
+        for result, _ in results:
+            job_id = _response_job_id(result)
+            if job_id:
+                job_watcher.watch(job_id, server.request_context.session)
+
+    summary = {
+        "count": len(results),
+        "succeeded": sum(1 for result, _ in results if "error" not in result),
+        "total_secs": round(time.time() - start, 3),
+        "devices": [result for result, _ in results],
+    }
+    return ([TextContent(type="text", text=json.dumps(summary, indent=2))] +
+            _image_contents(images))
+
+
+def _run_steps(
+        steps: list, device_id: Optional[str], stop_on_error: bool,
+        cancel_event: threading.Event) -> list[TextContent | ImageContent]:
+    """Implementation of `stb_run_steps`.
+
+    Returns one JSON summary of all the steps (each with its duration),
+    followed by the images captured by any "screenshot" steps.
+    """
+    start = time.time()
+    results = []
+    images = []
+    stop_reason = None
+    for i, step in enumerate(steps):
+        if cancel_event.is_set():
+            raise ToolCancelled()
+        action = step.get("action")
+        step_start = time.time()
+        try:
+            if action not in RUN_STEPS_ACTIONS:
+                raise ValueError(f"Unknown action: {action!r}")
+            if device_id:
+                result, image = _run_portal_step(step, device_id)
+            else:
+                result, image = _run_local_step(step, cancel_event)
+        except ToolCancelled:
+            raise
+        except Exception as e:  # pylint:disable=broad-except
+            result = {"error": str(e), "type": type(e).__name__}
+            image = None
+        secs = round(time.time() - step_start, 3)
+        result = {"step": i, "action": action, **result, "secs": secs}
+        if image is not None:
+            result["image"] = len(images)
+            images.append(image)
+        results.append(result)
+
+        if "error" in result and stop_on_error:
+            stop_reason = "error"
+        elif step.get("stop_if") == "matched" and result.get("matched"):
+            stop_reason = "matched"
+        elif (step.get("stop_if") == "not_matched" and
+              result.get("matched") is False):
+            stop_reason = "not_matched"
+        if stop_reason:
+            break
+
+    summary = {
+        "completed": len(results),
+        "total": len(steps),
+        "stopped_at": len(results) - 1 if stop_reason else None,
+        "stop_reason": stop_reason,
+        "total_secs": round(time.time() - start, 3),
+        "steps": results,
+    }
+    if device_id:
+        summary["device_id"] = device_id
+    return ([TextContent(type="text", text=json.dumps(summary))] +
+            _image_contents(images))
+
+
+def _run_local_step(step: dict, cancel_event: threading.Event,
+                    frame=None) -> StepResult:
+    """Run one `stb_run_steps` step with `stbt`. Returns the step's result,
+    and the (data, mime type) of the image captured by a screenshot step.
+
+    match and ocr steps analyse `frame`, if given, instead of the live video.
+    """
+    action = step["action"]
+    region = region_from_dict(step.get("region"))
+    region_kwargs = {"region": region} if region else {}
+    if not _stbt_available():
+        result = {"key": step["key"]} if action.startswith("press") else {}
+        result["mode"] = "mock"
+        if action in ("match", "wait_for_match"):
+            result["matched"] = True
+        elif action == "ocr":
+            result["text"] = stbt_impl.ocr()
+            if "expect" in step:
+                result["matched"] = (
+                    step["expect"].lower() in result["text"].lower())
+        return result, None
+
+    if action == "press":
+        stbt.press(step["key"])
+        return {"key": step["key"]}, None
+
+    elif action == "press_and_wait":
+        transition = stbt.press_and_wait(
+            step["key"], stable_secs=step.get("stable_secs", 1),
+            frames=_cancellable_frames(cancel_event))
+        return {"key": step["key"], "status": transition.status.name}, None
+
+    elif action in ("match", "wait_for_match"):
+        if action == "match":
+            match_result = stbt.match(
+                step["image"], frame=frame, **region_kwargs)
+        else:
+            try:
+                match_result = stbt.wait_for_match(
+                    step["image"], timeout_secs=step.get("timeout_secs", 10),
+                    frames=_cancellable_frames(cancel_event), **region_kwargs)
+            except stbt.MatchTimeout:
+                return {"matched": False}, None
+        result = {"matched": bool(match_result.match)}
+        if match_result.match:
+            result["position"] = _region_to_dict(match_result.region)
+        return result, None
+
+    elif action == "ocr":
+        ocr_kwargs = dict(region_kwargs)
+        if step.get("mode"):
+            ocr_kwargs["mode"] = getattr(stbt.OcrMode, step["mode"])
+        text = stbt.ocr(frame=frame, **ocr_kwargs)
+        result = {"text": text}
+        if "expect" in step:
+            result["matched"] = step["expect"].lower() in text.lower()
+        return result, None
+
+    else:  # screenshot
+        image = _prepare_screenshot("local", stbt.get_frame(), step)
+        if image is None:
+            return {"status": "unchanged"}, None
+        return {}, image
+
+
+def _region_to_dict(region) -> dict:
+    return {"x": region.x, "y": region.y,
+            "width": region.width, "height": region.height}
+
+
+def _run_portal_step(step: dict, device_id: str) -> StepResult:
+    """Run one `stb_run_steps` step against a Portal device."""
+    action = step["action"]
+    if action not in PORTAL_RUN_STEPS_ACTIONS:
+        raise ValueError(f"{action} isn't supported on Portal devices")
+    if action == "screenshot":
+        if not PORTAL_AVAILABLE:
+            return {"mode": "mock"}, None
+        image = _portal_screenshot(device_id, step)
+        if image is None:
+            return {"status": "unchanged"}, None
+        return {}, image
+    if action in ("match", "ocr"):
+        if not PORTAL_AVAILABLE:
+            return {"mode": "mock"}, None
+        # Fetch the screenshot and analyse it here. (Without stbt_core this
+        # gives a mock result.)
+        frame = None
+        if _stbt_available():
+            frame = portal_client.get_frame(device_id)
+        return _run_local_step(step, None, frame=frame)
+    if not PORTAL_AVAILABLE:
+        return {"key": step["key"], "mode": "mock"}, None
+    # The Portal API has no equivalent of press_and_wait, so that is a plain
+    # press.
+    response = portal_client.press_key(device_id, step["key"])
+    if "error" in response:
+        return response, None
+    return {"key": step["key"]}, None
+
+
+def _navigate_menu(key: str, target_images: list[str],
+                   target_text: Optional[str], max_steps: int, focus_region,
+                   text_region, stable_secs: float, timeout_secs: float,
+                   cancel_event: threading.Event) -> dict:
+    """Implementation of `stb_navigate_menu`.
+
+    Presses `key` with `stbt.press_and_wait` (watching `focus_region` for
+    movement) until one of `target_images` is visible in `focus_region`, or
+    `target_text` is in the text of `text_region` (or `focus_region`). Each
+    check uses the frame where the transition ended, and the target images
+    are all matched against that same frame, so `stbt.match` builds the
+    frame's image pyramid only once.
+    """
+    focus_region = focus_region or stbt.Region.ALL
+    start = time.time()
+    path = []
+    frame = stbt.get_frame()
+    for step in range(max_steps + 1):
+        check_start = time.time()
+        found = None
+        if target_images:
+            for image in target_images:
+                match_result = stbt.match(
+                    image, frame=frame, region=focus_region)
+                if match_result:
+                    found = {"target": image, "position": _region_to_dict(
+                        match_result.region)}
+                    break
+        else:
+            text = stbt.ocr(frame=frame, region=text_region or focus_region)
+            if path:
+                path[-1]["text"] = text
+            if target_text.lower() in text.lower():
+                found = {"target": target_text, "text": text}
+        if path:
+            path[-1]["check_secs"] = round(time.time() - check_start, 3)
+
+        if found:
+            result = {"status": "found", "matched": True, **found}
+            break
+        if step == max_steps:
+            result = {"status": "not_found", "matched": False,
+                      "reason": "max_steps"}
+            break
+        if cancel_event.is_set():
+            raise ToolCancelled()
+
+        transition = stbt.press_and_wait(
+            key, region=focus_region, stable_secs=stable_secs,
+            timeout_secs=timeout_secs, frames=_cancellable_frames(cancel_event))
+        path.append({
+            "key": key,
+            "transition": transition.status.name,
+            "transition_secs": round(
+                transition.frame.time - transition.press_time, 3),
+        })
+        frame = transition.frame
+        if transition.status == stbt.TransitionStatus.START_TIMEOUT:
+            # Pressing the key didn't change anything: We're at the end of
+            # the menu.
+            result = {"status": "not_found", "matched": False,
+                      "reason": "end_of_menu"}
+            break
+
+    result.update({
+        "method": "image" if target_images else "ocr",
+        "steps": len(path),
+        "path": path,
+        "total_secs": round(time.time() - start, 3),
+    })
+    return result
+
+
+def _call_tool_sync(
+        name: str, arguments: dict, cancel_event: threading.Event
+) -> list[TextContent | ImageContent | EmbeddedResource]:
+    """Blocking implementation of `call_tool`. Runs on `_executor`."""
     global connected_device
 
     try:
@@ -654,7 +2075,12 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent | ImageConte
                 return [TextContent(type="text", text=json.dumps(result, indent=2))]
 
             try:
-                image_data, content_type = portal_client.get_screenshot(device_id)
+                prepared = _portal_screenshot(device_id, arguments)
+                if prepared is None:
+                    result = {"status": "unchanged", "device_id": device_id}
+                    return [TextContent(
+                        type="text", text=json.dumps(result, indent=2))]
+                image_data, content_type = prepared
 
                 if save_path:
                     with open(save_path, "wb") as f:
@@ -717,7 +2143,9 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent | ImageConte
                 result = response
             return [TextContent(type="text", text=json.dumps(result, indent=2))]
 
-        elif name == "stb_job_status":
+        elif name in ("stb_job_status", "stb_wait_for_job"):
+            # With the Portal configured these are handled by `job_watcher`
+            # instead; see `_call_job_tool`.
             job_id = arguments["job_id"]
             if not PORTAL_AVAILABLE:
                 result = {
@@ -726,6 +2154,8 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent | ImageConte
                     "result": "pass",
                     "mode": "mock"
                 }
+                if name == "stb_wait_for_job":
+                    result["finished"] = True
             else:
                 response = portal_client.get_job_status(job_id)
                 result = response
@@ -735,7 +2165,7 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent | ImageConte
 
         elif name == "stb_press":
             key = arguments["key"]
-            if STBT_AVAILABLE:
+            if _stbt_available():
                 stbt.press(key)
                 result = {"status": "success", "key": key}
             else:
@@ -745,7 +2175,7 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent | ImageConte
         elif name == "stb_press_and_wait":
             key = arguments["key"]
             stable_secs = arguments.get("stable_secs", 1)
-            if STBT_AVAILABLE:
+            if _stbt_available():
                 stbt.press_and_wait(key, stable_secs=stable_secs)
                 result = {"status": "success", "key": key, "stable_secs": stable_secs}
             else:
@@ -757,7 +2187,7 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent | ImageConte
             image = arguments["image"]
             max_presses = arguments.get("max_presses", 10)
             interval_secs = arguments.get("interval_secs", 1)
-            if STBT_AVAILABLE:
+            if _stbt_available():
                 match_result = stbt.press_until_match(
                     key, image,
                     max_presses=max_presses,
@@ -779,20 +2209,21 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent | ImageConte
         elif name == "stb_match":
             image = arguments["image"]
             region = region_from_dict(arguments.get("region"))
-            if STBT_AVAILABLE:
+            if _stbt_available():
+                frame = _analysis_frame(arguments)
                 if region:
-                    match_result = stbt.match(image, region=region)
+                    match_result = stbt.match(image, frame=frame, region=region)
                 else:
-                    match_result = stbt.match(image)
+                    match_result = stbt.match(image, frame=frame)
                 result = {
                     "matched": match_result.match,
                     "confidence": match_result.first_pass_result if hasattr(match_result, 'first_pass_result') else None,
                     "position": {
-                        "x": match_result.position.x,
-                        "y": match_result.position.y,
-                        "width": match_result.position.width,
-                        "height": match_result.position.height
-                    } if match_result.match and hasattr(match_result, 'position') else None
+                        "x": match_result.region.x,
+                        "y": match_result.region.y,
+                        "width": match_result.region.width,
+                        "height": match_result.region.height
+                    } if match_result.match else None
                 }
             else:
                 match_result = stbt_impl.match(image, region)
@@ -804,11 +2235,12 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent | ImageConte
             timeout_secs = arguments.get("timeout_secs", 10)
             region = region_from_dict(arguments.get("region"))
             try:
-                if STBT_AVAILABLE:
-                    if region:
-                        match_result = stbt.wait_for_match(image, timeout_secs=timeout_secs, region=region)
-                    else:
-                        match_result = stbt.wait_for_match(image, timeout_secs=timeout_secs)
+                if _stbt_available():
+                    frames = _cancellable_frames(cancel_event)
+                    region_kwargs = {"region": region} if region else {}
+                    match_result = stbt.wait_for_match(
+                        image, timeout_secs=timeout_secs, frames=frames,
+                        **region_kwargs)
                     result = {
                         "status": "found",
                         "matched": True,
@@ -830,11 +2262,11 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent | ImageConte
             timeout_secs = arguments.get("timeout_secs", 5)
             region = region_from_dict(arguments.get("region"))
             try:
-                if STBT_AVAILABLE:
-                    if region:
-                        stbt.wait_for_motion(timeout_secs=timeout_secs, region=region)
-                    else:
-                        stbt.wait_for_motion(timeout_secs=timeout_secs)
+                if _stbt_available():
+                    frames = _cancellable_frames(cancel_event)
+                    region_kwargs = {"region": region} if region else {}
+                    stbt.wait_for_motion(timeout_secs=timeout_secs,
+                                         frames=frames, **region_kwargs)
                     result = {"status": "motion_detected", "motion": True}
                 else:
                     result = {"status": "motion_detected", "motion": True, "mode": "mock"}
@@ -848,44 +2280,71 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent | ImageConte
         elif name == "stb_ocr":
             region = region_from_dict(arguments.get("region"))
             mode_str = arguments.get("mode")
-            if STBT_AVAILABLE:
+            if _stbt_available():
                 ocr_kwargs = {}
                 if region:
                     ocr_kwargs["region"] = region
                 if mode_str:
                     ocr_kwargs["mode"] = getattr(stbt.OcrMode, mode_str, None)
-                text = stbt.ocr(**ocr_kwargs)
+                text = stbt.ocr(frame=_analysis_frame(arguments), **ocr_kwargs)
                 result = {"text": text, "region": str(region) if region else "full_screen"}
             else:
                 result = {"text": "Mock OCR Text", "mode": "mock"}
             return [TextContent(type="text", text=json.dumps(result, indent=2))]
 
+        elif name == "stb_is_screen_black":
+            region = region_from_dict(arguments.get("region"))
+            if _stbt_available():
+                frame = _analysis_frame(arguments)
+                if region:
+                    black = stbt.is_screen_black(frame=frame, region=region)
+                else:
+                    black = stbt.is_screen_black(frame=frame)
+                result = {"black": bool(black)}
+            else:
+                result = {"black": stbt_impl.is_screen_black(region),
+                          "mode": "mock"}
+            return [TextContent(type="text", text=json.dumps(result, indent=2))]
+
         elif name == "stb_screenshot":
             save_path = arguments.get("save_path")
-            if STBT_AVAILABLE:
+            if _stbt_available():
                 frame = stbt.get_frame()
                 if frame is not None:
                     import cv2
-                    if save_path:
+                    if save_path and not _screenshot_options_given(arguments):
                         cv2.imwrite(save_path, frame)
+                        _remember_screenshot("local", frame)
                         result = {"status": "saved", "path": save_path}
                     else:
-                        _, buffer = cv2.imencode('.png', frame)
-                        b64_image = base64.b64encode(buffer).decode('utf-8')
-                        return [
-                            TextContent(type="text", text=json.dumps({"status": "captured"})),
-                            ImageContent(type="image", data=b64_image, mimeType="image/png")
-                        ]
+                        prepared = _prepare_screenshot(
+                            "local", frame, arguments)
+                        if prepared is None:
+                            result = {"status": "unchanged"}
+                        elif save_path:
+                            with open(save_path, "wb") as f:
+                                f.write(prepared[0])
+                            result = {"status": "saved", "path": save_path}
+                        else:
+                            captured = TextContent(
+                                type="text",
+                                text=json.dumps({"status": "captured"}))
+                            return [captured] + _image_contents([prepared])
                 else:
                     result = {"status": "error", "error": "No frame available"}
             else:
                 result = {"status": "mock", "message": "Screenshot captured (mock mode)"}
             return [TextContent(type="text", text=json.dumps(result, indent=2))]
 
+        elif name == "stb_run_steps":
+            return _run_steps(
+                arguments["steps"], arguments.get("device_id"),
+                arguments.get("stop_on_error", True), cancel_event)
+
         elif name == "stb_get_config":
             section = arguments.get("section", "global")
             key = arguments.get("key")
-            if STBT_AVAILABLE:
+            if _stbt_available():
                 try:
                     if key:
                         value = stbt.get_config(section, key)
@@ -912,25 +2371,21 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent | ImageConte
                 "right": "KEY_RIGHT"
             }.get(direction, "KEY_DOWN")
 
-            if STBT_AVAILABLE:
-                if target_image:
-                    # Use press_until_match for image-based navigation
-                    try:
-                        match_result = stbt.press_until_match(direction_key, target_image, max_presses=max_steps)
-                        result = {"status": "found", "method": "image", "matched": True}
-                    except Exception:
-                        result = {"status": "not_found", "method": "image", "matched": False}
-                elif target_text:
-                    # Use OCR-based navigation
-                    found = False
-                    for step in range(max_steps):
-                        text = stbt.ocr(region=text_region) if text_region else stbt.ocr()
-                        if target_text.lower() in text.lower():
-                            found = True
-                            break
-                        stbt.press(direction_key)
-                        await asyncio.sleep(0.5)
-                    result = {"status": "found" if found else "not_found", "method": "ocr", "matched": found, "steps": step + 1}
+            target_images = list(arguments.get("target_images") or [])
+            if target_image:
+                target_images.insert(0, target_image)
+
+            if _stbt_available():
+                if target_images or target_text:
+                    result = _navigate_menu(
+                        direction_key, target_images, target_text,
+                        max_steps=max_steps,
+                        focus_region=region_from_dict(
+                            arguments.get("focus_region")),
+                        text_region=text_region,
+                        stable_secs=arguments.get("stable_secs", 0.5),
+                        timeout_secs=arguments.get("timeout_secs", 5),
+                        cancel_event=cancel_event)
                 else:
                     result = {"status": "error", "error": "Must specify target_image or target_text"}
             else:
@@ -947,6 +2402,10 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent | ImageConte
 
 async def main():
     """Run the STB Tester MCP server."""
+    if not PORTAL_AVAILABLE:
+        # We'll be using the local tools, so get the slow import out of the
+        # way while the client is still starting up.
+        _import_stbt_in_background()
     async with stdio_server() as (read_stream, write_stream):
         await server.run(
             read_stream,
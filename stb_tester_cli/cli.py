@@ -17,6 +17,7 @@ import asyncio
 import os
 import re
 import sys
+import time
 from pathlib import Path
 
 # Determine paths
@@ -169,7 +170,7 @@ def print_help():
 {C.BRIGHT_CYAN}  ━━━ Commands ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━{C.RESET}
 
   {C.BRIGHT_CYAN}/help{C.RESET}     {C.MUTED}Show this help{C.RESET}
-  {C.BRIGHT_CYAN}/status{C.RESET}   {C.MUTED}Show connection status{C.RESET}
+  {C.BRIGHT_CYAN}/status{C.RESET}   {C.MUTED}Show connection status & latency{C.RESET}
   {C.BRIGHT_CYAN}/clear{C.RESET}    {C.MUTED}Clear screen{C.RESET}
   {C.BRIGHT_CYAN}/quit{C.RESET}     {C.MUTED}Exit the CLI{C.RESET}
 
@@ -182,7 +183,39 @@ def print_help():
 """)
 
 
-def print_status():
+class SessionStats:
+    """Latency measurements for the interactive session, shown by /status.
+
+    The Claude Code process (and the MCP server it launches) is started once
+    per session, so `startup_secs` is paid once; each query only pays
+    `query_secs`, and each tool call `tool_secs`.
+    """
+
+    def __init__(self):
+        self.startup_secs = None
+        self.restarts = 0
+        self.query_secs = []
+        self.first_response_secs = []
+        self.tool_secs = {}  # tool name -> list of durations
+        self._tools_in_flight = {}  # tool_use_id -> (tool name, start time)
+
+    def tool_started(self, tool_use_id, name):
+        self._tools_in_flight[tool_use_id] = (name, time.monotonic())
+
+    def tool_finished(self, tool_use_id):
+        name, start = self._tools_in_flight.pop(tool_use_id, (None, None))
+        if name is not None:
+            self.tool_secs.setdefault(name, []).append(time.monotonic() - start)
+
+
+def _format_latency(durations):
+    if not durations:
+        return "-"
+    return "%d × avg %.2fs (max %.2fs)" % (
+        len(durations), sum(durations) / len(durations), max(durations))
+
+
+def print_status(stats=None):
     """Print current connection status with colors."""
     C = Colors
     portal_url = os.environ.get("STBT_PORTAL_URL", "")
@@ -214,6 +247,18 @@ def print_status():
 
     print(f"{C.DIM}│{C.RESET}  {C.BRIGHT_WHITE}MCP Server    :{C.RESET}  {C.INFO}{MCP_SERVER_PATH.name}{C.RESET}")
 
+    if stats is not None:
+        print(f"{C.DIM}├──────────────────────────────────────────────────────────────┤{C.RESET}")
+        print(f"{C.DIM}│{C.RESET}  {C.TITLE}⏱  Latency{C.RESET}")
+        if stats.startup_secs is not None:
+            restarts = f" ({stats.restarts} restarts)" if stats.restarts else ""
+            print(f"{C.DIM}│{C.RESET}  {C.BRIGHT_WHITE}Startup       :{C.RESET}  {C.INFO}{stats.startup_secs:.2f}s{restarts}{C.RESET}")
+        print(f"{C.DIM}│{C.RESET}  {C.BRIGHT_WHITE}First response:{C.RESET}  {C.INFO}{_format_latency(stats.first_response_secs)}{C.RESET}")
+        print(f"{C.DIM}│{C.RESET}  {C.BRIGHT_WHITE}Queries       :{C.RESET}  {C.INFO}{_format_latency(stats.query_secs)}{C.RESET}")
+        for tool_name, durations in sorted(stats.tool_secs.items()):
+            display_name = tool_name.replace('mcp__stb-tester__', '')
+            print(f"{C.DIM}│{C.RESET}    {C.MUTED}{display_name:<22}{C.RESET}  {C.INFO}{_format_latency(durations)}{C.RESET}")
+
     print(f"""{C.DIM}└──────────────────────────────────────────────────────────────┘{C.RESET}
 """)
 
@@ -253,18 +298,36 @@ def test_example():
 ```"""
 
 
-async def process_query(prompt: str, options) -> str:
+async def start_session(options, stats: SessionStats):
+    """Start the Claude Code process, and with it the MCP server, for the
+    whole interactive session."""
+    from claude_agent_sdk import ClaudeSDKClient
+
+    start = time.monotonic()
+    client = ClaudeSDKClient(options=options)
+    await client.connect()
+    stats.startup_secs = time.monotonic() - start
+    return client
+
+
+async def process_query(prompt: str, client, stats: SessionStats) -> str:
     """Process a single query and return the response."""
-    from claude_agent_sdk import query
     C = Colors
 
     response_parts = []
     tool_count = 0
     last_was_tool = False
 
-    async for message in query(prompt=prompt, options=options):
+    start = time.monotonic()
+    first_response = True
+    await client.query(prompt)
+    async for message in client.receive_response():
         msg_type = type(message).__name__
 
+        if msg_type == 'AssistantMessage' and first_response:
+            stats.first_response_secs.append(time.monotonic() - start)
+            first_response = False
+
         if msg_type == 'AssistantMessage':
             # AssistantMessage has content which is a list of TextBlock/ToolUseBlock
             if hasattr(message, 'content') and message.content:
@@ -287,17 +350,27 @@ async def process_query(prompt: str, options) -> str:
                     elif block_type == 'ToolUseBlock':
                         tool_name = getattr(block, 'name', 'tool')
                         tool_count += 1
+                        stats.tool_started(getattr(block, 'id', None), tool_name)
                         # Clean tool name display
                         display_name = tool_name.replace('mcp__stb-tester__', '').replace('_', ' ').title()
                         print(f"\n\n   {C.BG_DARK}{C.TOOL} ⚡ {display_name} {C.RESET}", end="", flush=True)
                         last_was_tool = True
 
+        elif msg_type == 'UserMessage':
+            # Tool results come back to the model as user messages
+            content = getattr(message, 'content', None)
+            if isinstance(content, list):
+                for block in content:
+                    if type(block).__name__ == 'ToolResultBlock':
+                        stats.tool_finished(getattr(block, 'tool_use_id', None))
+
         elif msg_type == 'ResultMessage':
             # End of response
             if hasattr(message, 'is_error') and message.is_error:
                 error = getattr(message, 'result', 'Unknown error')
                 print(f"\n\n   {C.ERROR}❌ Error: {error}{C.RESET}", flush=True)
 
+    stats.query_secs.append(time.monotonic() - start)
     return "".join(response_parts)
 
 
@@ -404,11 +477,8 @@ async def run_cli():
         print(f"{C.DIM}│{C.RESET}  {C.WARNING}✗{C.RESET} MCP Server not found")
 
     print(f"{C.DIM}│{C.RESET}  {C.SUCCESS}✓{C.RESET} Auth: {C.MUTED}Using Claude Code subscription{C.RESET}")
-    print(f"{C.DIM}└────────────────────────────────────────────────────────────┘{C.RESET}")
 
-    print(f"\n  {C.MUTED}Type{C.RESET} {C.BRIGHT_CYAN}/help{C.RESET} {C.MUTED}for commands, or just start chatting!{C.RESET}\n")
-
-    # Create options - reused for each query
+    # Create options - used for the whole session
     # bypassPermissions allows all tool usage without prompting
     options = ClaudeAgentOptions(
         system_prompt=SYSTEM_PROMPT,
@@ -417,6 +487,20 @@ async def run_cli():
         cwd=str(PROJECT_DIR),
     )
 
+    # One session (and one MCP server process) for all the queries, so that
+    # each query doesn't pay for launching the server & importing stbt_core.
+    stats = SessionStats()
+    try:
+        client = await start_session(options, stats)
+    except Exception as e:
+        print(f"{C.DIM}│{C.RESET}  {C.ERROR}✗{C.RESET} Session failed to start: {e}")
+        print(f"{C.DIM}└────────────────────────────────────────────────────────────┘{C.RESET}")
+        sys.exit(1)
+    print(f"{C.DIM}│{C.RESET}  {C.SUCCESS}✓{C.RESET} Session started in {C.INFO}{stats.startup_secs:.1f}s{C.RESET}")
+    print(f"{C.DIM}└────────────────────────────────────────────────────────────┘{C.RESET}")
+
+    print(f"\n  {C.MUTED}Type{C.RESET} {C.BRIGHT_CYAN}/help{C.RESET} {C.MUTED}for commands, or just start chatting!{C.RESET}\n")
+
     # Main interaction loop
     while True:
         try:
@@ -435,7 +519,7 @@ async def run_cli():
                     print_help()
                     continue
                 elif cmd == "/status":
-                    print_status()
+                    print_status(stats)
                     continue
                 elif cmd == "/clear":
                     set_dark_mode()
@@ -451,11 +535,20 @@ async def run_cli():
 
             # Process the query
             try:
-                await process_query(user_input, options)
+                await process_query(user_input, client, stats)
             except Exception as query_error:
                 print(f"\n{C.ERROR}❌ Query error: {query_error}{C.RESET}")
                 import traceback
                 traceback.print_exc()
+                # The session may be broken, so start a new one for the next
+                # query.
+                print(f"{C.MUTED}Restarting session...{C.RESET}")
+                try:
+                    await client.disconnect()
+                except Exception:
+                    pass
+                client = await start_session(options, stats)
+                stats.restarts += 1
 
             # End separator
             print(f"\n{C.DIM}{'─' * 60}{C.RESET}")
@@ -469,6 +562,8 @@ async def run_cli():
             traceback.print_exc()
             continue
 
+    await client.disconnect()
+
 
 def main():
     """Main entry point."""
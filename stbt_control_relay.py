@@ -26,15 +26,32 @@ using its HTTP protocol.  So
     $ irsend -d lircd.sock SEND_ONCE stbt KEY_OK
 
 Will press KEY_OK on the roku device.
+
+One relay can drive several devices. Give each output a name:
+
+    $ stbt control-relay box1=irnetbox:192.168.1.50:1:box.conf \\
+          box2=irnetbox:192.168.1.50:2:box.conf
+
+Lirc clients choose an output with the remote control name in their commands,
+so `irsend SEND_ONCE box2 KEY_OK` will press KEY_OK on output 2 of the
+irNetBox. Commands for any other name go to the output given without a name,
+if there is one. Outputs on the same irNetBox share a single connection to it.
+
+Any number of lirc clients can be connected at the same time. Each output
+sends their commands one at a time, in the order they were received. Use
+--verbose to log how long each command took.
 """
 
 import argparse
+import asyncio
 import logging
 import os
 import re
 import signal
 import socket
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import _stbt.logging
 from _stbt.control import uri_to_control
@@ -51,8 +68,9 @@ def main(argv):
         Timeout, in seconds, before exiting if no commands are received. If not
         specified, never times out.""")
     parser.add_argument("-v", "--verbose", action="store_true")
-    parser.add_argument("output", help="""Remote control configuration to
-        transmit on. Values are the same as stbt run's --control.""")
+    parser.add_argument("output", nargs="+", help="""Remote control
+        configuration to transmit on. Values are the same as stbt run's
+        --control, optionally prefixed with "NAME=" (see below).""")
     args = parser.parse_args(argv[1:])
 
     logging.basicConfig(
@@ -72,52 +90,148 @@ def main(argv):
         s.bind(args.socket)
         s.listen(5)
 
-    if args.timeout:
-        s.settimeout(args.timeout)
+    controls = {}
+    for output in args.output:
+        name, uri = parse_output(output)
+        if name in controls:
+            parser.error("Output %s given more than once" % (name or "URI"))
+        controls[name] = uri_to_control(uri)
+        logging.info("stbt-control-relay started up with output '%s'", output)
+
+    return asyncio.run(Relay(controls).serve(s, args.timeout))
+
+
+def parse_output(output):
+    """Returns the ctrl name (or None) and the control URI.
+
+    >>> parse_output("box1=irnetbox:192.168.1.50:1:box.conf")
+    ('box1', 'irnetbox:192.168.1.50:1:box.conf')
+    >>> parse_output("file:/tmp/a=b")
+    (None, 'file:/tmp/a=b')
+    """
+    # Control URIs always start with "<scheme>:", so an "=" before the first
+    # ":" must be a name.
+    m = re.match(r"([^:=]+)=(.*)$", output)
+    if m:
+        return m.group(1), m.group(2)
+    else:
+        return None, output
+
 
-    control = uri_to_control(args.output)
+class Relay:
+    """Serves any number of lirc clients concurrently.
 
-    logging.info("stbt-control-relay started up with output '%s'", args.output)
-    SdNotifySocket.from_environ().notify(READY=1)
+    Each client's commands are handled (and answered) in order, but a client
+    that keeps its connection open doesn't stop other clients from being
+    served. The controls aren't necessarily thread-safe, and a physical
+    output can only send one signal at a time anyway, so each control has a
+    single worker thread that sends its commands in the order they were
+    received.
 
-    while True:
+    :param dict controls: Maps the remote control name in lirc commands to
+        the control to send them to. The control for the name ``None`` (if
+        any) is used for names that aren't in the dict.
+    """
+
+    def __init__(self, controls):
+        self.controls = controls
+        self._executors = {
+            name: ThreadPoolExecutor(
+                max_workers=1,
+                thread_name_prefix="stbt-control-relay-%s" % (name or ""))
+            for name in controls}
+        self._clients = 0
+        self._last_activity = time.monotonic()
+
+    async def serve(self, sock, timeout=0):
+        server = await asyncio.start_server(self.handle_client, sock=sock)
+        SdNotifySocket.from_environ().notify(READY=1)
+        try:
+            async with server:
+                if not timeout:
+                    await server.serve_forever()
+                while self._clients or \
+                        time.monotonic() - self._last_activity < timeout:
+                    await asyncio.sleep(
+                        max(0.1, self._last_activity + timeout -
+                            time.monotonic()))
+                return 0
+        finally:
+            for executor in self._executors.values():
+                executor.shutdown(wait=False)
+
+    async def handle_client(self, reader, writer):
+        self._clients += 1
+        self._last_activity = time.monotonic()
+        try:
+            while True:
+                try:
+                    cmd = await reader.readline()
+                except ConnectionError:
+                    break
+                if not cmd:
+                    break
+                self._last_activity = time.monotonic()
+                response = await self.handle_command(cmd.rstrip(b"\n"))
+                try:
+                    writer.write(response)
+                    await writer.drain()
+                except ConnectionError:
+                    break
+        finally:
+            self._clients -= 1
+            self._last_activity = time.monotonic()
+            writer.close()
+
+    async def handle_command(self, cmd):
+        """Returns the response to send to the client."""
+        m = re.match(br"(?P<action>SEND_ONCE|SEND_START|SEND_STOP) "
+                     br"(?P<ctrl>\S+) (?P<key>\S+)", cmd)
+        if not m:
+            logging.error("Invalid command: %s", cmd)
+            return format_response(cmd, success=False,
+                                   data=b"Invalid command: %s" % cmd)
+        action = m.group("action")
+        ctrl = m.group("ctrl").decode("utf-8", "replace")
+        key = m.group("key")
+        logging.debug("Received %s %s %s", action, ctrl, key)
+        if ctrl not in self.controls:
+            ctrl = None
+        if ctrl not in self.controls:
+            logging.error("Unknown remote control: %s", cmd)
+            return format_response(
+                cmd, success=False,
+                data=b"Unknown remote control %s" % m.group("ctrl"))
+        received = time.monotonic()
         try:
-            conn, _ = s.accept()
-        except socket.timeout:
-            return 0
-        f = conn.makefile('rb', 0)
-        while True:
-            cmd = f.readline()
-            if not cmd:
-                break
-            cmd = cmd.rstrip(b"\n")
-            m = re.match(br"(?P<action>SEND_ONCE|SEND_START|SEND_STOP) "
-                         br"(?P<ctrl>\S+) (?P<key>\S+)", cmd)
-            if not m:
-                logging.error("Invalid command: %s", cmd)
-                send_response(conn, cmd, success=False,
-                              data=b"Invalid command: %s" % cmd)
-                continue
-            action = m.group("action")
-            key = m.group("key")
-            logging.debug("Received %s %s", action, key)
-            try:
-                key = key.decode("utf-8")
-                if action == b"SEND_ONCE":
-                    control.press(key)
-                elif action == b"SEND_START":
-                    control.keydown(key)
-                elif action == b"SEND_STOP":
-                    control.keyup(key)
-            except Exception as e:  # pylint: disable=broad-except
-                logging.error("Error pressing or releasing key %r: %s", key, e,
-                              exc_info=True)
-                send_response(conn, cmd, success=False, data=to_bytes(str(e)))
-                continue
-            send_response(conn, cmd, success=True)
-
-
-def send_response(sock, request, success, data=b""):
+            key = key.decode("utf-8")
+            started = await asyncio.get_running_loop().run_in_executor(
+                self._executors[ctrl], self._send, self.controls[ctrl],
+                action, key)
+        except Exception as e:  # pylint: disable=broad-except
+            logging.error("Error pressing or releasing key %r: %s", key, e,
+                          exc_info=True)
+            return format_response(cmd, success=False, data=to_bytes(str(e)))
+        finished = time.monotonic()
+        logging.debug("%s %s took %.1fms (%.1fms waiting for the output)",
+                      action.decode(), key, (finished - received) * 1000,
+                      (started - received) * 1000)
+        return format_response(cmd, success=True)
+
+    @staticmethod
+    def _send(control, action, key):
+        """Runs on the control's worker thread. Returns the time it started."""
+        started = time.monotonic()
+        if action == b"SEND_ONCE":
+            control.press(key)
+        elif action == b"SEND_START":
+            control.keydown(key)
+        elif action == b"SEND_STOP":
+            control.keyup(key)
+        return started
+
+
+def format_response(request, success, data=b""):
     # See http://www.lirc.org/html/lircd.html
     message = b"BEGIN\n%s\n%s\n" % (
         request,
@@ -126,11 +240,7 @@ def send_response(sock, request, success, data=b""):
         data = data.split(b"\n")
         message += b"DATA\n%d\n%s\n" % (len(data), b"\n".join(data))
     message += b"END\n"
-
-    try:
-        sock.sendall(message)
-    except Exception:  # pylint: disable=broad-except
-        pass
+    return message
 
 
 class SdNotifySocket:
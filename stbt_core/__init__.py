@@ -55,6 +55,8 @@ from _stbt.match import (
     MatchResult,
     MatchTimeout,
     wait_for_match)
+from _stbt.monitor import (
+    ScreenMonitor)
 from _stbt.motion import (
     detect_motion,
     MotionTimeout,
@@ -76,6 +78,7 @@ from _stbt.precondition import (
 from _stbt.transition import (
     press_and_wait,
     Transition,
+    TransitionAnalyzer,
     TransitionStatus,
     wait_for_transition_to_end)
 from _stbt.types import (
@@ -130,6 +133,7 @@ __all__ = [
     "MatchParameters",
     "MatchResult",
     "MatchTimeout",
+    "monitor_screen",
     "MotionResult",
     "MotionTimeout",
     "MultiPress",
@@ -143,14 +147,17 @@ __all__ = [
     "PreconditionError",
     "press",
     "press_and_wait",
+    "press_sequence",
     "press_until_match",
     "pressing",
     "Region",
     "save_frame",
+    "ScreenMonitor",
     "set_global_ocr_corrections",
     "Size",
     "TextMatchResult",
     "Transition",
+    "TransitionAnalyzer",
     "TransitionStatus",
     "UITestError",
     "UITestFailure",
@@ -224,6 +231,30 @@ def press(
     return _dut.press(key, interpress_delay_secs, hold_secs)
 
 
+def press_sequence(
+    keys: "list[KeyT]", interpress_delay_secs: Optional[float] = None
+) -> "list[Keypress]":
+    """Send a sequence of key-presses to the device under test.
+
+    This is equivalent to calling `stbt.press` for each key, but it has less
+    overhead per key: Some remote-control backends (such as ADB) can send the
+    whole sequence in a single operation.
+
+    :param keys: A list of key names. See `stbt.press`.
+
+    :type interpress_delay_secs: int or float
+    :param interpress_delay_secs: The minimum time to wait between each
+        key-press, and after the previous call to `stbt.press`. See
+        `stbt.press`.
+
+    :returns:
+        A list of `stbt.Keypress` objects, one per key. Note that the
+        ``start_time`` and ``end_time`` of each `stbt.Keypress` are those of
+        the sequence as a whole.
+    """
+    return _dut.press_sequence(keys, interpress_delay_secs)
+
+
 def pressing(
     key: KeyT, interpress_delay_secs: Optional[float] = None
 ) -> ContextManager[Keypress]:
@@ -341,6 +372,36 @@ def get_frame() -> Frame:
     return _dut.get_frame()
 
 
+def monitor_screen(
+    mask: MaskTypes = Region.ALL,
+    black_threshold: Optional[int] = None,
+    noise_threshold: Optional[int] = None,
+) -> ContextManager[ScreenMonitor]:
+    """Context manager that checks every video frame for a black screen or
+    frozen video, for the duration of the ``with`` code block.
+
+    The analysis runs in the video-capture thread as each frame arrives, so it
+    sees every frame even while your test script is busy doing something
+    else (such as `stbt.press_and_wait`). For example::
+
+        with stbt.monitor_screen() as monitor:
+            start = time.time()
+            stbt.press("KEY_CHANNELUP")
+            stbt.press_and_wait("KEY_INFO")
+        assert not monitor.was_black(start, time.time())
+
+    :param mask: The parts of the frame to analyse. See `is_screen_black`.
+    :param int black_threshold: See the ``threshold`` parameter of
+        `is_screen_black`.
+    :param int noise_threshold: See the ``noise_threshold`` parameter of
+        `detect_motion`.
+
+    :returns: A `stbt.ScreenMonitor` that you can query during or after the
+        ``with`` block.
+    """
+    return _dut.monitor_screen(mask, black_threshold, noise_threshold)
+
+
 # Internal
 # ===========================================================================
 
@@ -352,6 +413,10 @@ class UnconfiguredDeviceUnderTest():
         raise RuntimeError(
             "stbt.press isn't configured to run on your hardware")
 
+    def press_sequence(self, *args, **kwargs):
+        raise RuntimeError(
+            "stbt.press_sequence isn't configured to run on your hardware")
+
     def pressing(self, *args, **kwargs):
         raise RuntimeError(
             "stbt.pressing isn't configured to run on your hardware")
@@ -374,6 +439,10 @@ class UnconfiguredDeviceUnderTest():
         raise RuntimeError(
             "stbt.get_frame isn't configured to run on your hardware")
 
+    def monitor_screen(self, *args, **kwargs):
+        raise RuntimeError(
+            "stbt.monitor_screen isn't configured to run on your hardware")
+
 
 _dut: "_stbt.core.DeviceUnderTest | UnconfiguredDeviceUnderTest" = (
     UnconfiguredDeviceUnderTest())
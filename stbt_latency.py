@@ -0,0 +1,207 @@
+#!/usr/bin/python3
+
+"""Measure UI responsiveness by repeating `press_and_wait` many times.
+
+Copyright 2026 Stb-tester.com Ltd.
+License: LGPL v2.1 or (at your option) any later version (see
+https://github.com/stb-tester/stb-tester/blob/master/LICENSE for details).
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+from contextlib import contextmanager
+
+from _stbt.logging import debug, init_logger
+from _stbt.transition import TransitionAnalyzer
+from _stbt.types import Region
+
+FIELDS = ["iteration", "key", "status", "press_time", "animation_start_time",
+          "end_time", "duration", "animation_duration"]
+
+
+def main(argv):
+    import _stbt.core
+    from stbt_core import _set_dut_singleton
+
+    parser = _stbt.core.argparser()
+    add_arguments(parser)
+    args = parser.parse_args(argv[1:])
+    init_logger()
+    debug("Arguments:\n" + "\n".join([
+        "%s: %s" % (k, v) for k, v in args.__dict__.items()]))
+
+    keys = list(args.keys)
+    if args.script:
+        keys += read_key_script(args.script)
+    if not keys:
+        parser.error("No keys to press: specify KEY or --script")
+
+    analyzer = TransitionAnalyzer(
+        mask=parse_mask(args.mask), timeout_secs=args.timeout_secs,
+        stable_secs=args.stable_secs, min_size=args.min_size)
+
+    dut = _stbt.core.new_device_under_test_from_config(args)
+    with _set_dut_singleton(dut), dut, \
+            open_writer(args.output, args.format) as writer:
+        dut.get_frame()  # wait until pipeline is rolling
+        run(analyzer, keys, args.repeat, writer, dut,
+            percentiles=args.percentiles, interpolate=args.interpolate)
+
+    summary = analyzer.percentiles(args.percentiles,
+                                   interpolate=args.interpolate)
+    sys.stdout.write(format_percentiles(analyzer, summary) + "\n")
+    return 0 if all(analyzer.transitions) else 1
+
+
+def add_arguments(parser):
+    parser.prog = "stbt latency"
+    parser.description = """Press a sequence of keys repeatedly using
+        `stbt.press_and_wait`, recording the duration of each transition and
+        reporting latency percentiles."""
+    parser.add_argument(
+        "--script", metavar="FILE",
+        help="Read the keys to press from FILE: One key per line; blank lines "
+             "and lines starting with '#' are ignored.")
+    parser.add_argument(
+        "-n", "--repeat", type=int, default=100,
+        help="Number of times to press the sequence of keys "
+             "(default: %(default)s)")
+    parser.add_argument(
+        "--mask",
+        help="Mask PNG filename, or a region in the format "
+             "'x,y,width,height', that specifies which parts of the frame to "
+             "analyse")
+    parser.add_argument(
+        "--timeout-secs", type=float, default=10,
+        help="See the stbt.press_and_wait documentation "
+             "(default: %(default)s)")
+    parser.add_argument(
+        "--stable-secs", type=float, default=1,
+        help="See the stbt.press_and_wait documentation "
+             "(default: %(default)s)")
+    parser.add_argument(
+        "--min-size", type=parse_size, metavar="WIDTHxHEIGHT",
+        help="See the stbt.press_and_wait documentation")
+    parser.add_argument(
+        "-o", "--output", metavar="FILE",
+        help="Write the result of every keypress to FILE as it happens")
+    parser.add_argument(
+        "--format", choices=["csv", "jsonl"],
+        help="Format of the --output file (default: guessed from the file "
+             "extension; csv if unknown)")
+    parser.add_argument(
+        "--percentiles", type=parse_percentiles, default=(50, 95, 99),
+        metavar="P1,P2,...",
+        help="Percentiles to report (default: 50,95,99)")
+    parser.add_argument(
+        "--interpolate", action="store_true",
+        help="Estimate the start and end of each animation with sub-frame "
+             "precision (the mid-point between frames) when calculating "
+             "percentiles")
+    parser.add_argument(
+        "keys", nargs="*", metavar="KEY",
+        help="The keys to press, in order")
+
+
+def run(analyzer, keys, repeat, writer, dut, percentiles=(50, 95, 99),
+        interpolate=False, progress=sys.stderr):
+    """Press ``keys`` ``repeat`` times, writing each `Transition` to
+    ``writer`` and the running percentiles to ``progress``."""
+    for iteration in range(repeat):
+        for key in keys:
+            transition = analyzer.press_and_wait(key, _dut=dut)
+            writer(transition_to_row(iteration, transition))
+            if progress is not None:
+                summary = analyzer.percentiles(percentiles,
+                                               interpolate=interpolate)
+                progress.write("\r" + format_percentiles(analyzer, summary))
+                progress.flush()
+    if progress is not None:
+        progress.write("\n")
+
+
+def transition_to_row(iteration, transition):
+    return {
+        "iteration": iteration,
+        "key": transition.key,
+        "status": transition.status.name,
+        "press_time": transition.press_time,
+        "animation_start_time": transition.animation_start_time,
+        "end_time": transition.end_time,
+        "duration": transition.duration,
+        "animation_duration": transition.animation_duration,
+    }
+
+
+def format_percentiles(analyzer, percentiles):
+    failed = sum(1 for t in analyzer.transitions if not t)
+    return "n=%d failed=%d %s" % (
+        len(analyzer.transitions), failed,
+        " ".join("p%g=%.3fs" % (p, v) for p, v in percentiles.items()))
+
+
+@contextmanager
+def open_writer(filename, format_=None):
+    """Yields a function that writes one row to ``filename`` (or does nothing
+    if ``filename`` is None), flushing after every row so that the results are
+    available even if the run is interrupted."""
+    if filename is None:
+        yield lambda row: None
+        return
+    if format_ is None:
+        ext = os.path.splitext(filename)[1].lower()
+        format_ = "jsonl" if ext in (".jsonl", ".json") else "csv"
+
+    with open(filename, "w", encoding="utf-8", newline="") as f:
+        if format_ == "jsonl":
+            def write(row):
+                f.write(json.dumps(row) + "\n")
+                f.flush()
+        else:
+            csvwriter = csv.DictWriter(f, FIELDS)
+            csvwriter.writeheader()
+
+            def write(row):
+                csvwriter.writerow(row)
+                f.flush()
+        yield write
+
+
+def read_key_script(filename):
+    with open(filename, encoding="utf-8") as f:
+        return [line.strip() for line in f
+                if line.strip() and not line.strip().startswith("#")]
+
+
+def parse_mask(s):
+    if s is None:
+        return Region.ALL
+    m = re.match(r"^\s*(\d+),\s*(\d+),\s*(\d+),\s*(\d+)\s*$", s)
+    if m:
+        x, y, width, height = (int(n) for n in m.groups())
+        return Region(x, y, width=width, height=height)
+    return s
+
+
+def parse_size(s):
+    try:
+        width, height = s.lower().split("x")
+        return (int(width), int(height))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            "Invalid size %r: expected WIDTHxHEIGHT" % s)
+
+
+def parse_percentiles(s):
+    try:
+        return tuple(float(p) for p in s.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError("Invalid percentiles %r" % s)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,36 @@
+#!/usr/bin/python3
+
+"""Measures the latency of `RedRatHttpControl.press` (which uses the same HTTP
+session handling as `RokuHttpControl`) against a local stub HTTP server, with
+and without reusing the HTTP connection between key-presses."""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                "..")))
+from _stbt.control import _http_session, RedRatHttpControl
+from tests.test_http_control import stub_http_server
+sys.path.pop(0)
+
+
+def main():
+    print("connection,min,avg,max")
+    with stub_http_server() as server:
+        control = RedRatHttpControl(
+            "http://127.0.0.1:%d/api/redrats/1/1" % server.server_address[1])
+
+        def reconnect_every_time():
+            control._session = _http_session()
+            control.press("KEY_OK")
+
+        for name, f in [("reconnect", reconnect_every_time),
+                        ("keep-alive", lambda: control.press("KEY_OK"))]:
+            times = timeit.repeat(f, number=1, repeat=1000)
+            print("%s,%f,%f,%f" % (name, min(times), sum(times) / len(times),
+                                   max(times)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+#!/usr/bin/python3
+
+"""Measures the latency of `LircControl.press` against tests/fake-lircd, with
+and without reusing the connection to lircd between key-presses."""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                "..")))
+from _stbt.control import uri_to_control
+from tests.test_lirc_control import fake_lircd_process
+sys.path.pop(0)
+
+
+def main():
+    print("connection,min,avg,max")
+    with fake_lircd_process() as lircd:
+        control = uri_to_control("lirc:%s:test" % lircd.socket)
+
+        def reconnect_every_time():
+            control.close()
+            control.press("KEY_OK")
+
+        for name, f in [("reconnect", reconnect_every_time),
+                        ("persistent", lambda: control.press("KEY_OK"))]:
+            times = timeit.repeat(f, number=1, repeat=1000)
+            print("%s,%f,%f,%f" % (name, min(times), sum(times) / len(times),
+                                   max(times)))
+
+
+if __name__ == "__main__":
+    main()
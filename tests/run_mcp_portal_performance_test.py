@@ -0,0 +1,126 @@
+#!/usr/bin/python3
+
+"""Measures the latency of the MCP server's `PortalClient` against a local
+stub HTTP server that mimics the Portal's /api/v2, compared to making a new
+connection for every request with `urllib` (as the client used to).
+
+Requires the MCP SDK (``pip install mcp``).
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import timeit
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                "..", "mcp_server")))
+# pylint:disable=wrong-import-position
+from stb_tester_server import PortalClient
+sys.path.pop(0)
+
+NODES = [{"node_id": "stb-tester-%012x" % i} for i in range(20)]
+SCREENSHOT = b"\x89PNG\r\n\x1a\n" + b"\0" * 2000000
+
+
+class StubPortal(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    # Stand-in for the TCP & TLS handshakes with a real Portal over the
+    # internet, which is what connection reuse saves.
+    CONNECT_LATENCY_SECS = 0.02
+
+    def setup(self):
+        time.sleep(self.CONNECT_LATENCY_SECS)
+        super().setup()
+
+    def do_GET(self):  # pylint:disable=invalid-name
+        self.server.requests += 1
+        if self.path == "/api/v2/nodes":
+            self._reply(json.dumps(NODES).encode(), "application/json")
+        elif self.path.endswith("/screenshot.png"):
+            # The Portal has to capture the frame, which takes a while:
+            time.sleep(0.05)
+            self._reply(SCREENSHOT, "image/png")
+        elif self.path.startswith("/api/v2/nodes/"):
+            self._reply(json.dumps({"node_id": self.path.split("/")[4]})
+                        .encode(), "application/json")
+        else:
+            self._reply(json.dumps({"status": "running"}).encode(),
+                        "application/json")
+
+    def do_POST(self):  # pylint:disable=invalid-name
+        self.server.requests += 1
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _reply(self, body, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint:disable=arguments-differ
+        pass
+
+
+def urllib_request(base_url, method, endpoint, data=None):
+    request = urllib.request.Request(
+        "%s/api/v2%s" % (base_url, endpoint),
+        data=json.dumps(data).encode() if data else None,
+        headers={"Authorization": "token x",
+                 "Content-Type": "application/json"},
+        method=method)
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return response.read()
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubPortal)
+    server.daemon_threads = True
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = "http://127.0.0.1:%d" % server.server_address[1]
+    node = NODES[0]["node_id"]
+
+    client = PortalClient(base_url, "x", cache_ttl_secs=10)
+    print("operation,client,requests,min,avg,max")
+    for name, old, new in [
+            ("press",
+             lambda: urllib_request(base_url, "POST", "/nodes/%s/press" % node,
+                                    {"key": "KEY_OK"}),
+             lambda: client.press_key(node, "KEY_OK")),
+            ("list+connect",
+             lambda: (urllib_request(base_url, "GET", "/nodes"),
+                      urllib_request(base_url, "GET", "/nodes/%s" % node)),
+             lambda: (client.list_nodes(), client.get_node(node))),
+    ]:
+        for client_name, f in [("urllib", old), ("PortalClient", new)]:
+            server.requests = 0
+            times = timeit.repeat(f, number=1, repeat=50)
+            print("%s,%s,%d,%f,%f,%f" % (
+                name, client_name, server.requests, min(times),
+                sum(times) / len(times), max(times)))
+
+    # 8 tool calls asking for the same device's screenshot at the same time:
+    with ThreadPoolExecutor(8) as pool:
+        for client_name, f in [
+                ("urllib", lambda _: urllib_request(
+                    base_url, "GET", "/nodes/%s/screenshot.png" % node)),
+                ("PortalClient", lambda _: client.get_screenshot(node))]:
+            server.requests = 0
+            start = time.time()
+            list(pool.map(f, range(8)))
+            print("8 concurrent screenshots,%s,%d,%f,%f,%f" % (
+                client_name, server.requests, 0, time.time() - start, 0))
+
+
+if __name__ == "__main__":
+    main()
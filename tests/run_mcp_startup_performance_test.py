@@ -0,0 +1,84 @@
+#!/usr/bin/python3
+
+"""Measures how long the MCP server takes to start (from launching the
+process until it has answered ``initialize`` and ``tools/list``), with and
+without the Portal configured, and how long the first local tool call takes
+after that. For comparison it also measures ``import stbt_core``, which the
+server no longer does at startup when the Portal is configured.
+
+Requires the MCP SDK (``pip install mcp``).
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SERVER = os.path.join(ROOT, "mcp_server", "stb_tester_server.py")
+
+
+async def start_server(env, first_tool=None):
+    """Returns (secs until initialized & listed tools, secs for
+    `first_tool`)."""
+    params = StdioServerParameters(
+        command=sys.executable, args=[SERVER],
+        env=dict(os.environ, PYTHONPATH=os.pathsep.join(
+            [ROOT] + os.environ.get("PYTHONPATH", "").split(os.pathsep)),
+            **env))
+    start = time.perf_counter()
+    with open(os.devnull, "w", encoding="utf-8") as devnull:
+        async with stdio_client(params, errlog=devnull) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                await session.list_tools()
+                startup = time.perf_counter() - start
+                first_call = None
+                if first_tool:
+                    start = time.perf_counter()
+                    await session.call_tool(*first_tool)
+                    first_call = time.perf_counter() - start
+    return startup, first_call
+
+
+def import_stbt_core():
+    start = time.perf_counter()
+    subprocess.check_call(
+        [sys.executable, "-c", "import stbt_core"], cwd=ROOT,
+        stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def report(name, times):
+    print("%s,%f,%f,%f" % (name, min(times), sum(times) / len(times),
+                           max(times)))
+
+
+def main(repeat=10):
+    portal = {"STBT_PORTAL_URL": "http://127.0.0.1:9",
+              "STBT_PORTAL_TOKEN": "x"}
+    local = {"STBT_PORTAL_URL": "", "STBT_PORTAL_TOKEN": ""}
+    get_config = ("stb_get_config", {"section": "global", "key": "transformation_pipeline"})
+
+    print("measurement,min,avg,max")
+    report("python -c 'import stbt_core'",
+           [import_stbt_core() for _ in range(repeat)])
+    report("startup (portal)",
+           [asyncio.run(start_server(portal))[0] for _ in range(repeat)])
+    portal_results = [asyncio.run(start_server(portal, get_config))
+                      for _ in range(repeat)]
+    report("first local tool call (portal)",
+           [first for _, first in portal_results])
+    local_results = [asyncio.run(start_server(local, get_config))
+                     for _ in range(repeat)]
+    report("startup (local)", [startup for startup, _ in local_results])
+    report("first local tool call (local)",
+           [first for _, first in local_results])
+
+
+if __name__ == "__main__":
+    main()
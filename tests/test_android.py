@@ -1,14 +1,21 @@
+import io
 import os
+import struct
 from textwrap import dedent
+from unittest import mock
 
 import cv2
+import numpy
 import pytest
 from numpy import isclose
 
 from stbt_core import match, Region
-from _stbt.android import (_centre_point, _Dimensions,
-                           _parse_display_dimensions, _resize,
-                           _to_native_coordinates, AdbDevice, CoordinateSystem)
+from _stbt.android import (_centre_point, _Dimensions, _exec_out_unsupported,
+                           _parse_display_dimensions, _parse_raw_screencap,
+                           _read_raw_screencap, _resize,
+                           _to_native_coordinates, AdbDevice, AdbError,
+                           CoordinateSystem)
+from _stbt.core import DeviceUnderTest, NoSinkPipeline
 
 
 @pytest.mark.parametrize("r", [
@@ -133,5 +140,269 @@ def test_adbdevice_default_constructor():
     assert adb.coordinate_system == CoordinateSystem.HDMI_720P
 
 
+def test_adbdevice_press_sequence():
+    adb = AdbDevice()
+    with mock.patch.object(adb, "adb") as m:
+        adb.press_sequence(["KEY_UP", "KEYCODE_DPAD_DOWN"])
+        assert m.call_args[0][0] == [
+            "shell", "input", "keyevent", "KEYCODE_DPAD_UP",
+            "KEYCODE_DPAD_DOWN"]
+
+        adb.press_sequence(["KEY_UP", "KEY_OK"], interpress_delay_secs=0.3)
+        assert m.call_args[0][0] == [
+            "shell",
+            "input keyevent KEYCODE_DPAD_UP && sleep 0.3 && "
+            "input keyevent KEYCODE_ENTER"]
+
+        m.reset_mock()
+        with pytest.raises(ValueError):
+            adb.press_sequence(["KEY_UP", "KEY_FLOOBLE"])
+        assert not m.called
+
+
 def _find_file(path, root=os.path.dirname(os.path.abspath(__file__))):
     return os.path.join(root, path)
+
+
+def _fake_adb_device(tmp_path, monkeypatch, **kwargs):
+    monkeypatch.setenv("FAKE_ADB_LOG", str(tmp_path / "input.log"))
+    return AdbDevice(adb_binary=_find_file("fake-adb"), address="fake-device",
+                     tcpip=False, coordinate_system=CoordinateSystem.ADB_NATIVE,
+                     **kwargs)
+
+
+def _press_tap_and_swipe(adb):
+    adb.press("KEY_OK")
+    adb.press("KEYCODE_BACK")
+    adb.press_sequence(["KEY_UP", "KEY_DOWN"])
+    adb.press_sequence(["KEY_LEFT", "KEY_RIGHT"], interpress_delay_secs=0.01)
+    adb.tap((100, 200))
+    adb.swipe((10, 20), (30, 40))
+
+
+@pytest.mark.parametrize("persistent_shell", [False, True])
+def test_adbdevice_persistent_shell_sends_same_commands(
+        persistent_shell, tmp_path, monkeypatch):
+    adb = _fake_adb_device(tmp_path, monkeypatch,
+                           persistent_shell=persistent_shell)
+    with adb:
+        _press_tap_and_swipe(adb)
+    with open(tmp_path / "input.log", encoding="utf-8") as f:
+        assert f.read() == dedent("""\
+            input keyevent KEYCODE_ENTER
+            input keyevent KEYCODE_BACK
+            input keyevent KEYCODE_DPAD_UP KEYCODE_DPAD_DOWN
+            input keyevent KEYCODE_DPAD_LEFT
+            input keyevent KEYCODE_DPAD_RIGHT
+            input tap 100 200
+            input swipe 10 20 30 40
+            """)
+
+
+def test_adbdevice_persistent_shell_reconnects(tmp_path, monkeypatch):
+    adb = _fake_adb_device(tmp_path, monkeypatch, persistent_shell=True)
+    adb.press("KEY_OK")
+    process = adb._shell_session._process
+    adb.press("KEY_OK")
+    assert adb._shell_session._process is process
+
+    process.kill()
+    process.wait()
+    adb.press("KEY_BACK")
+    assert adb._shell_session._process is not process
+    with open(tmp_path / "input.log", encoding="utf-8") as f:
+        assert f.read().splitlines() == [
+            "input keyevent KEYCODE_ENTER",
+            "input keyevent KEYCODE_ENTER",
+            "input keyevent KEYCODE_BACK",
+        ]
+
+    process = adb._shell_session._process
+    adb.close()
+    assert process.poll() is not None
+    assert adb._shell_session._process is None
+
+
+def test_device_under_test_closes_adb_shell(tmp_path, monkeypatch):
+    adb = _fake_adb_device(tmp_path, monkeypatch, persistent_shell=True)
+    with DeviceUnderTest(control=adb,
+                         sink_pipeline=NoSinkPipeline()) as dut:
+        dut.press("KEY_OK")
+        process = adb._shell_session._process
+        assert process.poll() is None
+    assert process.poll() is not None
+
+
+def _raw_screencap(bgr, pixel_format=1, colorspace=True):
+    """Encode ``bgr`` like the output of ``screencap`` without ``-p``."""
+    h, w = bgr.shape[:2]
+    if pixel_format == 5:
+        pixels = cv2.cvtColor(bgr, cv2.COLOR_BGR2BGRA)
+    elif pixel_format == 3:
+        pixels = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+    else:
+        pixels = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGBA)
+    header = struct.pack("<III", w, h, pixel_format)
+    if colorspace:
+        header += struct.pack("<I", 1)
+    return header + pixels.tobytes()
+
+
+@pytest.mark.parametrize("pixel_format", [1, 3, 5])
+@pytest.mark.parametrize("colorspace", [False, True])
+def test_parse_raw_screencap(pixel_format, colorspace):
+    bgr = cv2.imread(_find_file("images/android/resize/source-1080p-"
+                                "landscape.png"))
+    img, header_size = _parse_raw_screencap(
+        _raw_screencap(bgr, pixel_format, colorspace))
+    assert header_size == (16 if colorspace else 12)
+    assert numpy.array_equal(img, bgr)
+
+    # Truncated:
+    assert _parse_raw_screencap(
+        _raw_screencap(bgr, pixel_format, colorspace)[:-10]) == (None, None)
+
+    stream = io.BytesIO(_raw_screencap(bgr, pixel_format, colorspace) * 2)
+    for _ in range(2):
+        assert numpy.array_equal(
+            _read_raw_screencap(stream, header_size), bgr)
+    assert _read_raw_screencap(stream, header_size) is None
+
+
+def test_parse_raw_screencap_unsupported_format():
+    with pytest.raises(ValueError):
+        _parse_raw_screencap(struct.pack("<IIII", 2, 2, 4, 0) + b"\0" * 8)
+
+
+def test_exec_out_unsupported():
+    def sdk(version):
+        return lambda: version
+
+    def no_sdk():
+        assert False, "Shouldn't ask for the SDK version"
+
+    assert _exec_out_unsupported(b"adb: unknown command exec-out\n", no_sdk)
+    assert _exec_out_unsupported(b"error: closed\n", sdk(19))
+    assert not _exec_out_unsupported(b"error: closed\n", sdk(34))
+    assert not _exec_out_unsupported(b"error: closed\n", sdk(None))
+    assert not _exec_out_unsupported(b"error: device offline\n", no_sdk)
+    assert not _exec_out_unsupported(b"", no_sdk)
+    assert not _exec_out_unsupported(None, no_sdk)
+
+
+def test_adbdevice_get_frame_and_frames(tmp_path, monkeypatch):
+    bgr = cv2.imread(_find_file("images/android/resize/source-1080p-"
+                                "landscape.png"))
+    (tmp_path / "screencap.raw").write_bytes(_raw_screencap(bgr))
+    monkeypatch.setenv("FAKE_ADB_SCREENCAP", str(tmp_path / "screencap.raw"))
+    monkeypatch.setenv("FAKE_ADB_SCREENCAP_PNG", _find_file(
+        "images/android/resize/source-1080p-landscape.png"))
+    adb = _fake_adb_device(tmp_path, monkeypatch)
+
+    assert numpy.array_equal(adb.get_frame(), bgr)
+    assert adb._raw_screencap
+
+    frames = adb.frames()
+    for _, frame in zip(range(3), frames):
+        assert numpy.array_equal(frame, bgr)
+    frames.close()
+
+    # A failed screencap (for example a dropped connection) is retried, and
+    # doesn't stop us from using raw screencap afterwards:
+    monkeypatch.setenv("FAKE_ADB_SCREENCAP", str(tmp_path / "missing.raw"))
+    with pytest.raises(AdbError):
+        adb.get_frame()
+    assert adb._raw_screencap
+    monkeypatch.setenv("FAKE_ADB_SCREENCAP", str(tmp_path / "screencap.raw"))
+    assert numpy.array_equal(adb.get_frame(), bgr)
+
+    # adb says "error: closed" when the connection drops, too:
+    monkeypatch.setenv("FAKE_ADB_EXEC_OUT_ERROR", "error: closed")
+    with pytest.raises(AdbError):
+        adb.get_frame()
+    assert adb._raw_screencap
+    monkeypatch.delenv("FAKE_ADB_EXEC_OUT_ERROR")
+    assert numpy.array_equal(adb.get_frame(), bgr)
+    assert adb._raw_screencap
+
+    # Falls back to PNG for pixel formats that we don't understand:
+    (tmp_path / "screencap.raw").write_bytes(
+        struct.pack("<IIII", 2, 2, 4, 0) + b"\0" * 8)
+    assert numpy.array_equal(adb.get_frame(), bgr)
+    assert not adb._raw_screencap
+
+
+def test_adbdevice_falls_back_to_png_on_old_android(tmp_path, monkeypatch):
+    bgr = cv2.imread(_find_file("images/android/resize/source-1080p-"
+                                "landscape.png"))
+    monkeypatch.setenv("FAKE_ADB_SCREENCAP_PNG", _find_file(
+        "images/android/resize/source-1080p-landscape.png"))
+    monkeypatch.setenv("FAKE_ADB_EXEC_OUT_ERROR", "error: closed")
+    monkeypatch.setenv("FAKE_ADB_SDK_VERSION", "19")
+    adb = _fake_adb_device(tmp_path, monkeypatch)
+    assert numpy.array_equal(adb.get_frame(), bgr)
+    assert not adb._raw_screencap
+
+
+def test_adbdevice_caches_display_dimensions(tmp_path, monkeypatch):
+    bgr = cv2.imread(_find_file("images/android/resize/source-1080p-"
+                                "landscape.png"))
+    (tmp_path / "screencap.raw").write_bytes(_raw_screencap(bgr))
+    monkeypatch.setenv("FAKE_ADB_SCREENCAP", str(tmp_path / "screencap.raw"))
+    adb = _fake_adb_device(tmp_path, monkeypatch)
+    adb.coordinate_system = CoordinateSystem.ADB_720P
+
+    with mock.patch.object(adb, "_get_display_dimensions",
+                           return_value=_Dimensions(1920, 1080)) as m:
+        adb.tap((640, 360))
+        adb.swipe((0, 0), (1280, 720))
+        assert m.call_count == 1
+
+        # Screenshot is the same size: Still cached.
+        adb.get_frame()
+        adb.tap((640, 360))
+        assert m.call_count == 1
+
+        # Screenshot is a different size (the device has been rotated):
+        (tmp_path / "screencap.raw").write_bytes(
+            _raw_screencap(numpy.rot90(bgr).copy()))
+        adb.get_frame()
+        m.return_value = _Dimensions(1080, 1920)
+        adb.tap((360, 640))
+        assert m.call_count == 2
+
+        adb.refresh_display_dimensions()
+        assert m.call_count == 3
+
+    with open(tmp_path / "input.log", encoding="utf-8") as f:
+        assert f.read().splitlines() == [
+            "input tap 960 540",
+            "input swipe 0 0 1920 1080",
+            "input tap 960 540",
+            "input tap 540 960",
+        ]
+
+
+def test_adbdevice_batch(tmp_path, monkeypatch):
+    adb = _fake_adb_device(tmp_path, monkeypatch)
+    with mock.patch.object(adb, "adb", wraps=adb.adb) as m:
+        with adb.batch():
+            adb.tap((100, 200))
+            with adb.batch():
+                adb.swipe((10, 20), (30, 40))
+            adb.press("KEY_OK")
+            assert not m.called
+        assert m.call_count == 1
+
+        with pytest.raises(ZeroDivisionError):
+            with adb.batch():
+                adb.tap((1, 1))
+                1 / 0  # pylint:disable=pointless-statement
+        assert m.call_count == 1
+
+    with open(tmp_path / "input.log", encoding="utf-8") as f:
+        assert f.read().splitlines() == [
+            "input tap 100 200",
+            "input swipe 10 20 30 40",
+            "input keyevent KEYCODE_ENTER",
+        ]
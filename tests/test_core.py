@@ -322,6 +322,32 @@ def test_is_screen_black(frame, mask, threshold, expected):
     assert expected == bool(stbt.is_screen_black(frame, mask, threshold))
 
 
+@pytest.mark.parametrize("mask", [
+    stbt.Region.ALL,
+    stbt.Region(x=100, y=50, right=400, bottom=300),
+    stbt.Region.ALL - stbt.Region(x=0, y=0, right=640, bottom=40),
+    "mask-out-left-half-720p.png",
+])
+def test_is_screen_black_sampling_is_exact(mask):
+    # is_screen_black checks a sparse lattice of pixels first; make sure a
+    # single non-black pixel that isn't on the lattice is still found.
+    mask_pixels, region = stbt.load_mask(mask).to_array(
+        stbt.Region(0, 0, 1280, 720))
+
+    def is_black(frame, threshold):
+        gray = cv2.cvtColor(stbt.crop(frame, region), cv2.COLOR_BGR2GRAY)
+        if mask_pixels is not None:
+            gray &= mask_pixels[:, :, 0]
+        return gray.max() <= threshold
+
+    for x, y in [(641, 361), (1279, 719), (645, 45), (101, 51), (5, 5)]:
+        frame = numpy.zeros((720, 1280, 3), dtype=numpy.uint8)
+        frame[y, x] = (0, 21, 0)  # Gray value 12
+        for threshold in [11, 12]:
+            assert stbt.is_screen_black(frame, mask, threshold).black == \
+                is_black(frame, threshold)
+
+
 def test_is_screen_black_result():
     frame = stbt.load_image("almost-black.png")
     result = stbt.is_screen_black(frame)
@@ -1,8 +1,10 @@
 import numpy
+import pytest
 
 import stbt_core as stbt
 from _stbt import diff, libstbt
-from _stbt.imgutils import crop
+from _stbt.imgutils import crop, _image_region
+from _stbt.mask import _to_array
 from _stbt.motion import DetectMotion
 
 # Note: BGRDiff is also tested by `test_press_and_wait*`.
@@ -21,6 +23,32 @@ def test_bgrdiff():
     assert result.region == stbt.Region(x=87, y=145, right=129, bottom=161)
 
 
+@pytest.mark.parametrize("differ", [stbt.BGRDiff(), stbt.GrayscaleDiff()])
+def test_diff_with_region_mask_fast_path(differ):
+    # A mask made of Regions is processed one rectangle at a time instead of
+    # being ANDed with a pixel-mask. The result must be the same.
+    frame1 = stbt.load_image("images/diff/xfinity-search-keyboard-1.png")
+    frame2 = stbt.load_image("images/diff/xfinity-search-keyboard-2.png")
+    frame2 = frame2.copy()
+    frame2[10:20, 10:20] = 255 - frame2[10:20, 10:20]
+
+    def pixel_mask(m):
+        return _to_array(stbt.load_mask(m), _image_region(frame1))
+
+    for m in [
+        stbt.Region.ALL - stbt.Region(x=87, y=145, right=129, bottom=161),
+        stbt.Region.ALL - stbt.Region(x=0, y=0, right=50, bottom=50),
+        stbt.Region(0, 0, 50, 50) + stbt.Region(80, 140, 60, 30),
+        ~stbt.Region(0, 0, 50, 50) - stbt.Region(80, 140, 60, 30),
+    ]:
+        fast = DetectMotion(differ, frame1, m)
+        slow = DetectMotion(differ, frame1, pixel_mask(m))
+        assert fast.mask_tuple[2] is not None
+        assert slow.mask_tuple[2] is None
+        fast, slow = fast.diff(frame2), slow.diff(frame2)
+        assert (fast.motion, fast.region) == (slow.motion, slow.region)
+
+
 def test_bgrdiff_c_equivalence():
     f = numpy.random.random_integers(0, 255, (720, 1280, 3)).astype(numpy.uint8)
 
@@ -0,0 +1,120 @@
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+import urllib3.util.connection
+
+from _stbt.control import RedRatHttpControl, RokuHttpControl
+
+# pylint:disable=redefined-outer-name
+
+
+@contextmanager
+def stub_http_server():
+    """A local HTTP/1.1 server that replies 200 to every POST, except that it
+    hangs up without replying if the path contains "hangup". Yields the
+    server; ``server.connections`` counts the TCP connections accepted and
+    ``server.paths`` lists the paths of the requests received."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            self.server.connections += 1
+
+        def do_POST(self):  # pylint:disable=invalid-name
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self.server.paths.append(self.path)
+            if "hangup" in self.path:
+                self.close_connection = True
+                return
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):  # pylint:disable=arguments-differ
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.connections = 0
+    server.paths = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_http_control_reuses_connection():
+    with stub_http_server() as server:
+        control = RedRatHttpControl(
+            "http://127.0.0.1:%d/api/redrats/1/1" % server.server_address[1])
+        for _ in range(5):
+            control.press("KEY_OK")
+        assert server.connections == 1
+
+
+@pytest.fixture()
+def roku_server(monkeypatch):
+    """Redirects connections to port 8060 (the Roku's) to a stub server.
+    ``server.connect_attempts`` counts the attempts to connect; the first
+    ``server.refuse_connections`` attempts are refused."""
+    create_connection = urllib3.util.connection.create_connection
+
+    with stub_http_server() as server:
+        server.connect_attempts = 0
+        server.refuse_connections = 0
+
+        def fake_create_connection(address, *args, **kwargs):
+            assert address[1] == 8060
+            server.connect_attempts += 1
+            if server.connect_attempts <= server.refuse_connections:
+                raise ConnectionRefusedError()
+            return create_connection(server.server_address, *args, **kwargs)
+
+        monkeypatch.setattr(urllib3.util.connection, "create_connection",
+                            fake_create_connection)
+        yield server
+
+
+def test_roku_http_control_reuses_connection(roku_server):
+    control = RokuHttpControl("roku.example")
+    for _ in range(3):
+        control.press("KEY_OK")
+    control.keydown("KEY_RIGHT")
+    control.keyup("KEY_RIGHT")
+    assert roku_server.paths == [
+        "/keypress/Select", "/keypress/Select", "/keypress/Select",
+        "/keydown/Right", "/keyup/Right"]
+    assert roku_server.connect_attempts == 1
+    assert roku_server.connections == 1
+
+
+def test_roku_http_control_retries_connecting(roku_server):
+    roku_server.refuse_connections = 2
+    control = RokuHttpControl("roku.example", retries=2)
+    control.press("KEY_OK")
+    assert roku_server.connect_attempts == 3
+    assert roku_server.paths == ["/keypress/Select"]
+
+    roku_server.connect_attempts = 0
+    roku_server.refuse_connections = 3
+    control = RokuHttpControl("roku.example", retries=2)
+    with pytest.raises(requests.ConnectionError):
+        control.press("KEY_OK")
+    assert roku_server.connect_attempts == 3
+
+
+def test_roku_http_control_doesnt_resend_keypress(roku_server):
+    # The Roku might have acted on the keypress before the connection
+    # failed, so we mustn't send it again:
+    control = RokuHttpControl("roku.example", retries=2)
+    with pytest.raises(requests.ConnectionError):
+        control.press("hangup")
+    assert roku_server.paths == ["/keypress/hangup"]
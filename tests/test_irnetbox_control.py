@@ -0,0 +1,67 @@
+import os
+import re
+import subprocess
+import sys
+import time
+from socket import SHUT_RDWR
+
+from _stbt.control import _IRNetBoxSession, uri_to_control
+from _stbt.utils import named_temporary_directory, scoped_process
+from _stbt.wait import wait_until
+
+
+def _find_file(path, root=os.path.dirname(os.path.abspath(__file__))):
+    return os.path.join(root, path)
+
+
+def test_irnetbox_control_reuses_connection(monkeypatch):
+    monkeypatch.setattr(_IRNetBoxSession, "idle_timeout_secs", 10)
+    with named_temporary_directory("stbt-fake-irnetbox-test") as tmpdir:
+        logfile = os.path.join(tmpdir, "fake-irnetbox.log")
+        with open(logfile, "w", encoding="utf-8") as log:
+            proc = subprocess.Popen(
+                [sys.executable, "-u", _find_file("fake-irnetbox")],
+                stdout=log, env=dict(os.environ, PYTHONPATH=_find_file("..")))
+
+        def read_log():
+            with open(logfile, encoding="utf-8") as f:
+                return f.read()
+
+        with scoped_process(proc):
+            wait_until(lambda: (
+                "PORT=" in read_log() or proc.poll() is not None))
+            port = re.search(r"^PORT=(\d+)$", read_log(), re.MULTILINE) \
+                .group(1)
+            control = uri_to_control("irnetbox:localhost:%s:1:%s" % (
+                port, _find_file("irnetbox.conf")))
+
+            control.press("MENU")
+            control.press("OK")
+            assert read_log().count("Received message DEVICE_VERSION") == 1
+            assert read_log().count("Received message OUTPUT_IR_ASYNC") == 2
+
+            # Connection closed behind our back: We reconnect.
+            control._session._irnb._socket.shutdown(SHUT_RDWR)
+            control.press("MENU")
+            assert read_log().count("Received message DEVICE_VERSION") == 2
+            assert read_log().count("Received message OUTPUT_IR_ASYNC") == 3
+
+            # Other outputs on the same irNetBox share the connection:
+            other_output = uri_to_control("irnetbox:localhost:%s:2:%s" % (
+                port, _find_file("irnetbox.conf")))
+            other_output.press("OK")
+            control.press("MENU")
+            assert read_log().count("Received message DEVICE_VERSION") == 2
+            assert read_log().count("Received message OUTPUT_IR_ASYNC") == 5
+
+            # The connection is closed when it has been idle for a while, so
+            # that other processes can use the irNetBox:
+            control._session.idle_timeout_secs = 0.1
+            control.press("OK")
+            time.sleep(0.5)
+            assert control._session._irnb is None
+            control.press("MENU")
+            assert read_log().count("Received message DEVICE_VERSION") == 3
+            assert read_log().count("Received message OUTPUT_IR_ASYNC") == 7
+
+            control.close()
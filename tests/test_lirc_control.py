@@ -1,12 +1,17 @@
 import os
+import re
+import socket
+from socket import SHUT_RDWR
 import subprocess
+import sys
 from collections import namedtuple
+from contextlib import contextmanager
 from textwrap import dedent
 
 import pytest
 
 from stbt_core import wait_until
-from _stbt.control import uri_to_control
+from _stbt.control import LircControl, uri_to_control
 from _stbt.utils import named_temporary_directory, scoped_process
 
 # pylint:disable=redefined-outer-name
@@ -30,6 +35,96 @@ def lircd():
             yield namedtuple("Lircd", "socket logfile")(socket, logfile)
 
 
+@contextmanager
+def fake_lircd_process():
+    """Runs tests/fake-lircd; yields the path to its socket and its log."""
+    with named_temporary_directory("stbt-fake-lircd-test") as tmpdir:
+        logfile = os.path.join(tmpdir, "fake-lircd.log")
+        with open(logfile, "w", encoding="utf-8") as log:
+            proc = subprocess.Popen(
+                [sys.executable, "-u", _find_file("fake-lircd")], stdout=log)
+        with scoped_process(proc):
+            def read_log():
+                with open(logfile, encoding="utf-8") as f:
+                    return f.read()
+            wait_until(lambda: (
+                "SOCKET=" in read_log() or proc.poll() is not None))
+            socket_path = re.search(r"^SOCKET=(.*)$", read_log(),
+                                    re.MULTILINE).group(1)
+            wait_until(lambda: os.path.exists(socket_path))
+            yield namedtuple("FakeLircd", "socket read_log")(
+                socket_path, read_log)
+
+
+@pytest.fixture(scope="function")
+def fake_lircd():
+    with fake_lircd_process() as f:
+        yield f
+
+
+def test_lirc_control_reuses_connection(fake_lircd):
+    control = uri_to_control("lirc:%s:test" % fake_lircd.socket)
+    connect = control._connect
+    connections = []
+
+    def counting_connect():
+        connections.append(connect())
+        return connections[-1]
+    control._connect = counting_connect
+
+    control.press("KEY_UP")
+    control.keydown("KEY_DOWN")
+    control.keyup("KEY_DOWN")
+    assert connections == []
+
+    # lircd replies with an error, but the connection is still usable:
+    with pytest.raises(RuntimeError, match="fake-lircd error"):
+        control.press("KEY_error")
+    control.press("button_that_causes_sighup_and_broadcast_and_ack")
+    assert connections == []
+
+    # Connection closed behind our back: We reconnect.
+    control._socket.shutdown(SHUT_RDWR)
+    control.press("KEY_LEFT")
+    assert len(connections) == 1
+
+    control.close()
+    control.press("KEY_RIGHT")
+    assert len(connections) == 2
+
+    log = fake_lircd.read_log()
+    for cmd in ["SEND_ONCE test KEY_UP", "SEND_START test KEY_DOWN",
+                "SEND_STOP test KEY_DOWN", "SEND_ONCE test KEY_LEFT",
+                "SEND_ONCE test KEY_RIGHT"]:
+        assert cmd in log
+
+
+def test_lirc_control_keeps_unread_broadcasts_for_next_press():
+    client, server = socket.socketpair()
+    client.settimeout(1)
+    control = LircControl("test", None, client)
+
+    # lircd sends a broadcast right after our reply, and we only receive
+    # the first half of it before the next press:
+    server.sendall(b"BEGIN\nSEND_ONCE test KEY_UP\nSUCCESS\nEND\n"
+                   b"BEGIN\nSIGHUP\n")
+    control.press("KEY_UP")
+    server.sendall(b"END\n"
+                   b"BEGIN\nSEND_ONCE test KEY_DOWN\nSUCCESS\nEND\n")
+    control.press("KEY_DOWN")
+
+    # A reply for a different command doesn't count:
+    server.sendall(b"BEGIN\nSEND_ONCE test KEY_UP\nERROR\nEND\n"
+                   b"BEGIN\nSEND_ONCE test KEY_LEFT\nSUCCESS\nEND\n")
+    control.press("KEY_LEFT")
+
+    assert server.recv(4096) == (b"SEND_ONCE test KEY_UP\n"
+                                 b"SEND_ONCE test KEY_DOWN\n"
+                                 b"SEND_ONCE test KEY_LEFT\n")
+    control.close()
+    server.close()
+
+
 @pytest.mark.parametrize("key", [b'KEY_OK', 'KEY_OK'])
 def test_press(lircd, key):
     logfile = open(lircd.logfile, encoding="utf-8")
@@ -7,7 +7,7 @@ import numpy
 import pytest
 
 from _stbt.imgutils import _image_region, load_image
-from _stbt.mask import Mask, _to_array
+from _stbt.mask import Mask, _regions_to_array, _to_array
 from _stbt.types import Region
 
 
@@ -326,6 +326,43 @@ def test_mask_to_array(m, frame_region, expect_array, expected_region):  # pylin
         assert bounding_box == expected_region
 
 
+@pytest.mark.parametrize("m", [
+    Mask(Region(2, 2, 2, 2)),
+    Mask(Region(2, 2, 20, 20)),
+    Mask(Region.ALL),
+    ~Region(2, 2, 2, 2),
+    Region(0, 0, 2, 2) + Region(2, 2, 2, 2),
+    Region(0, 0, 1, 1) + Region(3, 3, 1, 1),
+    Region(0, 0, 3, 2) + Region(3, 0, 3, 2),
+    Region.ALL - Region(0, 0, 6, 1),
+    ~Region(0, 0, 2, 2) - Region(1, 1, 2, 2),
+    ~(Region(0, 0, 2, 2) + Region(4, 2, 2, 2)) - Region(2, 1, 1, 1),
+])
+def test_mask_to_regions(m):
+    rects, bbox = m._to_regions(frame_region)
+    assert bbox == m.to_array(frame_region)[1]
+    array = numpy.zeros((4, 6, 1), dtype=numpy.uint8)
+    array[bbox.to_slice()] = _regions_to_array(rects, bbox)
+    assert numpy.array_equal(array, _to_array(m, frame_region))
+    # Non-overlapping:
+    assert sum(r.width * r.height for r in rects) == \
+        numpy.count_nonzero(array)
+
+
+def test_mask_to_regions_merges_rectangles():
+    assert (Region(0, 0, 3, 2) + Region(3, 0, 3, 2))._to_regions(
+        frame_region) == ((Region(0, 0, 6, 2),), Region(0, 0, 6, 2))
+    assert (Region.ALL - Region(0, 0, 6, 1))._to_regions(frame_region) == \
+        ((Region(0, 1, 6, 3),), Region(0, 1, 6, 3))
+    assert Mask("mask-out-left-half-720p.png")._to_regions(
+        Region(0, 0, 1280, 720)) is None
+    assert (Region(0, 0, 2, 2) + Mask(numpy.zeros((4, 6), dtype=numpy.uint8))
+            )._to_regions(frame_region) is None
+    with pytest.raises(ValueError,
+                       match=r".* doesn't overlap with the frame's Region"):
+        Mask(None)._to_regions(frame_region)
+
+
 def test_mask_shape_mismatch():
     with pytest.raises(ValueError,
                        match=(r"Mask\(.*\): shape \(720, 1280, 1\) doesn't "
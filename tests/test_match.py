@@ -1,7 +1,9 @@
 import os
 import random
 import re
+import threading
 import timeit
+import weakref
 
 import cv2
 import numpy
@@ -468,6 +470,61 @@ def test_that_build_pyramid_relaxes_mask():
     assert numpy.all(downsampled[:, :, 0] == expected)
 
 
+def test_that_frame_pyramid_is_reused_for_read_only_frames(monkeypatch):
+    from _stbt import match as match_module
+
+    built = []
+    original_build_pyramid = match_module._build_pyramid
+
+    def build_pyramid(image, levels, is_template=False, is_mask=False):
+        if not is_template and not is_mask:
+            built.append(image.shape)
+        return original_build_pyramid(image, levels, is_template, is_mask)
+
+    monkeypatch.setattr(match_module, "_build_pyramid", build_pyramid)
+    monkeypatch.setattr(match_module, "_frame_pyramid_cache",
+                        threading.local())
+
+    frame = stbt.load_image("action-panel.png").copy()
+    frame.flags.writeable = False
+    expected = [stbt.match("action-panel-blue-button.png", frame=frame.copy()),
+                stbt.match("videotestsrc-redblue.png", frame=frame.copy())]
+    assert len(built) == 2
+    del built[:]
+
+    # These reference images have different numbers of pyramid levels:
+    results = [stbt.match("action-panel-blue-button.png", frame=frame),
+               stbt.match("videotestsrc-redblue.png", frame=frame)]
+    assert len(built) == 1
+    assert [(r.match, r.region) for r in results] == \
+        [(r.match, r.region) for r in expected]
+
+    # The cache is per thread, so searching a different frame on another
+    # thread doesn't evict this thread's frame:
+    other_frame = stbt.load_image("buttons-on-blue-background.png").copy()
+    other_frame.flags.writeable = False
+    thread = threading.Thread(
+        target=stbt.match,
+        args=(stbt.load_image("action-panel-blue-button.png"),),
+        kwargs={"frame": other_frame})
+    thread.start()
+    thread.join()
+    assert built[1:] == [other_frame.shape]
+    stbt.match("action-panel-blue-button.png", frame=frame)
+    assert len(built) == 2
+
+    # A different region of the same frame:
+    stbt.match("action-panel-blue-button.png", frame=frame,
+               region=stbt.Region(640, 360, 640, 360))
+    assert len(built) == 3
+
+    # The cache doesn't keep the frame (or its pyramid) alive:
+    frame_ref = weakref.ref(frame)
+    del frame, results
+    assert frame_ref() is None
+    assert match_module._frame_pyramid_cache.pyramid.lower_levels == []
+
+
 def test_png_with_16_bits_per_channel():
     assert cv2.imread(_find_file("uint16.png"), cv2.IMREAD_UNCHANGED).dtype == \
         numpy.uint16  # Sanity check (that this test is valid)
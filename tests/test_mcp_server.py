@@ -0,0 +1,1083 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import types
+
+import pytest
+
+pytest.importorskip("mcp")
+
+# pylint:disable=wrong-import-position
+from mcp.server.lowlevel.server import request_ctx
+
+from mcp_server import stb_tester_server as mcp_server
+from _stbt.wait import wait_until
+
+
+class FakePortalClient():
+    """Returns the job statuses in ``statuses`` in turn, repeating the last
+    one forever."""
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.polls = 0
+
+    def get_job_status(self, job_id):
+        self.polls += 1
+        if len(self.statuses) > 1:
+            return dict(self.statuses.pop(0), job_id=job_id)
+        return dict(self.statuses[0], job_id=job_id)
+
+
+class FakeSession():
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.log_messages = []
+        self.progress = []
+
+    async def send_log_message(self, level, data, logger=None):
+        if self.fail:
+            raise ConnectionError("Client has gone away")
+        self.log_messages.append((level, data, logger))
+
+    async def send_progress_notification(self, token, progress, message=None,
+                                         **_):
+        self.progress.append((token, progress, message))
+
+
+RUNNING = {"status": "running"}
+FINISHED = {"status": "finished", "result": "pass"}
+ERROR = {"error": "HTTP 503: Service Unavailable"}
+
+
+@pytest.fixture(name="sleeps")
+def fixture_sleeps(monkeypatch):
+    """Records the intervals that `JobWatcher` sleeps for, without actually
+    sleeping."""
+    sleeps = []
+    real_sleep = asyncio.sleep
+
+    async def fake_sleep(delay, result=None):
+        sleeps.append(delay)
+        return await real_sleep(0, result)
+
+    monkeypatch.setattr(mcp_server.asyncio, "sleep", fake_sleep)
+    return sleeps
+
+
+def new_job_watcher(statuses, **kwargs):
+    kwargs.setdefault("min_interval", 1)
+    kwargs.setdefault("max_interval", 4)
+    kwargs.setdefault("backoff", 2)
+    return mcp_server.JobWatcher(FakePortalClient(statuses), **kwargs)
+
+
+def test_job_watcher_waits_for_job_to_finish(sleeps):
+    session, gone_away = FakeSession(), FakeSession(fail=True)
+    watcher = new_job_watcher(
+        [RUNNING] * 5 + [{"status": "uploading"}, FINISHED])
+    updates = []
+
+    async def on_update(job):
+        updates.append(job.state["status"])
+
+    async def test():
+        watcher.watch("job1", gone_away)
+        return await watcher.wait("job1", 60, session, on_update)
+
+    job = asyncio.run(test())
+    assert job.state == dict(FINISHED, job_id="job1")
+    assert job.task is None
+    assert watcher._client.polls == 7
+    # Backs off while the status isn't changing, and polls quickly again
+    # when it does change:
+    assert sleeps == [1, 2, 4, 4, 4, 1]
+    assert updates and updates[-1] == "finished"
+
+    assert session.log_messages == [
+        ("info", {"event": "job_finished", "job_id": "job1",
+                  "status": "finished", "result": "pass"},
+         "stb-tester.jobs")]
+
+
+def test_job_watcher_status_doesnt_poll_again():
+    watcher = new_job_watcher([RUNNING], min_interval=60)
+
+    async def test():
+        job = await watcher.status("job1")
+        assert job.state == dict(RUNNING, job_id="job1")
+        for _ in range(3):
+            assert await watcher.status("job1") is job
+        return watcher._client.polls
+
+    assert asyncio.run(test()) == 1
+
+
+def test_job_watcher_gives_up_after_max_errors(sleeps):
+    watcher = new_job_watcher([RUNNING] + [ERROR] * 10)
+
+    async def test():
+        return await watcher.wait("job1", 60)
+
+    job = asyncio.run(test())
+    assert job.task is None
+    assert job.state == dict(ERROR, job_id="job1")
+    assert watcher._client.polls == 1 + watcher.MAX_ERRORS
+    assert sleeps == [1, 2, 4, 4, 4]
+
+
+def test_job_watcher_recovers_from_transient_errors(sleeps):
+    watcher = new_job_watcher([RUNNING, ERROR, ERROR, RUNNING, FINISHED])
+
+    job = asyncio.run(watcher.wait("job1", 60))
+    assert job.state == dict(FINISHED, job_id="job1")
+    assert watcher._client.polls == 5
+    assert sleeps == [1, 2, 4, 4]
+
+
+def test_job_watcher_gives_up_at_once_if_first_poll_fails(sleeps):
+    watcher = new_job_watcher([ERROR])
+
+    job = asyncio.run(watcher.wait("job1", 60))
+    assert job.state == dict(ERROR, job_id="job1")
+    assert watcher._client.polls == 1
+    assert sleeps == []
+
+
+def test_job_watcher_wait_timeout():
+    watcher = new_job_watcher([RUNNING], min_interval=0.01,
+                              max_interval=0.01)
+
+    async def test():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        job = await watcher.wait("job1", 0.1)
+        return job, loop.time() - start
+
+    job, elapsed = asyncio.run(test())
+    assert job.state == dict(RUNNING, job_id="job1")
+    assert 0.09 <= elapsed < 1
+
+
+def test_job_watcher_forgets_finished_jobs():
+    watcher = new_job_watcher([RUNNING, FINISHED], min_interval=0,
+                              keep_secs=0.05)
+
+    async def test():
+        job = await watcher.wait("job1", 60)
+        assert watcher._jobs == {"job1": job}
+        # A finished job isn't polled again:
+        assert watcher.watch("job1") is job
+        assert job.task is None
+        await asyncio.sleep(0.2)
+        return job
+
+    asyncio.run(test())
+    assert watcher._jobs == {}
+    assert watcher._client.polls == 2
+
+
+def test_call_job_tool(monkeypatch, sleeps):  # pylint:disable=unused-argument
+    watcher = new_job_watcher([RUNNING, RUNNING, FINISHED])
+    monkeypatch.setattr(mcp_server, "job_watcher", watcher)
+    session = FakeSession()
+
+    async def call(name, arguments, progress_token=None):
+        token = request_ctx.set(types.SimpleNamespace(
+            session=session, request_id=1,
+            meta=types.SimpleNamespace(progressToken=progress_token)))
+        try:
+            result = await mcp_server._call_job_tool(name, arguments)
+        finally:
+            request_ctx.reset(token)
+        return json.loads(result[0].text)
+
+    async def test():
+        status = await call("stb_job_status", {"job_id": "job1"})
+        waited = await call("stb_wait_for_job",
+                            {"job_id": "job1", "timeout_secs": 60}, "tok")
+        return status, waited
+
+    status, waited = asyncio.run(test())
+    assert status["status"] == "running"
+    assert status["job_id"] == "job1"
+    assert "status_age_secs" in status
+    assert waited["status"] == "finished"
+    assert waited["finished"] is True
+    assert session.progress[-1] == ("tok", len(session.progress),
+                                    "Job job1: finished")
+    assert len(session.log_messages) == 1
+
+
+@pytest.fixture(name="mock_mode")
+def fixture_mock_mode(monkeypatch):
+    """Neither stbt_core nor the Portal is available."""
+    monkeypatch.setattr(mcp_server, "_stbt_available", lambda: False)
+    monkeypatch.setattr(mcp_server, "PORTAL_AVAILABLE", False)
+
+
+def run_steps(steps, device_id=None, stop_on_error=True, cancel=False):
+    cancel_event = mcp_server.threading.Event()
+    if cancel:
+        cancel_event.set()
+    result = mcp_server._run_steps(steps, device_id, stop_on_error,
+                                   cancel_event)
+    summary = json.loads(result[0].text)
+    assert [s["step"] for s in summary["steps"]] == list(
+        range(summary["completed"]))
+    return summary
+
+
+def test_run_steps(mock_mode):  # pylint:disable=unused-argument
+    summary = run_steps([
+        {"action": "press", "key": "KEY_MENU"},
+        {"action": "match", "image": "menu.png", "stop_if": "not_matched"},
+        {"action": "ocr", "expect": "mock ocr"},
+    ])
+    assert summary["completed"] == summary["total"] == 3
+    assert summary["stopped_at"] is None
+    assert summary["stop_reason"] is None
+    assert "device_id" not in summary
+    assert [s["action"] for s in summary["steps"]] == ["press", "match", "ocr"]
+    assert summary["steps"][0]["key"] == "KEY_MENU"
+    assert summary["steps"][1]["matched"] is True
+    assert summary["steps"][2]["matched"] is True
+    assert all("secs" in s for s in summary["steps"])
+
+
+@pytest.mark.parametrize("steps,stopped_at,stop_reason", [
+    ([{"action": "match", "image": "a.png", "stop_if": "matched"},
+      {"action": "press", "key": "KEY_OK"}],
+     0, "matched"),
+    ([{"action": "press", "key": "KEY_OK"},
+      {"action": "ocr", "expect": "Settings", "stop_if": "not_matched"},
+      {"action": "press", "key": "KEY_OK"}],
+     1, "not_matched"),
+    # stop_if doesn't stop if the condition isn't met:
+    ([{"action": "ocr", "expect": "Settings", "stop_if": "matched"},
+      {"action": "press", "key": "KEY_OK"}],
+     None, None),
+    ([{"action": "press", "key": "KEY_OK"},
+      {"action": "dance"},
+      {"action": "press", "key": "KEY_OK"}],
+     1, "error"),
+    # Missing "key":
+    ([{"action": "press"}, {"action": "press", "key": "KEY_OK"}],
+     0, "error"),
+])
+def test_run_steps_stops_early(mock_mode, steps, stopped_at, stop_reason):  # pylint:disable=unused-argument
+    summary = run_steps(steps)
+    assert summary["stopped_at"] == stopped_at
+    assert summary["stop_reason"] == stop_reason
+    assert summary["total"] == len(steps)
+    if stopped_at is None:
+        assert summary["completed"] == len(steps)
+    else:
+        assert summary["completed"] == stopped_at + 1
+
+
+def test_run_steps_without_stop_on_error(mock_mode):  # pylint:disable=unused-argument
+    summary = run_steps([{"action": "dance"},
+                         {"action": "press", "key": "KEY_OK"}],
+                        stop_on_error=False)
+    assert summary["completed"] == 2
+    assert summary["stop_reason"] is None
+    assert summary["steps"][0]["error"] == "Unknown action: 'dance'"
+    assert summary["steps"][1]["key"] == "KEY_OK"
+
+
+def test_run_steps_on_portal_device(mock_mode):  # pylint:disable=unused-argument
+    summary = run_steps([
+        {"action": "press", "key": "KEY_MENU"},
+        {"action": "screenshot"},
+        {"action": "wait_for_match", "image": "menu.png"},
+        {"action": "press", "key": "KEY_OK"},
+    ], device_id="stb-tester-00044b80ebeb")
+    assert summary["device_id"] == "stb-tester-00044b80ebeb"
+    assert summary["steps"][0] == {
+        "step": 0, "action": "press", "key": "KEY_MENU", "mode": "mock",
+        "secs": summary["steps"][0]["secs"]}
+    assert summary["stopped_at"] == 2
+    assert summary["stop_reason"] == "error"
+    assert "isn't supported on Portal devices" in \
+        summary["steps"][2]["error"]
+
+
+def test_run_steps_cancelled(mock_mode):  # pylint:disable=unused-argument
+    with pytest.raises(mcp_server.ToolCancelled):
+        run_steps([{"action": "press", "key": "KEY_OK"}], cancel=True)
+
+
+def test_submitted_job_id():
+    def text(response):
+        return [mcp_server.TextContent(type="text",
+                                       text=json.dumps(response))]
+
+    assert mcp_server._response_job_id({"job_uid": "/a/b/0001"}) == \
+        "/a/b/0001"
+    assert mcp_server._response_job_id({"job_id": "1184"}) == "1184"
+    assert mcp_server._response_job_id({"error": "HTTP 500"}) is None
+    assert mcp_server._response_job_id(["not", "a", "dict"]) is None
+    assert mcp_server._submitted_job_id(text({"job_id": "1184"})) == "1184"
+    assert mcp_server._submitted_job_id(text({"error": "HTTP 500"})) is None
+    assert mcp_server._submitted_job_id([]) is None
+
+
+def test_portal_frames_reuse_match_pyramid(monkeypatch):
+    import stbt_core as stbt
+    from _stbt import match as match_module
+    from tests.test_core import _find_file
+
+    built = []
+    original_build_pyramid = match_module._build_pyramid
+
+    def build_pyramid(image, levels, is_template=False, is_mask=False):
+        if not is_template and not is_mask:
+            built.append(image.shape)
+        return original_build_pyramid(image, levels, is_template, is_mask)
+
+    monkeypatch.setattr(match_module, "_build_pyramid", build_pyramid)
+    monkeypatch.setattr(match_module, "_frame_pyramid_cache",
+                        mcp_server.threading.local())
+
+    client = mcp_server.PortalClient("https://portal.example.com", "token",
+                                     frame_ttl_secs=60)
+    with open(_find_file("action-panel.png"), "rb") as f:
+        png = f.read()
+    monkeypatch.setattr(client, "get_screenshot",
+                        lambda node_id: (png, "image/png"))
+
+    frame = client.get_frame("stb-tester-00044b80ebeb")
+    assert client.get_frame("stb-tester-00044b80ebeb") is frame
+    assert not frame.flags.writeable
+    assert not frame.base.flags.writeable
+
+    results = [stbt.match(_find_file(image), frame=frame)
+               for image in ["action-panel-blue-button.png",
+                             "action-panel-template.png"]]
+    assert all(results)
+    assert len(built) == 1
+
+    # Pressing a key invalidates the cached frame:
+    monkeypatch.setattr(client, "_request", lambda *args: {})
+    client.press_key("stb-tester-00044b80ebeb", "KEY_OK")
+    assert client.get_frame("stb-tester-00044b80ebeb") is not frame
+
+
+def new_portal_client(monkeypatch, handler, base_url="https://portal.example.com", **kwargs):
+    """A `PortalClient` that sends its requests to ``handler`` (a function
+    from `httpx.Request` to `httpx.Response`) instead of the network."""
+    httpx_client = mcp_server.httpx.Client
+
+    def client(**client_kwargs):
+        return httpx_client(transport=mcp_server.httpx.MockTransport(handler), **client_kwargs)
+
+    monkeypatch.setattr(mcp_server.httpx, "Client", client)
+    return mcp_server.PortalClient(base_url, "token", **kwargs)
+
+
+NODES = [{"node_id": "stb-tester-1", "tags": ["roku"]},
+         {"node_id": "stb-tester-2", "tags": ["apple-tv"]}]
+
+
+def portal_handler(requests, responses=None):
+    """Records the paths requested in ``requests``; replies with
+    ``responses[path]``, or with details of the node, or with `NODES`."""
+    responses = responses or {}
+
+    def handler(request):
+        path = request.url.path
+        requests.append(path)
+        if path in responses:
+            return responses[path]
+        if path.startswith("/api/v2/nodes/"):
+            node_id = path.split("/")[-1]
+            return mcp_server.httpx.Response(200, json={"node_id": node_id, "details": True})
+        return mcp_server.httpx.Response(200, json={"nodes": NODES})
+    return handler
+
+
+def test_portal_client_follows_redirects(monkeypatch):
+    requests = []
+
+    def handler(request):
+        requests.append(str(request.url))
+        if request.url.scheme == "http":
+            return mcp_server.httpx.Response(
+                301, headers={"Location": str(request.url.copy_with(scheme="https"))})
+        if request.url.path.endswith(".png"):
+            return mcp_server.httpx.Response(200, content=b"PNG", headers={"Content-Type": "image/png"})
+        return mcp_server.httpx.Response(200, json={"nodes": NODES})
+
+    client = new_portal_client(monkeypatch, handler, base_url="http://portal.example.com")
+    assert client.list_nodes() == {"nodes": NODES}
+    assert client.get_screenshot("stb-tester-1") == (b"PNG", "image/png")
+    assert requests == [
+        "http://portal.example.com/api/v2/nodes",
+        "https://portal.example.com/api/v2/nodes",
+        "http://portal.example.com/api/v2/nodes/stb-tester-1/screenshot.png",
+        "https://portal.example.com/api/v2/nodes/stb-tester-1/screenshot.png",
+    ]
+
+
+def test_portal_client_caches_node_details(monkeypatch):
+    requests = []
+    unavailable = {"/api/v2/nodes/stb-tester-3": mcp_server.httpx.Response(503, text="Busy")}
+    client = new_portal_client(monkeypatch, portal_handler(requests, unavailable))
+
+    node = client.get_node("stb-tester-1")
+    assert node == {"node_id": "stb-tester-1", "details": True}
+    assert client.get_node("stb-tester-1") is node
+    assert requests == ["/api/v2/nodes/stb-tester-1"]
+
+    # Expired:
+    t, _ = client._cache["/nodes/stb-tester-1"]
+    client._cache["/nodes/stb-tester-1"] = (t - 10, node)
+    assert client.get_node("stb-tester-1") == node
+    assert requests == ["/api/v2/nodes/stb-tester-1"] * 2
+
+    # Invalidated:
+    client.invalidate_node("stb-tester-1")
+    client.get_node("stb-tester-1")
+    assert requests == ["/api/v2/nodes/stb-tester-1"] * 3
+
+    # Errors aren't cached:
+    assert client.get_node("stb-tester-3") == {"error": "HTTP 503: Busy"}
+    assert client.get_node("stb-tester-3") == {"error": "HTTP 503: Busy"}
+    assert requests[3:] == ["/api/v2/nodes/stb-tester-3"] * 2
+
+
+def test_portal_client_list_nodes_caches_each_node(monkeypatch):
+    requests = []
+    client = new_portal_client(monkeypatch, portal_handler(requests))
+
+    # A fresh entry from `get_node` is kept:
+    details = client.get_node("stb-tester-1")
+    assert client.list_nodes() == {"nodes": NODES}
+    assert client.get_node("stb-tester-1") is details
+    assert client.get_node("stb-tester-2") == NODES[1]
+    assert requests == ["/api/v2/nodes/stb-tester-1", "/api/v2/nodes"]
+
+    # Expired entries are replaced when we list the nodes again:
+    for endpoint, (t, response) in list(client._cache.items()):
+        client._cache[endpoint] = (t - 10, response)
+    client.list_nodes()
+    assert client.get_node("stb-tester-1") == NODES[0]
+    assert client.get_node("stb-tester-2") == NODES[1]
+    assert requests == ["/api/v2/nodes/stb-tester-1", "/api/v2/nodes", "/api/v2/nodes"]
+
+
+def test_portal_client_coalesces_requests_in_flight(monkeypatch):
+    client = mcp_server.PortalClient("https://portal.example.com", "token")
+    started = mcp_server.threading.Event()
+    release = mcp_server.threading.Event()
+    calls = []
+    waiting = []
+
+    class Future(mcp_server.Future):
+        def result(self, timeout=None):
+            waiting.append(self)
+            return super().result(timeout)
+
+    monkeypatch.setattr(mcp_server, "Future", Future)
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        assert release.wait(10)
+        return {"n": len(calls)}
+
+    def fail():
+        calls.append(1)
+        started.set()
+        assert release.wait(10)
+        raise ConnectionError("Portal has gone away")
+
+    for f, expected in [(fetch, {"n": 1}), (fail, ConnectionError)]:
+        calls.clear()
+        waiting.clear()
+        started.clear()
+        release.clear()
+        with mcp_server.ThreadPoolExecutor(max_workers=4) as executor:
+            first = executor.submit(client._coalesced, ("json", "/nodes"), f)
+            assert started.wait(10)
+            others = [executor.submit(client._coalesced, ("json", "/nodes"), f)
+                      for _ in range(2)]
+            different = executor.submit(client._coalesced, ("json", "/jobs/1"), lambda: "other")
+            assert different.result(10) == "other"
+            assert wait_until(lambda: len(waiting) == 2)
+            release.set()
+            for future in [first] + others:
+                if expected is ConnectionError:
+                    with pytest.raises(ConnectionError):
+                        future.result(10)
+                else:
+                    assert future.result(10) == expected
+        assert len(calls) == 1
+        assert client._in_flight == {}
+
+
+class FakeTools():
+    """Stands in for `_call_tool_sync`. Each call blocks until the test calls
+    `finish` for its ``id`` argument (or until it is cancelled)."""
+    def __init__(self):
+        self.lock = mcp_server.threading.Lock()
+        self.started = []
+        self.finished = []
+        self.running = {}
+        self.max_running = {}
+        self.threads = set()
+        self.cancel_events = {}
+        self._release = {}
+
+    def __call__(self, name, arguments, cancel_event):
+        id_ = arguments["id"]
+        device = arguments["device_id"]
+        with self.lock:
+            self.started.append(id_)
+            self.threads.add(mcp_server.threading.current_thread().name)
+            self.cancel_events[id_] = cancel_event
+            self.running[device] = self.running.get(device, 0) + 1
+            self.max_running[device] = max(self.max_running.get(device, 0),
+                                           self.running[device])
+            release = self._release.setdefault(id_, mcp_server.threading.Event())
+        try:
+            assert release.wait(10)
+            return [mcp_server.TextContent(type="text", text=id_)]
+        finally:
+            with self.lock:
+                self.running[device] -= 1
+                self.finished.append(id_)
+
+    def finish(self, id_):
+        with self.lock:
+            self._release.setdefault(id_, mcp_server.threading.Event()).set()
+
+
+@pytest.fixture(name="fake_tools")
+def fixture_fake_tools(monkeypatch):
+    tools = FakeTools()
+    monkeypatch.setattr(mcp_server, "_call_tool_sync", tools)
+    monkeypatch.setattr(mcp_server, "_device_semaphores", {})
+    yield tools
+    # Don't leave any calls blocking `_executor`:
+    for id_ in list(tools.cancel_events):
+        tools.finish(id_)
+
+
+async def wait_for(condition, timeout_secs=10):
+    """Let the event loop (and `_executor`) run until ``condition()``."""
+    end = mcp_server.time.monotonic() + timeout_secs
+    while not condition():
+        assert mcp_server.time.monotonic() < end, "Timed out"
+        await asyncio.sleep(0.001)
+
+
+def call(id_, device_id):
+    return asyncio.ensure_future(mcp_server.call_tool(
+        "stb_device_press", {"id": id_, "device_id": device_id, "key": "KEY_OK"}))
+
+
+def test_call_tool_serialises_calls_to_each_device(fake_tools):
+    async def test():
+        a1, a2, b1 = call("a1", "A"), call("a2", "A"), call("b1", "B")
+        # Calls to different devices run at the same time:
+        await wait_for(lambda: sorted(fake_tools.started) == ["a1", "b1"])
+        fake_tools.finish("b1")
+        assert [c.text for c in await b1] == ["b1"]
+        # ...but calls to the same device are queued:
+        assert fake_tools.started == ["a1", "b1"]
+        fake_tools.finish("a1")
+        await a1
+        await wait_for(lambda: "a2" in fake_tools.started)
+        fake_tools.finish("a2")
+        await a2
+
+    asyncio.run(test())
+    assert fake_tools.max_running == {"A": 1, "B": 1}
+    assert all(t.startswith("stb-tester-mcp") for t in fake_tools.threads)
+
+
+def test_call_tool_cancelled_while_waiting_for_device(fake_tools):
+    async def test():
+        a1, a2 = call("a1", "A"), call("a2", "A")
+        await wait_for(lambda: fake_tools.started == ["a1"])
+        a2.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await a2
+        fake_tools.finish("a1")
+        await a1
+        # The device is free again, and "a2" never ran:
+        a3 = call("a3", "A")
+        await wait_for(lambda: "a3" in fake_tools.started)
+        fake_tools.finish("a3")
+        await a3
+
+    asyncio.run(test())
+    assert fake_tools.started == ["a1", "a3"]
+
+
+def test_call_tool_cancelled_while_running(fake_tools):
+    async def test():
+        a1 = call("a1", "A")
+        await wait_for(lambda: fake_tools.started == ["a1"])
+        a1.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await a1
+        # We return to the client at once, and tell the tool to stop:
+        assert fake_tools.cancel_events["a1"].is_set()
+        assert fake_tools.finished == []
+
+        # The device is still reserved until the tool has actually stopped:
+        a2 = call("a2", "A")
+        await asyncio.sleep(0.05)
+        assert fake_tools.started == ["a1"]
+        fake_tools.finish("a1")
+        await wait_for(lambda: "a2" in fake_tools.started)
+        fake_tools.finish("a2")
+        await a2
+
+    asyncio.run(test())
+    assert fake_tools.max_running == {"A": 1}
+
+
+def test_cancellable_frames(monkeypatch):
+    class FakeStbt():
+        @staticmethod
+        def frames():
+            n = 0
+            while True:
+                n += 1
+                yield n
+
+    monkeypatch.setattr(mcp_server, "stbt", FakeStbt())
+    cancel_event = mcp_server.threading.Event()
+    seen = []
+    with pytest.raises(mcp_server.ToolCancelled):
+        for frame in mcp_server._cancellable_frames(cancel_event):
+            seen.append(frame)
+            if frame == 3:
+                cancel_event.set()
+    assert seen == [1, 2, 3]
+
+
+@pytest.fixture(name="last_screenshots")
+def fixture_last_screenshots(monkeypatch):
+    last_screenshots = {}
+    monkeypatch.setattr(mcp_server, "_last_screenshots", last_screenshots)
+    return last_screenshots
+
+
+def prepare_screenshot(image, **arguments):
+    import cv2
+    import numpy
+    prepared = mcp_server._prepare_screenshot("local", image, arguments)
+    if prepared is None:
+        return None
+    data, content_type = prepared
+    decoded = cv2.imdecode(numpy.frombuffer(data, numpy.uint8),
+                           cv2.IMREAD_UNCHANGED)
+    return decoded, content_type
+
+
+def new_frame(width=200, height=100):
+    import numpy
+    frame = numpy.zeros((height, width, 3), dtype=numpy.uint8)
+    frame[:, :, 2] = numpy.arange(width, dtype=numpy.uint8)  # red gradient
+    return frame
+
+
+@pytest.mark.parametrize("region,expected_shape", [
+    ({"x": 10, "y": 20, "width": 30, "height": 40}, (40, 30, 3)),
+    ({"x": -50, "y": -10, "width": 100, "height": 20}, (10, 50, 3)),
+    ({"x": 150, "y": 90, "width": 100, "height": 100}, (10, 50, 3)),
+    ({"x": 150}, (100, 50, 3)),
+])
+def test_prepare_screenshot_region(last_screenshots, region, expected_shape):  # pylint:disable=unused-argument
+    image, content_type = prepare_screenshot(new_frame(), region=region)
+    assert content_type == "image/png"
+    assert image.shape == expected_shape
+    assert image[0, 0, 2] == max(0, region.get("x", 0))
+
+
+@pytest.mark.parametrize("region", [
+    {"x": 200, "y": 0, "width": 10, "height": 10},
+    {"x": -20, "y": 0, "width": 10, "height": 10},
+])
+def test_prepare_screenshot_region_outside_frame(last_screenshots, region):  # pylint:disable=unused-argument
+    with pytest.raises(ValueError):
+        prepare_screenshot(new_frame(), region=region)
+
+
+def test_prepare_screenshot_grayscale_and_max_width(last_screenshots):  # pylint:disable=unused-argument
+    image, _ = prepare_screenshot(new_frame(), grayscale=True)
+    assert image.shape == (100, 200)
+
+    image, _ = prepare_screenshot(new_frame(), max_width=50)
+    assert image.shape == (25, 50, 3)
+
+    # Smaller images aren't scaled up:
+    image, _ = prepare_screenshot(new_frame(), max_width=500)
+    assert image.shape == (100, 200, 3)
+
+    image, _ = prepare_screenshot(
+        new_frame(), grayscale=True, max_width=100,
+        region={"x": 0, "y": 0, "width": 100, "height": 100})
+    assert image.shape == (100, 100)
+
+
+@pytest.mark.parametrize("image_format,magic", [
+    ("png", b"\x89PNG"),
+    ("jpeg", b"\xff\xd8\xff"),
+    ("webp", b"RIFF"),
+])
+def test_prepare_screenshot_format(last_screenshots, image_format, magic):  # pylint:disable=unused-argument
+    data, content_type = mcp_server._prepare_screenshot(
+        "local", new_frame(), {"format": image_format, "quality": 50})
+    assert content_type == f"image/{image_format}"
+    assert data.startswith(magic)
+
+
+def test_screenshot_only_if_changed(monkeypatch, last_screenshots):
+    import cv2
+
+    frame = new_frame()
+    screenshots = []
+
+    class FakeClient():
+        @staticmethod
+        def get_screenshot(_node_id):
+            png = cv2.imencode(".png", frame)[1].tobytes()
+            screenshots.append(png)
+            return png, "image/png"
+
+    monkeypatch.setattr(mcp_server, "portal_client", FakeClient())
+
+    def screenshot(**arguments):
+        return mcp_server._portal_screenshot("stb-tester-1", arguments)
+
+    # Without any options we return the Portal's PNG as-is, but remember it
+    # for the next "only_if_changed":
+    assert screenshot() == (screenshots[-1], "image/png")
+    assert list(last_screenshots) == ["portal:stb-tester-1"]
+    assert screenshot(only_if_changed=True) is None
+
+    frame[50:60, 50:60] = 255
+    assert screenshot(only_if_changed=True) is not None
+    assert screenshot(only_if_changed=True) is None
+    assert screenshot() is not None
+    assert screenshot(only_if_changed=True) is None
+
+    # Small differences are treated as noise:
+    frame[50:60, 50:60] = 250
+    assert screenshot(only_if_changed=True) is None
+
+    # Different options give a different image, so it counts as a change:
+    region = {"x": 0, "y": 0, "width": 50, "height": 50}
+    assert screenshot(only_if_changed=True, region=region) is not None
+    assert screenshot(only_if_changed=True, region=region) is None
+    assert screenshot(only_if_changed=True, grayscale=True) is not None
+
+    # Each device is compared against its own last screenshot:
+    assert mcp_server._portal_screenshot(
+        "stb-tester-2", {"only_if_changed": True}) is not None
+
+
+def _find_file(filename):
+    from tests.test_core import _find_file as find_file
+    return find_file(filename)
+
+
+class FakeMenu():
+    """A fake `stbt` for `_navigate_menu`: Each press moves to the next of
+    ``screens``; after the last one, pressing the key doesn't change anything.
+    In OCR mode each screen's text is ``texts[n]``."""
+    def __init__(self, screens, texts=None):
+        import stbt_core
+        self.screens = [stbt_core.Frame(screen, time=float(n))
+                        for n, screen in enumerate(screens)]
+        for frame in self.screens:
+            # Like the frames from the video pipeline:
+            frame.flags.writeable = False
+            frame.base.flags.writeable = False
+        self.texts = texts
+        self.current = 0
+        self.presses = []
+        self.ocr_calls = 0
+        self.match = stbt_core.match
+        self.Region = stbt_core.Region
+        self.TransitionStatus = stbt_core.TransitionStatus
+
+    def get_frame(self):
+        return self.screens[self.current]
+
+    def press_and_wait(self, key, **_):
+        self.presses.append(key)
+        if self.current + 1 < len(self.screens):
+            self.current += 1
+            status = self.TransitionStatus.COMPLETE
+        else:
+            status = self.TransitionStatus.START_TIMEOUT
+        frame = self.get_frame()
+        return types.SimpleNamespace(status=status, frame=frame,
+                                     press_time=frame.time - 0.25)
+
+    def ocr(self, frame, region=None):  # pylint:disable=unused-argument
+        self.ocr_calls += 1
+        return self.texts[int(frame.time)]
+
+
+def navigate_menu(monkeypatch, menu, target_images=(), target_text=None,
+                  max_steps=20):
+    monkeypatch.setattr(mcp_server, "stbt", menu)
+    return mcp_server._navigate_menu(
+        "KEY_DOWN", [_find_file(x) for x in target_images], target_text,
+        max_steps=max_steps, focus_region=None, text_region=None,
+        stable_secs=0.5, timeout_secs=5,
+        cancel_event=mcp_server.threading.Event())
+
+
+def menu_screens(found_at, count):
+    """``count`` blank screens, except for the ``found_at``th one."""
+    import numpy
+    import stbt_core
+    found = numpy.asarray(
+        stbt_core.load_image(_find_file("action-panel.png")))
+    return [found.copy() if n == found_at else numpy.zeros_like(found)
+            for n in range(count)]
+
+
+def test_navigate_menu_finds_image(monkeypatch):
+    menu = FakeMenu(menu_screens(found_at=3, count=6))
+    result = navigate_menu(monkeypatch, menu,
+                           ["action-panel-blue-button.png"])
+    assert result["status"] == "found"
+    assert result["matched"] is True
+    assert result["method"] == "image"
+    assert result["target"].endswith("action-panel-blue-button.png")
+    assert result["steps"] == 3
+    assert menu.presses == ["KEY_DOWN"] * 3
+    assert [p["transition"] for p in result["path"]] == ["COMPLETE"] * 3
+    assert all(p["transition_secs"] == 0.25 for p in result["path"])
+
+
+def test_navigate_menu_already_there(monkeypatch):
+    menu = FakeMenu(menu_screens(found_at=0, count=3))
+    result = navigate_menu(monkeypatch, menu,
+                           ["action-panel-blue-button.png"])
+    assert result["status"] == "found"
+    assert result["steps"] == 0
+    assert menu.presses == []
+
+
+def test_navigate_menu_stops_at_end_of_menu(monkeypatch):
+    menu = FakeMenu(menu_screens(found_at=None, count=3))
+    result = navigate_menu(monkeypatch, menu,
+                           ["action-panel-blue-button.png"])
+    assert result["status"] == "not_found"
+    assert result["matched"] is False
+    assert result["reason"] == "end_of_menu"
+    assert result["steps"] == 3
+    assert result["path"][-1]["transition"] == "START_TIMEOUT"
+
+
+def test_navigate_menu_max_steps(monkeypatch):
+    menu = FakeMenu(menu_screens(found_at=5, count=6))
+    result = navigate_menu(monkeypatch, menu,
+                           ["action-panel-blue-button.png"], max_steps=2)
+    assert result["status"] == "not_found"
+    assert result["reason"] == "max_steps"
+    assert result["steps"] == 2
+    assert menu.presses == ["KEY_DOWN"] * 2
+
+
+def test_navigate_menu_ocr(monkeypatch):
+    menu = FakeMenu(menu_screens(found_at=None, count=4),
+                    texts=["Home", "Movies", "TV Shows", "Settings"])
+    result = navigate_menu(monkeypatch, menu, target_text="tv shows")
+    assert result["status"] == "found"
+    assert result["method"] == "ocr"
+    assert result["text"] == "TV Shows"
+    assert result["steps"] == 2
+    assert [p["text"] for p in result["path"]] == ["Movies", "TV Shows"]
+    assert menu.ocr_calls == 3
+
+
+def test_navigate_menu_builds_each_frame_pyramid_once(monkeypatch):
+    from _stbt import match as match_module
+
+    built = []
+    original_build_pyramid = match_module._build_pyramid
+
+    def build_pyramid(image, levels, is_template=False, is_mask=False):
+        if not is_template and not is_mask:
+            built.append(image.shape)
+        return original_build_pyramid(image, levels, is_template, is_mask)
+
+    monkeypatch.setattr(match_module, "_build_pyramid", build_pyramid)
+    monkeypatch.setattr(match_module, "_frame_pyramid_cache",
+                        mcp_server.threading.local())
+
+    menu = FakeMenu(menu_screens(found_at=2, count=4))
+    result = navigate_menu(monkeypatch, menu, [
+        "circle-big.png", "button.png", "action-panel-blue-button.png"])
+    assert result["status"] == "found"
+    assert result["target"].endswith("action-panel-blue-button.png")
+    # 3 target images matched against each of 3 frames:
+    assert len(built) == 3
+
+
+def test_server_doesnt_import_stbt_core_with_portal():
+    # The Portal tools don't need stbt_core, so we don't pay for importing it
+    # (and OpenCV & GStreamer) at startup. See
+    # tests/run_mcp_startup_performance_test.py for the timings.
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ,
+               STBT_PORTAL_URL="http://127.0.0.1:9", STBT_PORTAL_TOKEN="x",
+               PYTHONPATH=os.pathsep.join(
+                   [root] + os.environ.get("PYTHONPATH", "").split(
+                       os.pathsep)))
+    output = subprocess.check_output(
+        [sys.executable, "-c",
+         "import sys\n"
+         "from mcp_server import stb_tester_server\n"
+         "assert stb_tester_server.PORTAL_AVAILABLE\n"
+         "print(' '.join(sorted(sys.modules)))"],
+        env=env, cwd=root, stderr=subprocess.DEVNULL, text=True)
+    modules = output.split()
+    assert "mcp_server.stb_tester_server" in modules
+    for module in ["stbt_core", "_stbt.core", "cv2", "gi", "numpy"]:
+        assert module not in modules
+
+
+@pytest.mark.parametrize("node,tags,expected", [
+    ({"tags": ["roku", "living-room"]}, ["roku"], True),
+    ({"tags": ["roku", "living-room"]}, ["roku", "living-room"], True),
+    ({"tags": ["roku", "living-room"]}, ["roku", "bedroom"], False),
+    ({"tags": ["roku"]}, ["roku=1"], False),
+    ({"tags": {"model": "roku", "room": "bedroom"}}, ["model"], True),
+    ({"tags": {"model": "roku", "room": "bedroom"}}, ["model=roku"], True),
+    ({"tags": {"model": "roku", "room": "bedroom"}},
+     ["model=roku", "room=bedroom"], True),
+    ({"tags": {"model": "roku", "room": "bedroom"}}, ["model=apple"], False),
+    ({"tags": {"model": "roku"}}, ["room"], False),
+    ({"tags": {"rack": 3}}, ["rack=3"], True),
+    ({"tags": []}, ["roku"], False),
+    ({}, ["roku"], False),
+    ("stb-tester-1", ["roku"], False),
+])
+def test_node_has_tags(node, tags, expected):
+    assert mcp_server._node_has_tags(node, tags) is expected
+
+
+class FakeFanOutClient():
+    """A fake `PortalClient` for the fan-out tools. Device "error" returns an
+    error response, and device "raise" raises an exception."""
+    def __init__(self, nodes=()):
+        self.nodes = list(nodes)
+        self.lock = mcp_server.threading.Lock()
+        self.running = 0
+        self.max_running = 0
+        self.pressed = []
+
+    def list_nodes(self):
+        return {"nodes": self.nodes}
+
+    def _device(self, device_id):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        mcp_server.time.sleep(0.05)
+        with self.lock:
+            self.running -= 1
+        if device_id == "raise":
+            raise ConnectionError("Connection refused")
+        if device_id == "error":
+            return {"error": "HTTP 404: Not Found"}
+        return None
+
+    def press_key(self, device_id, key):
+        error = self._device(device_id)
+        if error:
+            return error
+        self.pressed.append((device_id, key))
+        return {}
+
+    def get_screenshot(self, device_id):
+        self._device(device_id)
+        return f"PNG of {device_id}".encode(), "image/png"
+
+
+@pytest.fixture(name="fan_out_client")
+def fixture_fan_out_client(monkeypatch, last_screenshots):  # pylint:disable=unused-argument
+    client = FakeFanOutClient()
+    monkeypatch.setattr(mcp_server, "PORTAL_AVAILABLE", True)
+    monkeypatch.setattr(mcp_server, "portal_client", client)
+    monkeypatch.setattr(mcp_server, "_device_semaphores", {})
+    return client
+
+
+def call_fan_out_tool(name, **arguments):
+    contents = asyncio.run(mcp_server._call_fan_out_tool(name, arguments))
+    return json.loads(contents[0].text), contents[1:]
+
+
+def test_fan_out_selects_devices_by_tags(fan_out_client):
+    fan_out_client.nodes = [
+        {"node_id": "stb-1", "tags": ["roku", "living-room"]},
+        {"node_id": "stb-2", "tags": {"roku": "4k", "room": "bedroom"}},
+        {"node_id": "stb-3", "tags": ["apple-tv"]},
+    ]
+    summary, _ = call_fan_out_tool("stb_multi_press", tags=["roku"],
+                                   key="KEY_OK")
+    assert [d["device_id"] for d in summary["devices"]] == ["stb-1", "stb-2"]
+    assert sorted(fan_out_client.pressed) == [("stb-1", "KEY_OK"),
+                                              ("stb-2", "KEY_OK")]
+
+    summary, _ = call_fan_out_tool("stb_multi_press", tags=["bedroom"],
+                                   key="KEY_OK")
+    assert summary == {"error": "No devices selected", "tags": ["bedroom"]}
+
+    summary, _ = call_fan_out_tool("stb_multi_press", key="KEY_OK")
+    assert summary == {"error": "Specify device_ids or tags"}
+
+
+@pytest.mark.parametrize("max_parallel", [1, 3])
+def test_fan_out_max_parallel(fan_out_client, max_parallel):
+    devices = [f"stb-{n}" for n in range(6)]
+    summary, _ = call_fan_out_tool("stb_multi_press", device_ids=devices,
+                                   key="KEY_OK", max_parallel=max_parallel)
+    assert summary["succeeded"] == 6
+    assert [d["device_id"] for d in summary["devices"]] == devices
+    assert fan_out_client.max_running == max_parallel
+
+
+def test_fan_out_reports_errors_for_each_device(fan_out_client):
+    summary, _ = call_fan_out_tool(
+        "stb_multi_press", device_ids=["stb-1", "error", "raise", "stb-2"],
+        key="KEY_OK")
+    assert summary["count"] == 4
+    assert summary["succeeded"] == 2
+    devices = summary["devices"]
+    assert devices[0]["status"] == "success"
+    assert devices[1]["error"] == "HTTP 404: Not Found"
+    assert devices[2]["error"] == "Connection refused"
+    assert devices[2]["type"] == "ConnectionError"
+    assert devices[3]["status"] == "success"
+    assert sorted(fan_out_client.pressed) == [("stb-1", "KEY_OK"),
+                                              ("stb-2", "KEY_OK")]
+
+
+def test_multi_screenshot_image_indexes(fan_out_client):  # pylint:disable=unused-argument
+    import base64
+    summary, images = call_fan_out_tool(
+        "stb_multi_screenshot", device_ids=["stb-1", "raise", "stb-2"])
+    devices = summary["devices"]
+    assert [d.get("image") for d in devices] == [0, None, 1]
+    assert "error" in devices[1]
+    for device in [devices[0], devices[2]]:
+        image = images[device["image"]]
+        assert image.mimeType == "image/png"
+        assert base64.b64decode(image.data) == (
+            f"PNG of {device['device_id']}".encode())
@@ -0,0 +1,117 @@
+import numpy
+import pytest
+
+import stbt_core as stbt
+from _stbt.core import DeviceUnderTest
+from _stbt.monitor import ScreenMonitor, _Timeline
+from stbt_core import UnconfiguredDeviceUnderTest
+
+
+def _frame(t, value=0, noise_at=None):
+    a = numpy.full((720, 1280, 3), value, dtype=numpy.uint8)
+    if noise_at is not None:
+        # A single pixel that isn't on the lattice of sampled pixels:
+        a[noise_at[1], noise_at[0]] = 255
+    return stbt.Frame(a, time=t)
+
+
+@pytest.mark.parametrize("mask", [
+    stbt.Region.ALL,
+    stbt.Region.ALL - stbt.Region(0, 0, 100, 100),
+    "mask-out-left-half-720p.png",
+])
+def test_screen_monitor(mask):
+    m = ScreenMonitor(mask)
+    frames = [
+        _frame(0.00, 128),
+        _frame(0.04, 128),                        # frozen
+        _frame(0.08, 128, noise_at=(1001, 501)),  # not frozen
+        _frame(0.12, 0),                          # black
+        _frame(0.16, 0, noise_at=(1001, 501)),    # not black, not frozen
+        _frame(0.20, 0),                          # black
+        _frame(0.24, 0),                          # black, frozen
+        _frame(0.28, 200),
+    ]
+    for f in frames:
+        m.on_frame(f)
+
+    assert m.frame_count == 8
+    assert (m.first_frame_time, m.last_frame_time) == (0.00, 0.28)
+
+    assert m.black_periods() == [(0.12, 0.12), (0.20, 0.24)]
+    assert m.frozen_periods() == [(0.00, 0.04), (0.20, 0.24)]
+
+    assert m.was_black()
+    assert not m.was_black(0.00, 0.10)
+    assert m.was_black(0.10, 0.12)
+    assert not m.was_black(0.13, 0.19)
+    assert m.was_black(0.13, 0.20)
+    assert not m.was_black(0.25)
+    assert not m.was_frozen(0.05, 0.19)
+    assert m.was_frozen(0.05, 0.20)
+    assert m.frozen_periods(0.05, 0.21) == [(0.20, 0.24)]
+
+
+def test_screen_monitor_ignores_masked_out_pixels():
+    m = ScreenMonitor(stbt.Region(0, 0, 100, 100))
+    m.on_frame(_frame(0.00))
+    m.on_frame(_frame(0.04, noise_at=(501, 501)))
+    assert m.black_periods() == [(0.00, 0.04)]
+    assert m.frozen_periods() == [(0.00, 0.04)]
+
+
+def test_timeline():
+    t = _Timeline(max_periods=4)
+    assert not t.any()
+    assert t.periods() == []
+    prev = None
+    for i in range(20):
+        if i % 4 != 3:
+            t.add(i, prev)
+        prev = i
+    assert t.periods() == [(8, 10), (12, 14), (16, 18)]
+    assert t.any(11, 11.5) is False
+    assert t.any(11, 12) is True
+    assert t.any(19) is False
+    assert t.any(None, 8) is True
+
+
+class _FakeDisplay():
+    def __init__(self):
+        self.observers = ()
+
+    def add_frame_observer(self, callback):
+        self.observers = self.observers + (callback,)
+
+    def remove_frame_observer(self, callback):
+        self.observers = tuple(x for x in self.observers if x != callback)
+
+    def push(self, frame):
+        for observer in self.observers:
+            observer(frame)
+
+
+def test_monitor_screen(monkeypatch):
+    display = _FakeDisplay()
+    monkeypatch.setattr(stbt, "_dut", DeviceUnderTest(display=display))
+    display.push(_frame(0.00))
+    with stbt.monitor_screen() as monitor:
+        assert len(display.observers) == 1
+        display.push(_frame(0.04, 128))
+        display.push(_frame(0.08))
+        assert monitor.was_black()
+    assert display.observers == ()
+    display.push(_frame(0.12))
+
+    assert monitor.frame_count == 2
+    assert monitor.black_periods() == [(0.08, 0.08)]
+
+
+def test_monitor_screen_without_video(monkeypatch):
+    monkeypatch.setattr(stbt, "_dut", UnconfiguredDeviceUnderTest())
+    with pytest.raises(RuntimeError):
+        with stbt.monitor_screen():
+            pass
+    with pytest.raises(RuntimeError):
+        with DeviceUnderTest().monitor_screen():
+            pass
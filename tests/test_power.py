@@ -7,7 +7,8 @@ from unittest.mock import patch
 import pytest
 from pysnmp.proto.rfc1902 import Integer
 
-from _stbt.power import config_to_power_outlet
+from _stbt.power import (_ATEN_PE6108G, _FileOutlet, config_to_power_outlet,
+                         set_power_outlets)
 
 CONFIG_INI = """
 [device_under_test]
@@ -107,3 +108,53 @@ def test_nooutlet():
 
     with pytest.raises(Exception):
         pdu.power_off()
+
+
+def test_set_power_outlets(tmp_path):
+    aten_oids = ["1.3.6.1.4.1.21317.1.3.2.2.2.2.%i.0" % (n + 1)
+                 for n in (1, 2, 3)]
+
+    def multi_data(*int_values):
+        return (None, 0, 0, [(o, Integer(v))
+                             for o, v in zip(aten_oids, int_values)])
+
+    with mock_command_gen() as mock_command:
+        mock_command.setCmd.return_value = multi_data(2, 2, 2)
+        mock_command.getCmd.side_effect = [
+            multi_data(1, 2, 1),
+            (None, 0, 0, [(aten_oids[0], Integer(2)),
+                          (aten_oids[2], Integer(1))]),
+        ] + [(None, 0, 0, [(aten_oids[2], Integer(1))])] * 10
+        atens = [_ATEN_PE6108G.from_uri_groups("mock.host.name", n)
+                 for n in (1, 2, 3)]
+        other = _FileOutlet(str(tmp_path / "outlet"))
+
+        results = set_power_outlets(atens + [other], True)
+
+        # One request sets all the outlets on the same PDU:
+        assert mock_command.setCmd.call_count == 1
+        assert [str(x[0]) for x in mock_command.setCmd.call_args[0][2:]] == \
+            aten_oids
+        assert [r.outlet for r in results] == atens + [other]
+        assert [r.error is None for r in results] == [True, True, False, True]
+        assert "Timeout" in str(results[2].error)
+        assert all(r.power is True and r.duration >= 0 for r in results)
+        assert other.get() is True
+
+
+def test_set_power_outlets_falls_back_to_one_at_a_time():
+    with mock_command_gen() as mock_command:
+        mock_command.setCmd.side_effect = [
+            (None, Integer(17), Integer(2), []),  # notWritable
+            mock_data(1),
+            (None, Integer(17), Integer(1), []),
+        ]
+        mock_command.getCmd.return_value = mock_data(1)
+        atens = [_ATEN_PE6108G.from_uri_groups("mock.host.name", n)
+                 for n in (1, 2)]
+
+        results = set_power_outlets(atens, False)
+
+        assert mock_command.setCmd.call_count == 3
+        assert results[0].error is None
+        assert results[1].error is not None
@@ -55,6 +55,36 @@ def test_keymap_section():
         _config_init(force=True)
 
 
+def test_press_sequence():
+    config = _config_init()
+    try:
+        config.add_section("control")
+        config.set("control", "keymap_section", "my_keymap")
+        config.add_section("my_keymap")
+        config.set("my_keymap", "KEY_FLOOBLE", "KEY_UP")
+
+        control = Mock(spec=RemoteControl)
+        dut = DeviceUnderTest(control=control, display=_FakeDisplay(),
+                              sink_pipeline=NoSinkPipeline())
+        keypresses = dut.press_sequence(["KEY_OK", "KEY_FLOOBLE"],
+                                        interpress_delay_secs=0)
+        assert control.press_sequence.call_args[0] == (
+            ["KEY_OK", "KEY_UP"], 0)
+        assert [k.key for k in keypresses] == ["KEY_OK", "KEY_FLOOBLE"]
+        assert dut.last_keypress() is keypresses[-1]
+        assert dut.press_sequence([]) == []
+
+        # A control that doesn't implement `press_sequence`:
+        control = Mock(spec=["press"])
+        dut = DeviceUnderTest(control=control, display=_FakeDisplay(),
+                              sink_pipeline=NoSinkPipeline())
+        dut.press_sequence(["KEY_OK", "KEY_FLOOBLE"], interpress_delay_secs=0)
+        assert [c[0] for c in control.press.call_args_list] == [
+            ("KEY_OK",), ("KEY_UP",)]
+    finally:
+        _config_init(force=True)
+
+
 class FakeControl():
     def __init__(self, raises_on_keydown=False, raises_on_keyup=False):
         self.raises_on_keydown = raises_on_keydown
@@ -1,6 +1,8 @@
 import os
 import socket
 import subprocess
+import sys
+import time
 from contextlib import contextmanager
 from tempfile import NamedTemporaryFile
 from textwrap import dedent
@@ -114,3 +116,101 @@ def test_stbt_control_relay_with_socket_passing(stbt_control_relay_on_path):  #
             expected = "KEY_UP\nKEY_DOWN\n"
 
             assert tmpfile.read() == expected
+
+
+@contextmanager
+def stbt_control_relay_from_srcdir(tmpdir, *args):
+    """Runs stbt_control_relay.py from the source tree, so these tests don't
+    need `make install`."""
+    if os.path.exists(os.path.join(tmpdir, "lircd.sock")):
+        os.unlink(os.path.join(tmpdir, "lircd.sock"))
+    proc = subprocess.Popen(
+        [sys.executable, srcdir("stbt_control_relay.py"),
+         "--socket", os.path.join(tmpdir, "lircd.sock")] + list(args),
+        env=dict(os.environ, PYTHONPATH=srcdir()))
+    with scoped_process(proc):
+        wait_until(lambda: (
+            _is_listening(os.path.join(tmpdir, "lircd.sock")) or
+            proc.poll() is not None))
+        yield proc
+
+
+def _is_listening(path):
+    # The socket file appears when the relay binds it, a moment before it
+    # starts listening.
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        s.close()
+
+
+def test_stbt_control_relay_serves_clients_concurrently():
+    with named_temporary_directory("stbt-control-relay-test.XXXXXX") as tmpdir:
+        with stbt_control_relay_from_srcdir(tmpdir, "file:" + tmpdir + "/out"):
+            uri = "lirc:%s/lircd.sock:stbt-test" % tmpdir
+            # LircControl keeps its connection open between presses, so
+            # with a relay that served one client at a time the second
+            # client would hang here.
+            one = uri_to_control(uri)
+            two = uri_to_control(uri)
+            one.press("KEY_LEFT")
+            two.press("KEY_RIGHT")
+            one.keydown("KEY_MENU")
+            two.press("KEY_OK")
+            one.keyup("KEY_MENU")
+            two.press("KEY_UP")
+
+            assert open(tmpdir + "/out", encoding="utf-8").read() == dedent(
+                """\
+                KEY_LEFT
+                KEY_RIGHT
+                Holding KEY_MENU
+                KEY_OK
+                Released KEY_MENU
+                KEY_UP
+                """)
+
+
+def test_stbt_control_relay_timeout():
+    with named_temporary_directory("stbt-control-relay-test.XXXXXX") as tmpdir:
+        with stbt_control_relay_from_srcdir(
+                tmpdir, "--timeout", "1", "file:" + tmpdir + "/out") as proc:
+            control = uri_to_control("lirc:%s/lircd.sock:stbt-test" % tmpdir)
+            control.press("KEY_OK")
+            # Doesn't time out while a client is connected:
+            time.sleep(1.5)
+            assert proc.poll() is None
+            control.press("KEY_OK")
+            control.close()
+            assert proc.wait(timeout=5) == 0
+
+
+def test_stbt_control_relay_with_several_outputs():
+    with named_temporary_directory("stbt-control-relay-test.XXXXXX") as tmpdir:
+        def t(filename):
+            return os.path.join(tmpdir, filename)
+        with stbt_control_relay_from_srcdir(
+                tmpdir, "box1=file:" + t("one"), "box2=file:" + t("two")):
+            box1 = uri_to_control("lirc:%s:box1" % t("lircd.sock"))
+            box2 = uri_to_control("lirc:%s:box2" % t("lircd.sock"))
+            box1.press("KEY_LEFT")
+            box2.press("KEY_RIGHT")
+            box1.press("KEY_OK")
+            with pytest.raises(RuntimeError, match="Unknown remote control"):
+                uri_to_control("lirc:%s:box3" % t("lircd.sock")).press(
+                    "KEY_OK")
+
+            assert open(t("one"), encoding="utf-8").read() == \
+                "KEY_LEFT\nKEY_OK\n"
+            assert open(t("two"), encoding="utf-8").read() == "KEY_RIGHT\n"
+
+        with stbt_control_relay_from_srcdir(
+                tmpdir, "file:" + t("default"), "box1=file:" + t("one")):
+            uri_to_control("lirc:%s:box1" % t("lircd.sock")).press("KEY_UP")
+            uri_to_control("lirc:%s:stbt" % t("lircd.sock")).press("KEY_DOWN")
+            assert open(t("one"), encoding="utf-8").read() == "KEY_UP\n"
+            assert open(t("default"), encoding="utf-8").read() == "KEY_DOWN\n"
@@ -0,0 +1,86 @@
+import csv
+import io
+import json
+import os
+
+import pytest
+
+import _stbt.core
+import stbt_latency
+from _stbt.transition import TransitionAnalyzer
+from _stbt.types import Region
+from _stbt.utils import named_temporary_directory
+from tests.test_transition import FakeDeviceUnderTest
+
+
+@pytest.mark.parametrize("format_", ["csv", "jsonl"])
+def test_stbt_latency_run(format_):
+    analyzer = TransitionAnalyzer(timeout_secs=0.2, stable_secs=0.1)
+    progress = io.StringIO()
+    with named_temporary_directory() as d:
+        filename = os.path.join(d, "results." + format_)
+        with stbt_latency.open_writer(filename) as writer:
+            stbt_latency.run(analyzer, ["white", "black"], 3, writer,
+                             FakeDeviceUnderTest(), progress=progress)
+        with open(filename, encoding="utf-8") as f:
+            if format_ == "csv":
+                rows = list(csv.DictReader(f))
+            else:
+                rows = [json.loads(line) for line in f]
+
+    assert len(analyzer.transitions) == 6
+    assert [r["key"] for r in rows] == ["white", "black"] * 3
+    assert [int(r["iteration"]) for r in rows] == [0, 0, 1, 1, 2, 2]
+    assert all(r["status"] == "COMPLETE" for r in rows)
+    assert all(abs(float(r["duration"]) - 0.04) < 0.001 for r in rows)
+
+    lines = progress.getvalue().split("\r")
+    assert lines[-1] == "n=6 failed=0 p50=0.040s p95=0.040s p99=0.040s\n"
+
+
+def test_stbt_latency_argument_parsing():
+    assert stbt_latency.parse_mask(None) == Region.ALL
+    assert stbt_latency.parse_mask("10,20,30,40") == Region(10, 20, 30, 40)
+    assert stbt_latency.parse_mask("mask.png") == "mask.png"
+    assert stbt_latency.parse_size("20x10") == (20, 10)
+    assert stbt_latency.parse_percentiles("50,99.9") == (50, 99.9)
+
+    with named_temporary_directory() as d:
+        filename = os.path.join(d, "keys.txt")
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write("# Carousel\nKEY_RIGHT\n\nKEY_RIGHT\n  KEY_LEFT  \n")
+        assert stbt_latency.read_key_script(filename) == [
+            "KEY_RIGHT", "KEY_RIGHT", "KEY_LEFT"]
+
+
+class FakeDeviceUnderTestWithContext(FakeDeviceUnderTest):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        pass
+
+    def get_frame(self):
+        return next(self.frames())
+
+
+@pytest.mark.parametrize("keys,expected_status,expected_summary", [
+    (["white", "black"], 0, "n=4 failed=0"),
+    (["black"], 1, "n=2 failed=2"),
+])
+def test_stbt_latency_main(monkeypatch, capsys, keys, expected_status,
+                           expected_summary):
+    monkeypatch.setattr(_stbt.core, "new_device_under_test_from_config",
+                        lambda args: FakeDeviceUnderTestWithContext())
+    with named_temporary_directory() as d:
+        filename = os.path.join(d, "results.csv")
+        assert stbt_latency.main(
+            ["stbt latency", "-n", "2", "--timeout-secs", "0.2",
+             "--stable-secs", "0.1", "-o", filename] + keys) == \
+            expected_status
+        with open(filename, encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+
+    assert [r["key"] for r in rows] == keys * 2
+    assert any(line.startswith(expected_summary + " p50=")
+               for line in capsys.readouterr().out.splitlines())
@@ -223,3 +223,96 @@ def test_transitionresult_properties(status, started, complete, stable):
     assert t.started == started
     assert t.complete == complete
     assert t.stable == stable
+
+
+def test_transition_analyzer(diff_algorithm):
+    _stbt = FakeDeviceUnderTest()
+    keypresses = []
+    recorded = []
+
+    press = _stbt.press
+
+    def recording_press(key):
+        keypress = press(key)
+        keypresses.append(keypress)
+        return keypress
+
+    def recording_frames():
+        for f in _stbt.frames():
+            recorded.append(f)
+            yield f
+
+    _stbt.press = recording_press
+    frames = recording_frames()
+
+    analyzer = stbt.TransitionAnalyzer(timeout_secs=0.2, stable_secs=0.1)
+    results = [analyzer.press_and_wait(key, frames=frames, _dut=_stbt)
+               for key in ["white", "fade-to-black", "white", "black",
+                           "black"]]
+
+    assert [t.status for t in analyzer.transitions] == [
+        stbt.TransitionStatus.COMPLETE] * 4 + [
+        stbt.TransitionStatus.START_TIMEOUT]
+    # The recorded transitions don't keep the video-frames alive:
+    assert all(t.frame is not None for t in results)
+    assert all(t.frame is None for t in analyzer.transitions)
+    assert [t.end_time for t in analyzer.transitions] == \
+        [t.end_time for t in results]
+    assert len(analyzer.timings) == 5
+    assert len(analyzer.frames) == len(recorded)
+    assert numpy.array_equal(analyzer.frames["time"],
+                             [f.time for f in recorded])
+    assert list(numpy.unique(analyzer.frames["keypress"])) == [0, 1, 2, 3, 4]
+    assert analyzer.frames["magnitude"].max() == 1280 * 720
+    assert not analyzer.frames["motion"][analyzer.frames["keypress"] == 4].any()
+
+    durations = analyzer.durations()
+    assert numpy.isnan(durations[4])
+    assert isclose(durations[:4], [0.04, 0.08, 0.04, 0.04]).all()
+    # The animation started some time between the keypress and the first
+    # frame with motion:
+    assert isclose(analyzer.durations(interpolate=True)[:4],
+                   [0.02, 0.06, 0.02, 0.02]).all()
+    assert isclose(analyzer.durations(animation=True)[:4],
+                   [0, 0.04, 0, 0]).all()
+
+    p = analyzer.percentiles()
+    assert list(p.keys()) == [50, 95, 99]
+    assert isclose(p[50], 0.04)
+    assert 0.04 < p[95] < p[99] < 0.08
+
+    # Offline analysis of the same recording gives the same results:
+    offline = stbt.TransitionAnalyzer(timeout_secs=0.2, stable_secs=0.1)
+    transitions = offline.analyse(recorded, keypresses)
+    assert [(t.status, t.press_time, t.animation_start_time, t.end_time)
+            for t in transitions] == \
+        [(t.status, t.press_time, t.animation_start_time, t.end_time)
+         for t in analyzer.transitions]
+    for field in ["press_time", "animation_start_time", "end_time",
+                  "start_lower", "end_lower"]:
+        assert numpy.array_equal(offline.timings[field],
+                                 analyzer.timings[field], equal_nan=True)
+
+    # Without `frame_before` we use the last recorded frame before the press.
+    # The recording doesn't include a frame from before the first press, so
+    # the first transition is missed.
+    offline = stbt.TransitionAnalyzer(timeout_secs=0.2, stable_secs=0.1)
+    transitions = offline.analyse(
+        recorded,
+        [Keypress(k.key, k.start_time, k.end_time, None) for k in keypresses])
+    assert [t.status for t in transitions] == \
+        [stbt.TransitionStatus.START_TIMEOUT] + \
+        [t.status for t in analyzer.transitions[1:]]
+
+    # Analysis stops when we run out of frames:
+    offline = stbt.TransitionAnalyzer(timeout_secs=0.2, stable_secs=0.1)
+    transitions = offline.analyse(recorded[:8], keypresses)
+    assert [t.status for t in transitions] == [
+        stbt.TransitionStatus.COMPLETE, stbt.TransitionStatus.STABLE_TIMEOUT]
+
+
+def test_press_and_wait_runs_out_of_frames():
+    _stbt = FakeDeviceUnderTest(["black"] * 5)
+    transition = stbt.press_and_wait("black", frames=_stbt.frames(),
+                                     _dut=FakeDeviceUnderTest())
+    assert transition.status == stbt.TransitionStatus.START_TIMEOUT